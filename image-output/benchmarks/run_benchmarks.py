@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""Time the figure pipeline on synthetic inputs grown along each data axis, with baselines.
+
+Examples:
+    python benchmarks/run_benchmarks.py --factors 1,10 --save-baseline main
+    python benchmarks/run_benchmarks.py --factors 1,10 --compare main --threshold 0.25
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import fnmatch
+import functools
+import io
+import json
+import platform
+import sys
+import tempfile
+import time
+from dataclasses import asdict
+from pathlib import Path
+from typing import Callable
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import matplotlib.pyplot as plt  # noqa: E402
+import numpy as np  # noqa: E402
+
+import capacity  # noqa: E402
+import fit_engine  # noqa: E402
+import generate_chapter3_extended_fit as extended  # noqa: E402
+import generate_chapter4_architecture as chapter4  # noqa: E402
+import generate_thesis_figures as thesis  # noqa: E402
+import raw_samples  # noqa: E402
+import summary_tables  # noqa: E402
+import synthetic  # noqa: E402
+import text_layout  # noqa: E402
+
+
+BASELINE_DIR = Path(__file__).resolve().parent / "baselines"
+THRESHOLD = 0.25
+# Timings under this are dominated by noise and never count as regressions.
+MIN_SECONDS = 0.01
+
+Bench = Callable[[], object]
+
+
+def timed(func: Bench, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            func()
+            best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _cold_parse_mean(tables: dict[str, list[dict[str, str]]]) -> None:
+    thesis.parse_mean.cache_clear()
+    for rows in tables.values():
+        for row in rows:
+            for cell in row.values():
+                thesis.parse_mean(cell)
+
+
+def _cold_load_index(path: Path) -> None:
+    summary_tables._MEMO.clear()
+    summary_tables.index_path(path).unlink(missing_ok=True)
+    summary_tables.load_index(path)
+
+
+def _warm_load_index(path: Path) -> None:
+    summary_tables._MEMO.clear()
+    summary_tables.load_index(path)
+
+
+def _cell_values(samples: raw_samples.RawSamples) -> None:
+    for engine in samples.engines:
+        for node in samples.node_counts(engine):
+            samples.values(engine, node, "tps")
+
+
+def _scatter(draw: Callable[[plt.Axes], None]) -> None:
+    fig, ax = plt.subplots()
+    draw(ax)
+    fig.canvas.draw()
+    plt.close(fig)
+
+
+def _cold_wrap(paragraphs: list[str]) -> None:
+    text_layout.wrap.cache_clear()
+    text_layout.text_size.cache_clear()
+    text_layout._ADVANCES.clear()
+    fnt = chapter4.font(chapter4.F_BODY)
+    for text in paragraphs:
+        text_layout.wrap(text, fnt, 320)
+
+
+def data_benchmarks(data: synthetic.Dataset) -> dict[str, Bench]:
+    """Benchmarks whose cost depends on the synthetic dataset."""
+    summary_tables._MEMO.clear()
+    index = summary_tables.load_index(data.summary_md)
+    tables = {f"3-{i}": thesis.extract_table(index, f"3-{i}") for i in range(3, 21)}
+    exp1 = raw_samples.load(data.exp1_summary, ("tps", "p99_ms"))
+    exp7 = raw_samples.load(data.exp7_summary)
+    fits = json.loads(data.exp7_fits.read_text(encoding="utf-8"))
+    lines = data.summary_md.read_text(encoding="utf-8").splitlines(True)
+    benches: dict[str, Bench] = {
+        "summary_tables.index_tables": functools.partial(summary_tables.index_tables, lines),
+        "summary_tables.load_index.cold": functools.partial(_cold_load_index, data.summary_md),
+        "summary_tables.load_index.warm": functools.partial(_warm_load_index, data.summary_md),
+        "thesis.extract_table": lambda: [thesis.extract_table(index, number) for number in tables],
+        "thesis.parse_mean": functools.partial(_cold_parse_mean, tables),
+        "raw_samples.load.exp1": functools.partial(raw_samples.load, data.exp1_summary, ("tps", "p99_ms")),
+        "raw_samples.load.exp7": functools.partial(raw_samples.load, data.exp7_summary),
+        "raw_samples.values": functools.partial(_cell_values, exp7),
+        "raw_samples.group_stats": functools.partial(exp7.group_stats, "p99_ms"),
+        "fit_engine.bootstrap_bands": functools.partial(
+            fit_engine.bootstrap_bands, exp7, "p99_ms", fit_engine.P99_DEGREE, np.linspace(8, 128, 120)
+        ),
+        "thesis.scatter_benchmark_raw": functools.partial(
+            _scatter, lambda ax: [thesis.scatter_benchmark_raw(ax, exp1, a, "tps", "#333333") for a in thesis.ALGO_ORDER]
+        ),
+        "extended.scatter_raw": functools.partial(
+            _scatter, lambda ax: [extended.scatter_raw(ax, exp7, a, "tps", "#333333") for a in extended.ALGO_ORDER]
+        ),
+        "extended.write_points_csv": functools.partial(extended.write_points_csv, exp7),
+        "extended.plot_tsat_fit": functools.partial(extended.plot_tsat_fit, exp7, fits),
+        "extended.plot_p99_fit": functools.partial(extended.plot_p99_fit, exp7, fits),
+        "extended.plot_capacity_heatmap": functools.partial(
+            extended.plot_capacity_heatmap, fits, (capacity.P99_LIMITS, capacity.MIN_TSAT)
+        ),
+        "text_layout.wrap": functools.partial(_cold_wrap, [" | ".join(row.values()) for rows in tables.values() for row in rows]),
+    }
+    for label, func, args in thesis.figure_jobs(tables, exp1):
+        benches[f"thesis.{label}.{func.__name__}"] = functools.partial(func, *args)
+    return benches
+
+
+def static_benchmarks() -> dict[str, Bench]:
+    """Benchmarks that do not read experiment data; they run once, in the base case."""
+    return {f"chapter4.{label}": fn for label, fn in chapter4.FIGURES.items()}
+
+
+def run(args: argparse.Namespace) -> dict:
+    base = synthetic.Scale()
+    cases = [("base", base)]
+    for axis in args.axes:
+        for factor in args.factors:
+            if factor != 1:
+                cases.append((f"{axis}x{factor}", base.scaled(axis, factor)))
+    results: dict[str, float] = {}
+    with tempfile.TemporaryDirectory(prefix="hcp-bench-") as tmp:
+        out = Path(tmp) / "out"
+        for module in (thesis, extended, chapter4):
+            module.OUT_DIR = out
+        out.mkdir()
+        thesis.setup_style()
+        for case, scale in cases:
+            data = synthetic.write_dataset(Path(tmp) / case, scale)
+            benches = data_benchmarks(data)
+            if case == "base":
+                benches.update(static_benchmarks())
+            for name, bench in benches.items():
+                key = f"{case}/{name}"
+                if args.only and not any(fnmatch.fnmatch(key, pattern) for pattern in args.only):
+                    continue
+                results[key] = timed(bench, args.repeat)
+                print(f"  {key:<60} {results[key] * 1000:10.1f} ms", flush=True)
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "platform": platform.platform(),
+        "base_scale": asdict(base),
+        "factors": args.factors,
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float, min_seconds: float) -> list[str]:
+    regressions = []
+    for key, seconds in sorted(current["results"].items()):
+        before = baseline["results"].get(key)
+        if before is None:
+            continue
+        change = seconds / before - 1.0 if before > 0 else 0.0
+        flag = ""
+        if change > threshold and max(seconds, before) >= min_seconds:
+            flag = "  REGRESSION"
+            regressions.append(key)
+        print(f"  {key:<60} {before * 1000:9.1f} -> {seconds * 1000:9.1f} ms {change:+7.1%}{flag}")
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--axes", type=lambda s: s.split(","), default=list(synthetic.AXES), help="axes to scale, comma-separated")
+    parser.add_argument("--factors", type=lambda s: [int(v) for v in s.split(",")], default=[1, 10], help="scale factors, e.g. 1,10,100")
+    parser.add_argument("--only", action="append", metavar="GLOB", help="run only benchmarks matching case/name glob (repeatable)")
+    parser.add_argument("--repeat", type=int, default=3, help="timing repeats; the fastest is kept")
+    parser.add_argument("--output", type=Path, help="also write the results JSON here")
+    parser.add_argument("--save-baseline", metavar="NAME", help=f"store results as {BASELINE_DIR.name}/NAME.json")
+    parser.add_argument("--compare", metavar="NAME", help="compare against a stored baseline and fail on regressions")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="allowed slowdown ratio before flagging (default 0.25)")
+    parser.add_argument("--min-seconds", type=float, default=MIN_SECONDS, help="ignore timings faster than this")
+    args = parser.parse_args(argv)
+    unknown = [axis for axis in args.axes if axis not in synthetic.AXES]
+    if unknown:
+        parser.error(f"unknown axes: {', '.join(unknown)}; choose from {', '.join(synthetic.AXES)}")
+
+    current = run(args)
+    text = json.dumps(current, indent=2)
+    if args.output:
+        args.output.write_text(text, encoding="utf-8")
+    if args.save_baseline:
+        BASELINE_DIR.mkdir(parents=True, exist_ok=True)
+        path = BASELINE_DIR / f"{args.save_baseline}.json"
+        path.write_text(text, encoding="utf-8")
+        print(f"saved baseline {path}")
+    if args.compare:
+        baseline = json.loads((BASELINE_DIR / f"{args.compare}.json").read_text(encoding="utf-8"))
+        regressions = compare(current, baseline, args.threshold, args.min_seconds)
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}")
+            return 1
+        print("no regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
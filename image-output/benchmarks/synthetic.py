@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""Synthetic summary_all.md and experiment summary.json inputs at adjustable scale."""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+from dataclasses import dataclass, replace
+from pathlib import Path
+
+
+BASE_ALGOS = ["PBFT", "HotStuff", "Raft", "CometBFT-light", "tPBFT"]
+LOAD_MODES = ["Uniform", "Zipf"]
+LAMBDAS = [250, 500, 1000, 1500, 2000, 2500]
+NODE_STEP = 8
+AXES = ("engines", "nodes", "repeats", "table_rows")
+
+
+@dataclass(frozen=True)
+class Scale:
+    """Sizes of a synthetic dataset; each axis can be grown on its own.
+
+    ``nodes`` counts node sizes (8, 16, 24, ...); the plots need at least 8, 16 and 32,
+    so it never drops below 4. ``engines`` keeps the five thesis algorithms first.
+    ``table_rows`` sets the non-node rows of the markdown tables (load modes, K values,
+    ablation groups, score rows) and the prose between them.
+    """
+
+    engines: int = 5
+    nodes: int = 4
+    repeats: int = 5
+    table_rows: int = 4
+
+    def scaled(self, axis: str, factor: int) -> "Scale":
+        value = getattr(self, axis) * factor
+        return replace(self, **{axis: value})
+
+    @property
+    def algos(self) -> list[str]:
+        extra = [f"Engine-{i + 1:02d}" for i in range(len(BASE_ALGOS), max(self.engines, len(BASE_ALGOS)))]
+        return BASE_ALGOS + extra
+
+    @property
+    def node_counts(self) -> list[int]:
+        return [NODE_STEP * (i + 1) for i in range(max(self.nodes, 4))]
+
+
+def engine_key(algo: str) -> str:
+    return algo.lower()
+
+
+def tsat_params(i: int) -> tuple[float, float]:
+    """Intercept and slope of the synthetic T_sat line for engine ``i``."""
+    return 2300.0 - 37.0 * (i % 17), -20.0 - 1.5 * (i % 5)
+
+
+def p99_params(i: int) -> tuple[float, float, float]:
+    """alpha, beta, gamma of the synthetic P99 parabola for engine ``i``."""
+    return 0.1 + 0.05 * (i % 5), 5.0 + (i % 7), 100.0 + 20.0 * (i % 9)
+
+
+def _pm(value: float, spread: float | None = None) -> str:
+    return f"{value:.2f} ± {spread if spread is not None else abs(value) * 0.05:.2f}"
+
+
+def _table(number: str, title: str, header: list[str], rows: list[list[object]], prose: int) -> str:
+    lines = [f"## 表{number} {title}", "", "| " + " | ".join(header) + " |", "|" + "---|" * len(header)]
+    lines += ["| " + " | ".join(str(cell) for cell in row) + " |" for row in rows]
+    lines.append("")
+    lines += [f"说明文字第{i + 1}行：该表数据由合成生成器产生，仅用于性能基准。" for i in range(prose)]
+    return "\n".join(lines) + "\n"
+
+
+def summary_markdown(scale: Scale) -> str:
+    algos = scale.algos
+    nodes = scale.node_counts
+    rows = max(scale.table_rows, 1)
+    prose = scale.table_rows
+    modes = LOAD_MODES + [f"Hotspot-{i}" for i in range(max(rows - len(LOAD_MODES), 0))]
+    ks = [k + 1 for k in range(rows)]
+    groups = [chr(ord("A") + i % 26) + (str(i // 26) if i >= 26 else "") + "组" for i in range(rows)]
+    parts = ["# 实验汇总（合成数据）\n"]
+    parts.append(
+        _table(
+            "3-3",
+            "负载模式敏感性",
+            ["算法", "负载模式D", "TPS(tx/s)", "P99(ms)"],
+            [[a, m, _pm(2000 - i * 10 - j * 50), _pm(200 + i * 3 + j * 10)] for i, a in enumerate(algos) for j, m in enumerate(modes)],
+            prose,
+        )
+    )
+    parts.append(
+        _table(
+            "3-4",
+            "CometBFT对照",
+            ["算法", "节点数N", "TPS(tx/s)", "P99(ms)"],
+            [[a, n, _pm(1800 - n * 10 - i * 100), _pm(150 + n * 5)] for i, a in enumerate(["CometBFT", "CometBFT-light"]) for n in nodes],
+            prose,
+        )
+    )
+    parts.append(
+        _table(
+            "3-5",
+            "基准实验",
+            ["算法", "节点数N", "TPS(tx/s)", "P50(ms)", "P95(ms)", "P99(ms)"],
+            [
+                [engine_key(a), n, _pm(2200 - n * 20 - i * 5), _pm(50 + n), _pm(90 + n * 2), _pm(120 + n * 4 + i)]
+                for i, a in enumerate(algos)
+                for n in nodes
+            ],
+            prose,
+        )
+    )
+    parts.append(_table("3-6", "性能退化率", ["算法", "Rdeg (%)"], [[a, f"{20 + i % 40:.1f}%"] for i, a in enumerate(algos)], prose))
+    parts.append(
+        _table(
+            "3-7",
+            "饱和扫描",
+            ["算法\\lambda", *map(str, LAMBDAS)],
+            [[a] + [_pm(min(lam, 1500 - i % 10 * 100) * 0.98) for lam in LAMBDAS] for i, a in enumerate(algos)],
+            prose,
+        )
+    )
+    parts.append(
+        _table(
+            "3-8",
+            "分组扫描",
+            ["K（分组数）", "M=32/K", "TPS (tx/s)", "P99 (ms)", "实测消息数每轮"],
+            [[k, max(32 // k, 1), _pm(1500 + k * 50), _pm(300 - k), k * max(32 // k, 1) ** 2 + k * k + 3] for k in ks],
+            prose,
+        )
+    )
+    parts.append(_table("3-9", "复杂度", ["K", "理论"], [[k, k * k] for k in ks], prose))
+    parts.append(
+        _table(
+            "3-10",
+            "消融实验",
+            ["组别", "16节点TPS", "32节点TPS", "16节点P99", "32节点P99"],
+            [[g, _pm(1500 + i * 10), _pm(1200 + i * 10), _pm(200 - i % 50), _pm(300 - i % 50)] for i, g in enumerate(groups)],
+            prose,
+        )
+    )
+    for n in range(11, 15):
+        parts.append(_table(f"3-{n}", "附表", ["a", "b"], [[i, i * 2] for i in range(rows)], prose))
+    parts.append(
+        _table(
+            "3-15",
+            "T_sat拟合",
+            ["算法", "α_A", "β_A", "R2"],
+            [[a, f"{tsat_params(i)[0]:.1f}", f"{tsat_params(i)[1]:.2f}", "0.98"] for i, a in enumerate(algos)],
+            prose,
+        )
+    )
+    parts.append(
+        _table(
+            "3-16",
+            "P99拟合",
+            ["算法", "alpha", "beta", "gamma"],
+            [[a, *(f"{v:.3f}" for v in p99_params(i))] for i, a in enumerate(algos)],
+            prose,
+        )
+    )
+    for n in (17, 18):
+        parts.append(_table(f"3-{n}", "附表", ["a", "b"], [[i, i * 2] for i in range(rows)], prose))
+    parts.append(
+        _table("3-19", "算法评分", ["算法配置A", "综合评分S"], [[a, f"{0.5 + (i % 6) * 0.08:.3f}"] for i, a in enumerate(algos)], prose)
+    )
+    parts.append(_table("3-20", "优化评分", ["实验组", "综合评分S"], [[g[0], f"{0.6 + (i % 4) * 0.1:.3f}"] for i, g in enumerate(groups)], prose))
+    return "\n".join(parts)
+
+
+def summary_json(scale: Scale, seed: int = 0, *, underscore: bool = False) -> dict:
+    """An experiment summary.json: ``{engine: {"N": {"mean": ..., "raw": [{"metrics": ...}]}}}``."""
+    rng = random.Random(seed)
+    out: dict[str, dict] = {}
+    for i, algo in enumerate(scale.algos[: max(scale.engines, 1)]):
+        key = engine_key(algo).replace("-", "_") if underscore else engine_key(algo)
+        intercept, slope = tsat_params(i)
+        alpha, beta, gamma = p99_params(i)
+        out[key] = {}
+        for n in scale.node_counts:
+            raw = [
+                {
+                    "repeat": r + 1,
+                    "metrics": {
+                        "tps": intercept + slope * n + rng.gauss(0, 80),
+                        "p99_ms": gamma + beta * n + alpha * n * n + rng.gauss(0, 30),
+                        "success_rate": 1.0,
+                    },
+                    "detail": {"blocks": list(range(5))},
+                }
+                for r in range(scale.repeats)
+            ]
+            out[key][str(n)] = {"mean": {"tps": intercept + slope * n}, "raw": raw}
+    return out
+
+
+def fit_summary(scale: Scale) -> dict:
+    """The generating parameters in the lab's fit_summary.json layout."""
+    out: dict[str, dict] = {"throughput": {}, "p99": {}}
+    for i, algo in enumerate(scale.algos[: max(scale.engines, 1)]):
+        intercept, slope = tsat_params(i)
+        alpha, beta, gamma = p99_params(i)
+        out["throughput"][engine_key(algo)] = {"intercept": intercept, "slope": slope, "r2": 0.98}
+        out["p99"][engine_key(algo)] = {"alpha": alpha, "beta": beta, "gamma": gamma, "r2": 0.98}
+    return out
+
+
+@dataclass
+class Dataset:
+    scale: Scale
+    summary_md: Path
+    exp1_summary: Path
+    exp7_summary: Path
+    exp7_fits: Path
+
+
+def write_dataset(root: Path, scale: Scale, seed: int = 0) -> Dataset:
+    """Write the three inputs in the hcap-lab ``experiments/`` layout under ``root``."""
+    report = root / "experiments" / "report"
+    exp1 = root / "experiments" / "exp1_benchmark" / "report"
+    exp7 = root / "experiments" / "exp7_extended_fit" / "report"
+    for path in (report, exp1, exp7):
+        path.mkdir(parents=True, exist_ok=True)
+    data = Dataset(scale, report / "summary_all.md", exp1 / "summary.json", exp7 / "summary.json", exp7 / "fit_summary.json")
+    data.summary_md.write_text(summary_markdown(scale), encoding="utf-8")
+    data.exp1_summary.write_text(json.dumps(summary_json(scale, seed, underscore=True)), encoding="utf-8")
+    data.exp7_summary.write_text(json.dumps(summary_json(scale, seed + 1)), encoding="utf-8")
+    data.exp7_fits.write_text(json.dumps(fit_summary(scale), indent=2), encoding="utf-8")
+    return data
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("out", type=Path, help="directory to receive the experiments/ tree")
+    defaults = Scale()
+    for axis in AXES:
+        parser.add_argument(f"--{axis.replace('_', '-')}", type=int, default=getattr(defaults, axis))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    scale = Scale(*(getattr(args, axis) for axis in AXES))
+    data = write_dataset(args.out, scale, args.seed)
+    for path in (data.summary_md, data.exp1_summary, data.exp7_summary, data.exp7_fits):
+        print(f"created {path} ({path.stat().st_size / 1024:.0f} KiB)")
+
+
+if __name__ == "__main__":
+    main()
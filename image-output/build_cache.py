@@ -0,0 +1,94 @@
+"""Content-addressed build cache shared by the figure generator scripts."""
+from __future__ import annotations
+
+import dataclasses
+import hashlib
+import inspect
+import json
+import os
+from pathlib import Path
+from types import ModuleType
+from typing import Any, Callable, Iterable, Mapping
+
+
+CACHE_NAME = ".build_cache.json"
+
+
+def _encode(obj: Any) -> Any:
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return {f.name: getattr(obj, f.name) for f in dataclasses.fields(obj) if not f.name.startswith("_")}
+    if hasattr(obj, "tobytes") and hasattr(obj, "dtype"):
+        return [str(obj.dtype), list(obj.shape), hashlib.sha256(obj.tobytes()).hexdigest()]
+    return str(obj)
+
+
+def digest(*parts: Any) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(json.dumps(part, sort_keys=True, ensure_ascii=False, default=_encode).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def file_digest(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def source_digest(*objects: Callable[..., Any] | ModuleType) -> str:
+    """Digest of the source of functions or whole helper modules that shape an output."""
+    return digest([inspect.getsource(obj) for obj in objects])
+
+
+def module_constants(namespace: Mapping[str, Any]) -> dict[str, Any]:
+    """Upper-case plain-data settings (colors, orders, sizes) that change rendered output."""
+    constants = {}
+    for name, value in namespace.items():
+        if not name.isupper() or isinstance(value, Path):
+            continue
+        try:
+            json.dumps(value)
+        except (TypeError, ValueError):
+            continue
+        constants[name] = value
+    return constants
+
+
+class BuildCache:
+    """Maps an output label to the digest of everything that produced it."""
+
+    def __init__(self, out_dir: Path) -> None:
+        self.out_dir = out_dir
+        self.path = out_dir / CACHE_NAME
+        try:
+            self.entries: dict[str, dict[str, Any]] = json.loads(self.path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            self.entries = {}
+
+    def outputs(self, label: str) -> list[str]:
+        return sorted(path.name for path in self.out_dir.glob(f"{label}[._]*") if path.name != CACHE_NAME)
+
+    def fresh(self, label: str, key: str) -> bool:
+        entry = self.entries.get(label)
+        if not entry or entry.get("digest") != key:
+            return False
+        return all((self.out_dir / name).exists() for name in entry.get("outputs", []))
+
+    def record(self, label: str, key: str) -> None:
+        self.entries[label] = {"digest": key, "outputs": self.outputs(label)}
+
+    def forget(self, labels: Iterable[str] | None = None) -> None:
+        if labels is None:
+            self.entries.clear()
+        else:
+            for label in labels:
+                self.entries.pop(label, None)
+
+    def save(self) -> None:
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.entries, ensure_ascii=False, indent=2, sort_keys=True), encoding="utf-8")
+        os.replace(tmp, self.path)
@@ -0,0 +1,147 @@
+"""Vectorized node-count capacity under P99 and T_sat service-level limits."""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Mapping, Sequence
+
+import numpy as np
+
+
+P99_LIMITS = (500.0, 1000.0, 2000.0, 3000.0, 5000.0)
+MIN_TSAT = (250.0, 500.0, 1000.0, 1500.0)
+MAX_N = 1024
+EPS = 1e-12
+# Slack when flooring interval ends, so N that sits exactly on a limit still counts.
+ROUND_SLACK = 1e-9
+
+
+@dataclass
+class CapacityModel:
+    """Fit parameters as arrays: P99 = alpha*N^2 + beta*N + gamma, T_sat = intercept + slope*N."""
+
+    engines: list[str]
+    alpha: np.ndarray
+    beta: np.ndarray
+    gamma: np.ndarray
+    intercept: np.ndarray
+    slope: np.ndarray
+
+    @classmethod
+    def from_fits(cls, fits: Mapping[str, Mapping], engines: Sequence[str] | None = None) -> "CapacityModel":
+        """Build from the fit_summary.json layout; engines missing a T_sat fit are unconstrained by it."""
+        engines = list(engines) if engines is not None else list(fits["p99"])
+        p99 = [fits["p99"][engine] for engine in engines]
+        tsat = [fits.get("throughput", {}).get(engine, {"intercept": np.inf, "slope": 0.0}) for engine in engines]
+        return cls(
+            engines,
+            np.array([float(f["alpha"]) for f in p99]),
+            np.array([float(f["beta"]) for f in p99]),
+            np.array([float(f["gamma"]) for f in p99]),
+            np.array([float(f["intercept"]) for f in tsat]),
+            np.array([float(f["slope"]) for f in tsat]),
+        )
+
+
+def _empty(shape: tuple[int, ...]) -> tuple[np.ndarray, np.ndarray]:
+    return np.full(shape, np.inf), np.full(shape, -np.inf)
+
+
+def _roots(a: np.ndarray, b: np.ndarray, c: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Real roots (low, high) of a*N^2 + b*N + c, plus whether they exist; degenerate a gives NaN."""
+    quad = np.abs(a) >= EPS
+    disc = b * b - 4.0 * a * c
+    real = quad & (disc >= 0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        root = np.sqrt(np.where(real, disc, 0.0))
+        r1 = (-b - root) / (2.0 * a)
+        r2 = (-b + root) / (2.0 * a)
+    low = np.where(real, np.minimum(r1, r2), np.nan)
+    high = np.where(real, np.maximum(r1, r2), np.nan)
+    return low, high, real
+
+
+def p99_intervals(
+    alpha: np.ndarray, beta: np.ndarray, gamma: np.ndarray, limit: np.ndarray
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """The set {N : P99(N) <= limit} as two broadcast intervals ``[lo1, hi1] U [lo2, hi2]``.
+
+    Empty intervals are ``[inf, -inf]``. A concave or linear fit can leave one side unbounded.
+    """
+    a, b, limit = np.broadcast_arrays(alpha, beta, limit)
+    c = np.broadcast_to(gamma, a.shape) - limit
+    shape = a.shape
+    lo1, hi1 = _empty(shape)
+    lo2, hi2 = _empty(shape)
+    low, high, real = _roots(a, b, c)
+    convex = a >= EPS
+    concave = a <= -EPS
+    linear = ~convex & ~concave
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cross = -c / b
+
+    mask = convex & real
+    lo1[mask], hi1[mask] = low[mask], high[mask]
+    mask = concave & ~real
+    lo1[mask], hi1[mask] = -np.inf, np.inf
+    mask = concave & real
+    lo1[mask], hi1[mask] = -np.inf, low[mask]
+    lo2[mask], hi2[mask] = high[mask], np.inf
+    rising = linear & (b >= EPS)
+    lo1[rising], hi1[rising] = -np.inf, cross[rising]
+    falling = linear & (b <= -EPS)
+    lo1[falling], hi1[falling] = cross[falling], np.inf
+    flat = linear & ~rising & ~falling & (c <= 0)
+    lo1[flat], hi1[flat] = -np.inf, np.inf
+    return lo1, hi1, lo2, hi2
+
+
+def tsat_interval(intercept: np.ndarray, slope: np.ndarray, minimum: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """The interval {N : intercept + slope*N >= minimum}, broadcast."""
+    intercept, slope, minimum = np.broadcast_arrays(intercept, slope, minimum)
+    lo, hi = _empty(intercept.shape)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cross = (minimum - intercept) / slope
+    up = slope >= EPS
+    down = slope <= -EPS
+    flat = ~up & ~down & (intercept >= minimum)
+    lo[up], hi[up] = cross[up], np.inf
+    lo[down], hi[down] = -np.inf, cross[down]
+    lo[flat], hi[flat] = -np.inf, np.inf
+    return lo, hi
+
+
+def p99_crossing(alpha: np.ndarray, beta: np.ndarray, gamma: np.ndarray, limit: np.ndarray) -> np.ndarray:
+    """Smallest positive N where P99(N) reaches ``limit``; NaN when it never does."""
+    a, b, limit = np.broadcast_arrays(alpha, beta, limit)
+    c = np.broadcast_to(gamma, a.shape) - limit
+    low, high, _ = _roots(a, b, c)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        linear = np.where(np.abs(b) >= EPS, -c / b, np.nan)
+    low = np.where(np.abs(a) < EPS, linear, low)
+    high = np.where(np.abs(a) < EPS, np.nan, high)
+    return np.where(low > 0, low, np.where(high > 0, high, np.nan))
+
+
+def solve(
+    model: CapacityModel,
+    p99_limits: Sequence[float] = P99_LIMITS,
+    min_tsat: Sequence[float] = MIN_TSAT,
+    max_n: int = MAX_N,
+) -> np.ndarray:
+    """Largest integer N in ``[1, max_n]`` meeting both limits, shaped ``(engines, p99_limits, min_tsat)``.
+
+    0 marks an SLO combination no cluster size satisfies.
+    """
+    e = (slice(None), None, None)
+    limits = np.asarray(p99_limits, dtype=float)[None, :, None]
+    tsat = np.asarray(min_tsat, dtype=float)[None, None, :]
+    lo1, hi1, lo2, hi2 = p99_intervals(model.alpha[e], model.beta[e], model.gamma[e], limits)
+    t_lo, t_hi = tsat_interval(model.intercept[e], model.slope[e], tsat)
+    shape = np.broadcast_shapes(lo1.shape, t_lo.shape)
+    best = np.zeros(shape, dtype=np.int64)
+    for lo, hi in ((lo1, hi1), (lo2, hi2)):
+        start = np.ceil(np.maximum(np.maximum(lo, t_lo), 1.0) - ROUND_SLACK)
+        stop = np.floor(np.minimum(np.minimum(hi, t_hi), max_n) + ROUND_SLACK)
+        feasible = stop >= start
+        best = np.maximum(best, np.where(feasible, stop, 0).astype(np.int64))
+    return best
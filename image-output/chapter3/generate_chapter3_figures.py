@@ -1,7 +1,12 @@
 #!/usr/bin/env python3
-"""Compatibility entrypoint for Chapter 3 thesis figures."""
-import runpy
+"""Compatibility entrypoint for Chapter 3 thesis figures; forwards to `hcp_figures.py chapter3`."""
+import sys
 from pathlib import Path
 
 
-runpy.run_path(str(Path(__file__).resolve().parents[1] / "generate_thesis_figures.py"), run_name="__main__")
+if __name__ == "__main__":
+    # Worker processes import the generator by module name, so its directory must be importable.
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+    import hcp_figures
+
+    hcp_figures.main(["chapter3", *sys.argv[1:]])
@@ -0,0 +1,410 @@
+"""Record diagram drawing calls once and emit them as a PIL raster, SVG or PDF.
+
+``Drawing`` implements the subset of ``ImageDraw`` the Chapter 4 primitives use
+(``rounded_rectangle``, ``line``, ``polygon``, ``text``) and keeps the calls as a
+display list. Rasterizing replays that list on a real ``ImageDraw``, so PNG output
+is unchanged; SVG and PDF are written straight from the list with no pixel buffer.
+Text is measured and placed with the same PIL font metrics in every backend, and
+the PDF embeds a subset of each TrueType/OpenType font used (via fontTools).
+"""
+from __future__ import annotations
+
+import functools
+import hashlib
+import io
+import struct
+import zlib
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Iterable, Sequence
+from xml.sax.saxutils import escape
+
+from PIL import Image, ImageColor, ImageDraw, ImageFont
+
+Font = ImageFont.FreeTypeFont | ImageFont.ImageFont
+Point = tuple[float, float]
+
+# PDF page scale in points per canvas pixel; matches the 150 dpi of the former raster PDFs.
+PDF_SCALE = 72.0 / 150.0
+# Cubic Bézier handle length for a quarter circle.
+KAPPA = 0.5522847498
+
+
+@dataclass
+class Drawing:
+    width: int
+    height: int
+    background: str = "#FFFFFF"
+    ops: list[tuple[str, dict[str, Any]]] = field(default_factory=list)
+
+    def rounded_rectangle(
+        self,
+        xy: Sequence[float],
+        radius: float = 0,
+        fill: str | None = None,
+        outline: str | None = None,
+        width: int = 1,
+    ) -> None:
+        self.ops.append(("rounded_rectangle", {"xy": tuple(xy), "radius": radius, "fill": fill, "outline": outline, "width": width}))
+
+    def line(self, xy: Sequence[Point], fill: str | None = None, width: int = 0) -> None:
+        self.ops.append(("line", {"xy": [tuple(p) for p in xy], "fill": fill, "width": width}))
+
+    def polygon(self, xy: Sequence[Point], fill: str | None = None) -> None:
+        self.ops.append(("polygon", {"xy": [tuple(p) for p in xy], "fill": fill}))
+
+    def text(self, xy: Point, text: str, fill: str | None = None, font: Font | None = None, anchor: str | None = None) -> None:
+        self.ops.append(("text", {"xy": tuple(xy), "text": text, "fill": fill, "font": font, "anchor": anchor}))
+
+    def replay(self, draw: ImageDraw.ImageDraw) -> None:
+        for name, kwargs in self.ops:
+            getattr(draw, name)(**kwargs)
+
+    def rasterize(self) -> Image.Image:
+        img = Image.new("RGB", (self.width, self.height), self.background)
+        self.replay(ImageDraw.Draw(img))
+        return img
+
+    def to_svg(self) -> str:
+        return _svg(self)
+
+    def to_pdf(self) -> bytes:
+        return _pdf(self)
+
+
+def _stroke_rect(xy: Sequence[float], radius: float, width: float) -> tuple[float, float, float, float, float]:
+    """Path of a PIL rounded rectangle outline: PIL boxes are inclusive and strokes sit inside them."""
+    x0, y0, x1, y1 = xy
+    inset = width / 2 if width else 0.0
+    return x0 + inset, y0 + inset, x1 + 1 - inset, y1 + 1 - inset, max(radius - inset, 0.0)
+
+
+def _text_origin(font: Font, text: str, xy: Point, anchor: str | None) -> tuple[float, float, str]:
+    """Baseline start point and horizontal alignment (l/m/r) equivalent to a PIL text anchor."""
+    horizontal, vertical = (anchor or "la")[0], (anchor or "la")[1]
+    x, y = xy
+    ascent, descent = font.getmetrics() if hasattr(font, "getmetrics") else (font.getbbox(text)[3], 0)
+    if vertical == "a":
+        y += ascent
+    elif vertical == "m":
+        y += (ascent - descent) / 2
+    elif vertical == "d":
+        y -= descent
+    elif vertical == "t":
+        y -= font.getbbox(text, anchor="ls")[1]
+    align = {"l": "l", "m": "m", "r": "r"}.get(horizontal, "l")
+    return x, y, align
+
+
+def _font_family(font: Font) -> tuple[str, bool]:
+    if isinstance(font, ImageFont.FreeTypeFont):
+        family, style = font.getname()
+        return family or "sans-serif", "bold" in (style or "").lower()
+    return "sans-serif", False
+
+
+def _num(value: float) -> str:
+    return f"{value:.2f}".rstrip("0").rstrip(".")
+
+
+def _svg(drawing: Drawing) -> str:
+    anchors = {"l": "start", "m": "middle", "r": "end"}
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{drawing.width}" height="{drawing.height}" '
+        f'viewBox="0 0 {drawing.width} {drawing.height}">',
+        f'<rect width="100%" height="100%" fill="{drawing.background}"/>',
+    ]
+    for name, op in drawing.ops:
+        if name == "rounded_rectangle":
+            width = op["width"] if op["outline"] else 0
+            x0, y0, x1, y1, r = _stroke_rect(op["xy"], op["radius"], width)
+            stroke = f' stroke="{op["outline"]}" stroke-width="{width}"' if width else ""
+            parts.append(
+                f'<rect x="{_num(x0)}" y="{_num(y0)}" width="{_num(x1 - x0)}" height="{_num(y1 - y0)}" '
+                f'rx="{_num(r)}" fill="{op["fill"] or "none"}"{stroke}/>'
+            )
+        elif name == "line":
+            points = " ".join(f"{_num(x)},{_num(y)}" for x, y in op["xy"])
+            parts.append(f'<polyline points="{points}" fill="none" stroke="{op["fill"]}" stroke-width="{op["width"] or 1}"/>')
+        elif name == "polygon":
+            points = " ".join(f"{_num(x)},{_num(y)}" for x, y in op["xy"])
+            parts.append(f'<polygon points="{points}" fill="{op["fill"]}"/>')
+        elif name == "text":
+            font = op["font"] or ImageFont.load_default()
+            x, y, align = _text_origin(font, op["text"], op["xy"], op["anchor"])
+            family, bold = _font_family(font)
+            size = getattr(font, "size", 11)
+            weight = ' font-weight="bold"' if bold else ""
+            parts.append(
+                f'<text x="{_num(x)}" y="{_num(y)}" font-family="{escape(family)}, sans-serif" font-size="{size}"{weight} '
+                f'fill="{op["fill"]}" text-anchor="{anchors[align]}">{escape(op["text"])}</text>'
+            )
+    parts.append("</svg>")
+    return "\n".join(parts) + "\n"
+
+
+def _rgb(color: str) -> str:
+    r, g, b = ImageColor.getrgb(color)[:3]
+    return f"{r / 255:.4g} {g / 255:.4g} {b / 255:.4g}"
+
+
+def _rounded_path(x0: float, y0: float, x1: float, y1: float, r: float) -> str:
+    r = min(r, (x1 - x0) / 2, (y1 - y0) / 2)
+    if r <= 0:
+        return f"{_num(x0)} {_num(y0)} {_num(x1 - x0)} {_num(y1 - y0)} re"
+    k = r * (1 - KAPPA)
+    n = _num
+    return " ".join(
+        [
+            f"{n(x0 + r)} {n(y0)} m",
+            f"{n(x1 - r)} {n(y0)} l",
+            f"{n(x1 - k)} {n(y0)} {n(x1)} {n(y0 + k)} {n(x1)} {n(y0 + r)} c",
+            f"{n(x1)} {n(y1 - r)} l",
+            f"{n(x1)} {n(y1 - k)} {n(x1 - k)} {n(y1)} {n(x1 - r)} {n(y1)} c",
+            f"{n(x0 + r)} {n(y1)} l",
+            f"{n(x0 + k)} {n(y1)} {n(x0)} {n(y1 - k)} {n(x0)} {n(y1 - r)} c",
+            f"{n(x0)} {n(y0 + r)} l",
+            f"{n(x0)} {n(y0 + k)} {n(x0 + k)} {n(y0)} {n(x0 + r)} {n(y0)} c",
+            "h",
+        ]
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def _load_font(path: str, index: int):
+    from fontTools.ttLib import TTFont
+
+    return TTFont(path, fontNumber=index, lazy=True)
+
+
+@functools.lru_cache(maxsize=None)
+def _font_tables(path: str, index: int) -> dict[str, bytes]:
+    """Raw sfnt tables of face ``index`` of a TrueType/OpenType file or collection."""
+    data = Path(path).read_bytes()
+    offset = struct.unpack_from(">I", data, 12 + 4 * index)[0] if data[:4] == b"ttcf" else 0
+    count = struct.unpack_from(">H", data, offset + 4)[0]
+    tables = {}
+    for i in range(count):
+        tag, _, start, length = struct.unpack_from(">4sIII", data, offset + 12 + 16 * i)
+        tables[tag.decode("latin-1")] = data[start : start + length]
+    return tables
+
+
+def _checksum(data: bytes) -> int:
+    padded = data + b"\0" * (-len(data) % 4)
+    return sum(struct.unpack(f">{len(padded) // 4}I", padded)) & 0xFFFFFFFF
+
+
+def _subset_glyf(tables: dict[str, bytes], gids: Iterable[int]) -> bytes:
+    """TrueType font keeping only the outlines of ``gids`` (and their components) at their original ids.
+
+    Unused glyphs become empty, so glyph ids, metrics and hinting tables carry over
+    unchanged; this takes about a millisecond where a full fontTools subset re-parses
+    the whole font.
+    """
+    head = tables["head"]
+    glyphs = struct.unpack_from(">H", tables["maxp"], 4)[0]
+    if struct.unpack_from(">h", head, 50)[0]:
+        loca = struct.unpack_from(f">{glyphs + 1}I", tables["loca"])
+    else:
+        loca = [2 * v for v in struct.unpack_from(f">{glyphs + 1}H", tables["loca"])]
+    glyf = tables["glyf"]
+    keep: set[int] = set()
+    todo = [0, *gids]
+    while todo:
+        gid = todo.pop()
+        if gid in keep or gid >= glyphs:
+            continue
+        keep.add(gid)
+        start, end = loca[gid], loca[gid + 1]
+        if end - start < 10 or struct.unpack_from(">h", glyf, start)[0] >= 0:
+            continue
+        # Composite glyph: queue every component.
+        pos, more = start + 10, True
+        while more:
+            flags, component = struct.unpack_from(">HH", glyf, pos)
+            todo.append(component)
+            pos += 4 + (4 if flags & 0x0001 else 2) + (2 if flags & 0x0008 else 4 if flags & 0x0040 else 8 if flags & 0x0080 else 0)
+            more = bool(flags & 0x0020)
+    out_glyf = bytearray()
+    offsets = []
+    for gid in range(glyphs):
+        offsets.append(len(out_glyf))
+        if gid in keep:
+            out_glyf += glyf[loca[gid] : loca[gid + 1]]
+            out_glyf += b"\0" * (-len(out_glyf) % 4)
+    offsets.append(len(out_glyf))
+    subset = {tag: tables[tag] for tag in ("hhea", "hmtx", "maxp", "cvt ", "fpgm", "prep") if tag in tables}
+    # Long loca offsets; checkSumAdjustment is left at zero.
+    subset["head"] = head[:8] + b"\0\0\0\0" + head[12:50] + struct.pack(">h", 1) + head[52:]
+    subset["loca"] = struct.pack(f">{len(offsets)}I", *offsets)
+    subset["glyf"] = bytes(out_glyf)
+    return _sfnt(subset)
+
+
+def _sfnt(tables: dict[str, bytes]) -> bytes:
+    count = len(tables)
+    power = 1 << (count.bit_length() - 1)
+    header = struct.pack(">IHHHH", 0x00010000, count, power * 16, power.bit_length() - 1, count * 16 - power * 16)
+    directory, body = bytearray(), bytearray()
+    offset = 12 + 16 * count
+    for tag in sorted(tables):
+        data = tables[tag]
+        directory += struct.pack(">4sIII", tag.encode("latin-1"), _checksum(data), offset + len(body), len(data))
+        body += data + b"\0" * (-len(data) % 4)
+    return header + bytes(directory) + bytes(body)
+
+
+def _subset_cff(path: str, index: int, gids: Iterable[int]) -> bytes:
+    """OpenType/CFF font reduced to ``gids`` with fontTools, keeping the original ids."""
+    from fontTools import subset
+
+    options = subset.Options()
+    options.retain_gids = True
+    options.notdef_outline = True
+    options.name_IDs = ["*"]
+    options.layout_features = []
+    options.drop_tables += ["GSUB", "GPOS", "GDEF", "DSIG", "FFTM"]
+    font = _load_font.__wrapped__(path, index)
+    subsetter = subset.Subsetter(options)
+    subsetter.populate(gids=[0, *gids])
+    subsetter.subset(font)
+    buffer = io.BytesIO()
+    font.save(buffer)
+    return buffer.getvalue()
+
+
+class _PdfFont:
+    """One embedded font: Identity-H codes (glyph ids, or CIDs for CID-keyed CFF) and the glyphs used."""
+
+    def __init__(self, path: str, index: int, resource: str) -> None:
+        self.path, self.index, self.resource = path, index, resource
+        self.tt = _load_font(path, index)
+        self.cmap = self.tt.getBestCmap() or {}
+        self.cff = "CFF " in self.tt
+        self.cid_keyed = self.cff and hasattr(self.tt["CFF "].cff.topDictIndex[0], "ROS")
+        self.used: dict[int, tuple[str, str]] = {}
+
+    def encode(self, text: str) -> str:
+        codes = []
+        for ch in text:
+            glyph = self.cmap.get(ord(ch), ".notdef")
+            code = int(glyph[3:]) if self.cid_keyed and glyph.startswith("cid") else self.tt.getGlyphID(glyph)
+            self.used.setdefault(code, (glyph, ch))
+            codes.append(f"{code:04X}")
+        return "".join(codes)
+
+    def objects(self, first: int) -> list[bytes]:
+        """PDF objects numbered from ``first``: Type0, CIDFont, descriptor, font file, ToUnicode."""
+        tt = self.tt
+        upem = tt["head"].unitsPerEm
+        scale = 1000.0 / upem
+        gids = [tt.getGlyphID(name) for name, _ in self.used.values()]
+        data = _subset_cff(self.path, self.index, gids) if self.cff else _subset_glyf(_font_tables(self.path, self.index), gids)
+
+        tag = "".join(chr(65 + b % 26) for b in hashlib.sha1(repr(sorted(self.used)).encode()).digest()[:6])
+        base = (tt["name"].getDebugName(6) or "Font").replace(" ", "")
+        name = f"{tag}+{base}"
+        hmtx = tt["hmtx"]
+        widths = " ".join(f"{code} [{round(hmtx[glyph][0] * scale)}]" for code, (glyph, _) in sorted(self.used.items()))
+        head, hhea = tt["head"], tt["hhea"]
+        bbox = " ".join(str(round(v * scale)) for v in (head.xMin, head.yMin, head.xMax, head.yMax))
+        cap = getattr(tt["OS/2"], "sCapHeight", 0) if "OS/2" in tt else 0
+        type0, cid, desc, file, tounicode = range(first, first + 5)
+        subtype = "CIDFontType0" if self.cff else "CIDFontType2"
+        file_key = "FontFile3" if self.cff else "FontFile2"
+        gid_map = "" if self.cff else " /CIDToGIDMap /Identity"
+        mappings = "\n".join(
+            f"<{code:04X}> <{ch.encode('utf-16-be').hex().upper()}>" for code, (_, ch) in sorted(self.used.items())
+        )
+        cmap = (
+            "/CIDInit /ProcSet findresource begin 12 dict begin begincmap\n"
+            "/CIDSystemInfo << /Registry (Adobe) /Ordering (UCS) /Supplement 0 >> def\n"
+            "/CMapName /Adobe-Identity-UCS def /CMapType 2 def\n"
+            "1 begincodespacerange <0000> <FFFF> endcodespacerange\n"
+            f"{len(self.used)} beginbfchar\n{mappings}\nendbfchar\n"
+            "endcmap CMapName currentdict /CMap defineresource pop end end"
+        ).encode()
+        file_extra = " /Subtype /OpenType" if self.cff else f" /Length1 {len(data)}"
+        return [
+            f"<< /Type /Font /Subtype /Type0 /BaseFont /{name} /Encoding /Identity-H "
+            f"/DescendantFonts [{cid} 0 R] /ToUnicode {tounicode} 0 R >>".encode(),
+            f"<< /Type /Font /Subtype /{subtype} /BaseFont /{name} "
+            f"/CIDSystemInfo << /Registry (Adobe) /Ordering (Identity) /Supplement 0 >> "
+            f"/FontDescriptor {desc} 0 R /DW 1000 /W [{widths}]{gid_map} >>".encode(),
+            f"<< /Type /FontDescriptor /FontName /{name} /Flags 4 /FontBBox [{bbox}] /ItalicAngle 0 "
+            f"/Ascent {round(hhea.ascent * scale)} /Descent {round(hhea.descent * scale)} "
+            f"/CapHeight {round((cap or hhea.ascent) * scale)} /StemV 80 /{file_key} {file} 0 R >>".encode(),
+            _stream(data, file_extra),
+            _stream(cmap),
+        ]
+
+
+def _stream(data: bytes, extra: str = "") -> bytes:
+    packed = zlib.compress(data, 6)
+    return f"<< /Length {len(packed)} /Filter /FlateDecode{extra} >>\nstream\n".encode() + packed + b"\nendstream"
+
+
+def _pdf(drawing: Drawing) -> bytes:
+    fonts: dict[tuple[str, int], _PdfFont] = {}
+    s = PDF_SCALE
+    content = [f"q {_num(s)} 0 0 {_num(-s)} 0 {_num(drawing.height * s)} cm", f"{_rgb(drawing.background)} rg"]
+    content.append(f"0 0 {drawing.width} {drawing.height} re f")
+    for name, op in drawing.ops:
+        if name == "rounded_rectangle":
+            width = op["width"] if op["outline"] else 0
+            x0, y0, x1, y1, r = _stroke_rect(op["xy"], op["radius"], width)
+            paint = []
+            if op["fill"]:
+                paint.append(f"{_rgb(op['fill'])} rg")
+            if width:
+                paint.append(f"{_rgb(op['outline'])} RG {width} w")
+            op_code = "B" if op["fill"] and width else ("f" if op["fill"] else "S")
+            content.append(" ".join(paint) + " " + _rounded_path(x0, y0, x1, y1, r) + " " + op_code)
+        elif name == "line":
+            (x0, y0), *rest = op["xy"]
+            segments = " ".join(f"{_num(x)} {_num(y)} l" for x, y in rest)
+            content.append(f"{_rgb(op['fill'])} RG {op['width'] or 1} w {_num(x0)} {_num(y0)} m {segments} S")
+        elif name == "polygon":
+            (x0, y0), *rest = op["xy"]
+            segments = " ".join(f"{_num(x)} {_num(y)} l" for x, y in rest)
+            content.append(f"{_rgb(op['fill'])} rg {_num(x0)} {_num(y0)} m {segments} h f")
+        elif name == "text":
+            font = op["font"]
+            if not isinstance(font, ImageFont.FreeTypeFont):
+                raise ValueError("PDF output needs TrueType/OpenType fonts; no font file was found for the diagrams")
+            key = (font.path, font.index)
+            if key not in fonts:
+                fonts[key] = _PdfFont(font.path, font.index, f"F{len(fonts) + 1}")
+            pdf_font = fonts[key]
+            x, y, align = _text_origin(font, op["text"], op["xy"], op["anchor"])
+            x -= {"l": 0.0, "m": 0.5, "r": 1.0}[align] * font.getlength(op["text"])
+            content.append(
+                f"BT {_rgb(op['fill'])} rg /{pdf_font.resource} {font.size} Tf 1 0 0 -1 {_num(x)} {_num(y)} Tm "
+                f"<{pdf_font.encode(op['text'])}> Tj ET"
+            )
+    content.append("Q")
+
+    objects: list[bytes] = []
+    # 1 catalog, 2 pages, 3 page, 4 content; fonts follow.
+    font_refs = " ".join(f"/{f.resource} {5 + i * 5} 0 R" for i, f in enumerate(fonts.values()))
+    objects.append(b"<< /Type /Catalog /Pages 2 0 R >>")
+    objects.append(b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>")
+    objects.append(
+        f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {_num(drawing.width * s)} {_num(drawing.height * s)}] "
+        f"/Resources << /Font << {font_refs} >> >> /Contents 4 0 R >>".encode()
+    )
+    objects.append(_stream("\n".join(content).encode()))
+    for i, pdf_font in enumerate(fonts.values()):
+        objects.extend(pdf_font.objects(5 + i * 5))
+
+    out = bytearray(b"%PDF-1.6\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
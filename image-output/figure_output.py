@@ -0,0 +1,178 @@
+"""Write one rendered figure as PNG, SVG, PDF and a thumbnail with tuned encoders."""
+from __future__ import annotations
+
+import argparse
+import atexit
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from PIL import Image
+
+import stage_trace
+
+if TYPE_CHECKING:
+    from matplotlib.figure import Figure
+
+    from diagram_backend import Drawing
+
+
+FORMATS = ("png", "svg", "pdf", "thumb")
+THUMB_WIDTH = 480
+ENCODE_THREADS = 4
+
+_POOL: ThreadPoolExecutor | None = None
+
+
+@dataclass(frozen=True)
+class OutputOptions:
+    formats: tuple[str, ...] = ("png",)
+    compress_level: int = 6
+    optimize: bool = False
+    # Keep the figure's own canvas instead of trimming to the tight bounding box.
+    fixed_layout: bool = False
+    thumb_width: int = THUMB_WIDTH
+
+    def paths(self, path: Path) -> dict[str, Path]:
+        """Output file per requested format; ``path`` is the PNG name the figure always had."""
+        stem = path.with_suffix("")
+        names = {"png": path, "svg": stem.with_suffix(".svg"), "pdf": stem.with_suffix(".pdf")}
+        names["thumb"] = stem.with_name(stem.name + ".thumb.png")
+        return {fmt: names[fmt] for fmt in self.formats}
+
+
+def parse_formats(text: str) -> tuple[str, ...]:
+    formats = tuple(dict.fromkeys(part.strip().lower() for part in text.split(",") if part.strip()))
+    unknown = [fmt for fmt in formats if fmt not in FORMATS]
+    if unknown or not formats:
+        raise argparse.ArgumentTypeError(f"unknown format(s): {', '.join(unknown) or '(none)'}; choose from {', '.join(FORMATS)}")
+    return formats
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--formats",
+        type=parse_formats,
+        default=("png",),
+        help=f"comma-separated outputs per figure: {', '.join(FORMATS)} (default: png)",
+    )
+    parser.add_argument("--png-level", type=int, default=6, choices=range(10), metavar="0-9", help="zlib level for PNG output")
+    parser.add_argument("--png-optimize", action="store_true", help="let the PNG encoder search for a smaller encoding")
+    parser.add_argument("--fixed-layout", action="store_true", help="skip the tight bounding-box trim and keep the full canvas")
+
+
+def options_from_args(args: argparse.Namespace) -> OutputOptions:
+    return OutputOptions(args.formats, args.png_level, args.png_optimize, args.fixed_layout)
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _POOL
+    if _POOL is None:
+        _POOL = ThreadPoolExecutor(max_workers=min(ENCODE_THREADS, os.cpu_count() or 1))
+        atexit.register(_POOL.shutdown)
+    return _POOL
+
+
+def _write_png(img: Image.Image, path: Path, options: OutputOptions, dpi: float | None = None) -> None:
+    extra = {"dpi": (dpi, dpi)} if dpi else {}
+    with stage_trace.span("encode.png", cat="output", file=path.name):
+        img.save(path, format="PNG", compress_level=options.compress_level, optimize=options.optimize, **extra)
+
+
+def _write_thumb(img: Image.Image, path: Path, options: OutputOptions) -> None:
+    with stage_trace.span("encode.thumb", cat="output", file=path.name):
+        thumb = img.copy()
+        thumb.thumbnail((options.thumb_width, options.thumb_width * 4), Image.Resampling.LANCZOS)
+        thumb.save(path, format="PNG", compress_level=options.compress_level, optimize=options.optimize)
+
+
+def _write_vector(drawing: Drawing, path: Path, fmt: str) -> None:
+    with stage_trace.span(f"encode.{fmt}", cat="output", file=path.name):
+        if fmt == "svg":
+            path.write_text(drawing.to_svg(), encoding="utf-8")
+        else:
+            path.write_bytes(drawing.to_pdf())
+
+
+def _encode_raster(img: Image.Image, paths: dict[str, Path], options: OutputOptions, dpi: float | None) -> list[Future]:
+    futures = []
+    if "png" in paths:
+        futures.append(_pool().submit(_write_png, img, paths["png"], options, dpi))
+    if "thumb" in paths:
+        futures.append(_pool().submit(_write_thumb, img, paths["thumb"], options))
+    return futures
+
+
+def save_figure(fig: Figure, path: Path, options: OutputOptions, *, dpi: float = 300, pad_inches: float = 0.1) -> list[Path]:
+    """Draw ``fig`` once with Agg and encode every requested format from that render.
+
+    The raster outputs are cropped from the single draw to the padded tight box, so
+    there is no second layout pass; vector outputs reuse the same box. Encoding runs
+    on a thread pool while the vector backends draw.
+    """
+    import numpy as np
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.transforms import Bbox
+
+    paths = options.paths(path)
+    original_dpi = fig.dpi
+    canvas = FigureCanvasAgg(fig)
+    fig.set_dpi(dpi)
+    try:
+        with stage_trace.span("draw", cat="output"):
+            canvas.draw()
+        full = Bbox.from_bounds(0, 0, fig.get_figwidth(), fig.get_figheight())
+        bbox = None
+        if not options.fixed_layout:
+            with stage_trace.span("tight_bbox", cat="output"):
+                bbox = fig.get_tightbbox(canvas.get_renderer()).padded(pad_inches)
+        img = Image.fromarray(np.asarray(canvas.buffer_rgba())).convert("RGB")
+    finally:
+        fig.set_dpi(original_dpi)
+    if bbox is not None and full.containsx(bbox.x0) and full.containsx(bbox.x1) and full.containsy(bbox.y0) and full.containsy(bbox.y1):
+        height = img.height
+        img = img.crop(
+            (
+                int(round(bbox.x0 * dpi)),
+                int(round(height - bbox.y1 * dpi)),
+                int(round(bbox.x1 * dpi)),
+                int(round(height - bbox.y0 * dpi)),
+            )
+        )
+        futures = _encode_raster(img, paths, options, dpi)
+    elif bbox is not None and ("png" in paths or "thumb" in paths):
+        # Artists spill past the canvas: only a re-layout can show them, as savefig would.
+        with stage_trace.span("savefig.png", cat="output", file=paths.get("png", path).name):
+            fig.savefig(paths.get("png", path), dpi=dpi, bbox_inches=bbox)
+        with Image.open(paths.get("png", path)) as spilled:
+            img = spilled.convert("RGB")
+        futures = _encode_raster(img, {k: v for k, v in paths.items() if k == "thumb"}, options, dpi)
+    else:
+        futures = _encode_raster(img, paths, options, dpi)
+    for fmt in ("svg", "pdf"):
+        if fmt in paths:
+            with stage_trace.span(f"savefig.{fmt}", cat="output", file=paths[fmt].name):
+                fig.savefig(paths[fmt], format=fmt, dpi=dpi, bbox_inches=bbox)
+    with stage_trace.span("encode.wait", cat="output"):
+        for future in futures:
+            future.result()
+    return list(paths.values())
+
+
+def save_drawing(drawing: Drawing, path: Path, options: OutputOptions) -> list[Path]:
+    """Encode a recorded diagram: PNG/thumbnail from one PIL replay, SVG and PDF straight from the vector ops."""
+    paths = options.paths(path)
+    futures: list[Future] = []
+    if "png" in paths or "thumb" in paths:
+        with stage_trace.span("rasterize", cat="output"):
+            img = drawing.rasterize()
+        futures = _encode_raster(img, paths, options, None)
+    for fmt in ("svg", "pdf"):
+        if fmt in paths:
+            _write_vector(drawing, paths[fmt], fmt)
+    with stage_trace.span("encode.wait", cat="output"):
+        for future in futures:
+            future.result()
+    return list(paths.values())
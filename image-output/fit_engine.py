@@ -0,0 +1,177 @@
+"""Batched polynomial fits and bootstrap bands for the T_sat and P99 scaling models."""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from statistics import NormalDist
+from typing import Sequence
+
+import numpy as np
+
+import raw_samples
+
+
+TSAT_DEGREE = 1
+P99_DEGREE = 2
+BOOTSTRAP_RESAMPLES = 2000
+# Upper bound on bootstrap draws materialized at once (groups x resamples x points). The draws,
+# indices, resampled values and their temporaries take about 40 bytes a cell, so one chunk peaks
+# near 200 MB, inside the render_pool.WORKER_MEMORY_MB each parallel render worker is budgeted.
+BOOTSTRAP_CHUNK_CELLS = 5_000_000
+
+
+@dataclass
+class Design:
+    """Per-engine raw points packed into zero-padded ``(engines, points)`` arrays."""
+
+    engines: list[str]
+    x: np.ndarray
+    y: np.ndarray
+    valid: np.ndarray
+    cell_start: np.ndarray
+    cell_count: np.ndarray
+    scale: float
+
+
+@dataclass
+class FitResult:
+    engines: list[str]
+    degree: int
+    coef: np.ndarray
+    r2: np.ndarray
+    sigma: np.ndarray
+    n: np.ndarray
+
+    def predict(self, x: np.ndarray) -> np.ndarray:
+        """Evaluate every engine's polynomial at ``x``; returns ``(engines, len(x))``."""
+        powers = np.asarray(x, dtype=float)[None, :] ** np.arange(self.degree + 1)[:, None]
+        return self.coef @ powers
+
+
+@dataclass
+class Bands:
+    x: np.ndarray
+    ci_low: np.ndarray
+    ci_high: np.ndarray
+    pi_low: np.ndarray
+    pi_high: np.ndarray
+
+
+def build_design(samples: raw_samples.RawSamples, metric: str, engines: Sequence[str] | None = None) -> Design:
+    """Pack non-missing (N, metric) points per engine, sorted by N, with per-N cell bounds."""
+    engines = list(engines) if engines is not None else list(samples.engines)
+    values = samples[metric]
+    picked = []
+    for engine in engines:
+        code = samples.engine_code(engine)
+        idx = np.flatnonzero((samples.engine == code) & ~np.isnan(values))
+        picked.append(idx[np.argsort(samples.node[idx], kind="stable")])
+    width = max((len(idx) for idx in picked), default=0)
+    shape = (len(engines), width)
+    x = np.zeros(shape)
+    y = np.zeros(shape)
+    valid = np.zeros(shape, dtype=bool)
+    cell_start = np.tile(np.arange(width), (len(engines), 1))
+    cell_count = np.ones(shape, dtype=np.int64)
+    for g, idx in enumerate(picked):
+        n = len(idx)
+        x[g, :n] = samples.node[idx]
+        y[g, :n] = values[idx]
+        valid[g, :n] = True
+        if n:
+            edge = np.flatnonzero(np.r_[True, x[g, 1:n] != x[g, : n - 1]])
+            counts = np.diff(np.r_[edge, n])
+            cell_start[g, :n] = np.repeat(edge, counts)
+            cell_count[g, :n] = np.repeat(counts, counts)
+    scale = float(x[valid].max()) if valid.any() else 1.0
+    return Design(engines, x, y, valid, cell_start, cell_count, scale)
+
+
+def _projector(design: Design, degree: int) -> np.ndarray:
+    """Batched pseudo-inverse of the scaled Vandermonde matrices; padded rows are zero."""
+    xs = design.x / design.scale
+    vander = xs[..., None] ** np.arange(degree + 1)
+    vander *= design.valid[..., None]
+    return np.linalg.pinv(vander)
+
+
+def _unscale(coef: np.ndarray, scale: float) -> np.ndarray:
+    return coef / scale ** np.arange(coef.shape[-1])
+
+
+def fit(samples: raw_samples.RawSamples, metric: str, degree: int, engines: Sequence[str] | None = None) -> FitResult:
+    """Least-squares fit of ``metric ~ poly(N, degree)`` for all engines in one batched solve."""
+    design = build_design(samples, metric, engines)
+    return _fit_design(design, degree, _projector(design, degree))
+
+
+def _fit_design(design: Design, degree: int, projector: np.ndarray) -> FitResult:
+    coef = _unscale(np.einsum("gkn,gn->gk", projector, design.y), design.scale)
+    n = design.valid.sum(axis=1)
+    powers = design.x[..., None] ** np.arange(degree + 1)
+    resid = np.where(design.valid, design.y - np.einsum("gnk,gk->gn", powers, coef), 0.0)
+    rss = (resid**2).sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(design.valid, design.y, 0.0).sum(axis=1) / n
+        tss = (np.where(design.valid, design.y - mean[:, None], 0.0) ** 2).sum(axis=1)
+        r2 = 1.0 - rss / tss
+        sigma = np.sqrt(rss / np.maximum(n - degree - 1, 1))
+    return FitResult(design.engines, degree, coef, r2, sigma, n)
+
+
+def bootstrap_bands(
+    samples: raw_samples.RawSamples,
+    metric: str,
+    degree: int,
+    x: np.ndarray,
+    *,
+    engines: Sequence[str] | None = None,
+    resamples: int = BOOTSTRAP_RESAMPLES,
+    level: float = 0.95,
+    seed: int = 0,
+) -> tuple[FitResult, Bands]:
+    """Fit plus confidence and prediction bands from a stratified bootstrap.
+
+    The confidence band is the percentile interval of the resampled curves; the
+    prediction band widens their spread by the residual sigma, as a normal interval.
+
+    Repeats are resampled within each (engine, N) cell, so the node design stays
+    fixed and every resample reuses the same projector: all engines and all
+    resamples reduce to one batched matrix product per chunk.
+    """
+    design = build_design(samples, metric, engines)
+    projector = _projector(design, degree)
+    result = _fit_design(design, degree, projector)
+    x = np.asarray(x, dtype=float)
+    powers = x[None, :] ** np.arange(degree + 1)[:, None]
+    rng = np.random.default_rng(seed)
+    groups, width = design.y.shape
+    chunk = max(1, min(resamples, BOOTSTRAP_CHUNK_CELLS // max(groups * width, 1)))
+    curves = []
+    for start in range(0, resamples, chunk):
+        b = min(chunk, resamples - start)
+        u = rng.random((groups, b, width))
+        idx = design.cell_start[:, None, :] + (u * design.cell_count[:, None, :]).astype(np.int64)
+        y_boot = np.take_along_axis(np.broadcast_to(design.y[:, None, :], idx.shape), idx, axis=2)
+        coef = _unscale(np.einsum("gkn,gbn->gbk", projector, y_boot), design.scale)
+        curves.append(coef @ powers)
+    pred = np.concatenate(curves, axis=1)
+    tail = (1.0 - level) / 2.0 * 100.0
+    ci_low, ci_high = np.percentile(pred, [tail, 100.0 - tail], axis=1)
+    # A new observation adds the residual scatter to the fit's own spread; the analytic
+    # normal quantile keeps the band smooth in x, unlike one noise draw per point.
+    half = NormalDist().inv_cdf(0.5 + level / 2.0) * np.sqrt(pred.var(axis=1) + result.sigma[:, None] ** 2)
+    center = result.predict(x)
+    pi_low, pi_high = center - half, center + half
+    return result, Bands(x, ci_low, ci_high, pi_low, pi_high)
+
+
+def fit_summary(tsat: FitResult, p99: FitResult) -> dict:
+    """Coefficients in the lab's fit_summary.json layout."""
+    out: dict[str, dict[str, dict[str, float]]] = {"throughput": {}, "p99": {}}
+    for g, engine in enumerate(tsat.engines):
+        c0, c1 = tsat.coef[g]
+        out["throughput"][engine] = {"intercept": float(c0), "slope": float(c1), "r2": float(tsat.r2[g])}
+    for g, engine in enumerate(p99.engines):
+        c0, c1, c2 = p99.coef[g]
+        out["p99"][engine] = {"alpha": float(c2), "beta": float(c1), "gamma": float(c0), "r2": float(p99.r2[g])}
+    return out
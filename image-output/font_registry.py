@@ -0,0 +1,89 @@
+"""Lazy CJK font lookup: PIL font files cached on disk, Matplotlib families resolved once."""
+from __future__ import annotations
+
+import functools
+import json
+import os
+from pathlib import Path
+
+from PIL import ImageFont
+
+Font = ImageFont.FreeTypeFont | ImageFont.ImageFont
+
+CACHE_PATH = Path(__file__).resolve().parent / ".font_cache.json"
+FALLBACKS = [
+    "C:/Windows/Fonts/simhei.ttf",
+    "C:/Windows/Fonts/simsun.ttc",
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+]
+CANDIDATES = {
+    "regular": ["C:/Windows/Fonts/msyh.ttc", *FALLBACKS],
+    "bold": ["C:/Windows/Fonts/msyhbd.ttc", *FALLBACKS],
+}
+
+_PATHS: dict[str, str | None] = {}
+
+
+def _read_cache() -> dict:
+    try:
+        cached = json.loads(CACHE_PATH.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    return cached if isinstance(cached, dict) else {}
+
+
+def _write_cache(cached: dict) -> None:
+    tmp = CACHE_PATH.with_suffix(".tmp")
+    try:
+        tmp.write_text(json.dumps(cached, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp, CACHE_PATH)
+    except OSError:
+        # Without a writable cache the next run simply probes the candidates again.
+        pass
+
+
+def font_path(bold: bool = False) -> str | None:
+    """First existing candidate for the weight; probed once, then reused from the disk cache.
+
+    A cached entry is trusted while its file still exists and the candidate list is
+    unchanged. A miss (no font found) is never cached, so installing a font takes effect.
+    """
+    key = "bold" if bold else "regular"
+    if key in _PATHS:
+        return _PATHS[key]
+    cached = _read_cache()
+    entry = cached.get(key)
+    if isinstance(entry, dict) and entry.get("candidates") == CANDIDATES[key] and Path(entry["path"]).exists():
+        _PATHS[key] = entry["path"]
+        return entry["path"]
+    path = next((p for p in CANDIDATES[key] if Path(p).exists()), None)
+    if path is not None:
+        cached[key] = {"path": path, "candidates": CANDIDATES[key]}
+        _write_cache(cached)
+    _PATHS[key] = path
+    return path
+
+
+@functools.lru_cache(maxsize=None)
+def get(size: int, bold: bool = False) -> Font:
+    """The font at ``size``, loaded on first use and shared by every caller afterwards."""
+    path = font_path(bold)
+    if path is None:
+        return ImageFont.load_default()
+    return ImageFont.truetype(path, size=size)
+
+
+@functools.lru_cache(maxsize=None)
+def matplotlib_families(families: tuple[str, ...]) -> tuple[str, ...]:
+    """The installed members of ``families``, in order.
+
+    Matplotlib scores every known font for each family it cannot find (and logs a
+    warning), so dropping the missing names up front keeps the preference order
+    and the glyph fallback while skipping those lookups in every figure.
+    """
+    from matplotlib import font_manager
+
+    installed = {entry.name for entry in font_manager.fontManager.ttflist}
+    found = tuple(family for family in families if family in installed)
+    return found or families
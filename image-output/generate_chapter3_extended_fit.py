@@ -2,6 +2,8 @@
 """Draw Section 3.7 extended-fit figures without touching existing outputs."""
 from __future__ import annotations
 
+import argparse
+import contextlib
 import csv
 import json
 import math
@@ -11,14 +13,29 @@ import matplotlib
 import matplotlib.pyplot as plt
 import numpy as np
 
+import build_cache
+import capacity
+import figure_output
+import fit_engine
+import font_registry
+import point_cloud
+import points_export
+import raw_samples
+import results_store
+import stage_trace
+
 
 ROOT = Path(__file__).resolve().parents[2]
 REPORT_DIR = ROOT / "hcap-lab" / "experiments" / "exp7_extended_fit" / "report"
 SUMMARY_PATH = REPORT_DIR / "summary.json"
 FIT_PATH = REPORT_DIR / "fit_summary.json"
+EXPERIMENT = REPORT_DIR.parent.name
 OUT_DIR = Path(__file__).resolve().parent / "chapter3_extended_fit"
+OUTPUT = figure_output.OutputOptions()
+DENSITY_THRESHOLD = point_cloud.DENSITY_THRESHOLD
 
-NODES = [8, 16, 24, 32, 40, 48, 56, 64, 72, 80, 88, 96]
+MAX_NODE_TICKS = 16
+BAND_POINTS = 120
 ALGO_ORDER = ["PBFT", "HotStuff", "Raft", "CometBFT-light", "tPBFT"]
 LABELS = {
     "pbft": "PBFT",
@@ -37,66 +54,86 @@ COLORS = {
 }
 
 
-def setup_style() -> None:
-    matplotlib.rcParams["font.sans-serif"] = [
-        "Microsoft YaHei",
-        "SimHei",
-        "Noto Sans CJK SC",
-        "Arial Unicode MS",
-        "DejaVu Sans",
-    ]
-    matplotlib.rcParams["axes.unicode_minus"] = False
-    plt.rcParams.update(
-        {
-            "figure.facecolor": "white",
-            "savefig.facecolor": "white",
-            "axes.edgecolor": "#333333",
-            "axes.grid": False,
-            "legend.frameon": False,
-        }
-    )
+FONT_FAMILIES = [
+    "Microsoft YaHei",
+    "SimHei",
+    "Noto Sans CJK SC",
+    "Arial Unicode MS",
+    "DejaVu Sans",
+]
+STYLE_RC = {
+    "axes.unicode_minus": False,
+    "figure.facecolor": "white",
+    "savefig.facecolor": "white",
+    "axes.edgecolor": "#333333",
+    "axes.grid": False,
+    "legend.frameon": False,
+}
 
+# Output label -> (producer, inputs it reads). Labels prefix the generated file names.
+STEPS = {
+    "extended_fit_raw_points": ("write_points_csv", ("summary", "compress")),
+    "extended_fit_summary_used": ("write_fit_summary", ("fits",)),
+    "fig3_11": ("plot_tsat_fit", ("summary", "fits:throughput")),
+    "fig3_12": ("plot_p99_fit", ("summary", "fits:p99")),
+    "extended_fit_capacity": ("write_capacity_table", ("fits", "slo")),
+    "fig3_13": ("plot_capacity_heatmap", ("fits", "slo")),
+}
 
-def load_inputs() -> tuple[dict, dict]:
+
+def setup_style() -> None:
+    matplotlib.rcParams["font.sans-serif"] = list(font_registry.matplotlib_families(tuple(FONT_FAMILIES)))
+    plt.rcParams.update(STYLE_RC)
+
+
+def load_inputs(refit: bool = False, store: results_store.ResultsStore | None = None) -> tuple[raw_samples.RawSamples, dict]:
+    if store is not None:
+        with stage_trace.span("load.store"):
+            samples = store.samples(EXPERIMENT)
+            fits = store.fits(EXPERIMENT)
+        if refit:
+            fits = refit_summary(samples)
+        return samples, fits
     if not SUMMARY_PATH.exists():
         raise FileNotFoundError(f"missing extended summary: {SUMMARY_PATH}")
-    if not FIT_PATH.exists():
+    if not refit and not FIT_PATH.exists():
         raise FileNotFoundError(f"missing extended fit summary: {FIT_PATH}")
-    summary = json.loads(SUMMARY_PATH.read_text(encoding="utf-8"))
-    fits = json.loads(FIT_PATH.read_text(encoding="utf-8"))
-    return summary, fits
+    with stage_trace.span("load.summary"):
+        samples = raw_samples.load_cached(SUMMARY_PATH)
+    if refit:
+        fits = refit_summary(samples)
+    else:
+        with stage_trace.span("load.fits"):
+            fits = json.loads(FIT_PATH.read_text(encoding="utf-8"))
+    return samples, fits
+
+
+def refit_summary(samples: raw_samples.RawSamples) -> dict:
+    engines = engine_order(samples)
+    with stage_trace.span("fit.refit"):
+        return fit_engine.fit_summary(
+            fit_engine.fit(samples, "tps", fit_engine.TSAT_DEGREE, engines),
+            fit_engine.fit(samples, "p99_ms", fit_engine.P99_DEGREE, engines),
+        )
 
 
-def raw_metric_values(summary: dict, engine: str, node: int, metric: str) -> list[float]:
-    values: list[float] = []
-    for item in summary[engine][str(node)].get("raw", []):
-        value = item.get("metrics", {}).get(metric)
-        if value is not None:
-            values.append(float(value))
-    return values
+def engine_order(samples: raw_samples.RawSamples) -> list[str]:
+    known = [KEYS[label] for label in ALGO_ORDER if KEYS[label] in samples.engines]
+    return known + [engine for engine in samples.engines if engine not in known]
 
 
-def write_points_csv(summary: dict) -> None:
-    path = OUT_DIR / "extended_fit_raw_points.csv"
-    with path.open("w", encoding="utf-8", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow(["algorithm", "engine", "N", "repeat", "TPS(tx/s)", "P99(ms)", "success_rate"])
-        for label in ALGO_ORDER:
-            engine = KEYS[label]
-            for node in NODES:
-                for i, item in enumerate(summary[engine][str(node)].get("raw", []), start=1):
-                    metrics = item.get("metrics", {})
-                    writer.writerow(
-                        [
-                            label,
-                            engine,
-                            node,
-                            i,
-                            f"{float(metrics.get('tps', 0.0)):.6f}",
-                            f"{float(metrics.get('p99_ms', 0.0)):.6f}",
-                            f"{float(metrics.get('success_rate', 0.0)):.6f}",
-                        ]
-                    )
+def write_points_csv(samples: raw_samples.RawSamples, compress: bool = False) -> None:
+    engines = engine_order(samples)
+    points = points_export.point_table(samples, engines, [LABELS.get(engine, engine) for engine in engines])
+    name, stale = "extended_fit_raw_points.csv", "extended_fit_raw_points.csv.gz"
+    if compress:
+        name, stale = stale, name
+    with stage_trace.span("write.csv", cat="output", file=name):
+        points_export.write_csv(OUT_DIR / name, points, compress=compress)
+    # Only one variant may be left over, or readers would pick up the points of an older build.
+    (OUT_DIR / stale).unlink(missing_ok=True)
+    with stage_trace.span("write.npz", cat="output"):
+        points_export.write_npz(OUT_DIR / "extended_fit_raw_points.npz", points)
 
 
 def write_fit_summary(fits: dict) -> None:
@@ -105,47 +142,58 @@ def write_fit_summary(fits: dict) -> None:
 
 
 def save(fig: plt.Figure, name: str) -> None:
-    path = OUT_DIR / name
-    fig.savefig(path, dpi=300, bbox_inches="tight")
+    for path in figure_output.save_figure(fig, OUT_DIR / name, OUTPUT):
+        print(f"created {path}")
     plt.close(fig)
-    print(f"created {path}")
-
-
-def scatter_raw(ax: plt.Axes, summary: dict, label: str, metric: str, color: str) -> None:
-    engine = KEYS[label]
-    for node in NODES:
-        values = raw_metric_values(summary, engine, node, metric)
-        if not values:
-            continue
-        offsets = np.linspace(-1.35, 1.35, len(values))
-        ax.scatter(
-            node + offsets,
-            values,
-            s=22,
-            color=color,
-            alpha=0.58,
-            edgecolor="white",
-            linewidth=0.35,
-            zorder=3,
-        )
 
 
-def plot_tsat_fit(summary: dict, fits: dict) -> None:
-    xfit = np.linspace(min(NODES), max(NODES), 400)
+def set_node_ticks(ax: plt.Axes, nodes: np.ndarray, extra: list[int] | None = None) -> None:
+    if len(nodes) <= MAX_NODE_TICKS:
+        ax.set_xticks(list(nodes) + (extra or []))
+
+
+def scatter_raw(ax: plt.Axes, samples: raw_samples.RawSamples, label: str, metric: str, color: str) -> None:
+    style = point_cloud.PointStyle(jitter=1.35, size=22, alpha=0.58, edge_width=0.35)
+    point_cloud.draw(ax, samples, KEYS[label], metric, color, style, DENSITY_THRESHOLD)
+
+
+def draw_bands(ax: plt.Axes, result: fit_engine.FitResult, bands: fit_engine.Bands, index: int, color: str) -> None:
+    if not result.n[index]:
+        return
+    ax.fill_between(bands.x, bands.pi_low[index], bands.pi_high[index], color=color, alpha=0.07, lw=0, zorder=1)
+    ax.fill_between(bands.x, bands.ci_low[index], bands.ci_high[index], color=color, alpha=0.2, lw=0, zorder=1)
+
+
+def tsat_bands(samples: raw_samples.RawSamples) -> tuple[fit_engine.FitResult, fit_engine.Bands]:
+    nodes = samples.node_counts()
+    engines = [KEYS[label] for label in ALGO_ORDER]
+    x = np.linspace(nodes.min(), nodes.max(), BAND_POINTS)
+    return fit_engine.bootstrap_bands(samples, "tps", fit_engine.TSAT_DEGREE, x, engines=engines)
+
+
+def plot_tsat_fit(
+    samples: raw_samples.RawSamples, fits: dict, fit_bands: tuple[fit_engine.FitResult, fit_engine.Bands] | None = None
+) -> None:
+    """Fig3_11; ``fit_bands`` from :func:`tsat_bands` may be passed in to reuse an earlier bootstrap."""
+    nodes = samples.node_counts()
+    xfit = np.linspace(nodes.min(), nodes.max(), 400)
+    result, bands = fit_bands or tsat_bands(samples)
     fig, ax = plt.subplots(figsize=(10.5, 5.8))
-    for label in ALGO_ORDER:
+    for i, label in enumerate(ALGO_ORDER):
         engine = KEYS[label]
         color = COLORS[label]
-        fit = fits["throughput"][engine]
-        yfit = fit["intercept"] + fit["slope"] * xfit
-        ax.plot(xfit, yfit, ls="-", lw=2.2, color=color, label=f"{label} 拟合")
-        scatter_raw(ax, summary, label, "tps", color)
+        fit = fits["throughput"].get(engine)
+        if fit is not None:
+            draw_bands(ax, result, bands, i, color)
+            yfit = fit["intercept"] + fit["slope"] * xfit
+            ax.plot(xfit, yfit, ls="-", lw=2.2, color=color, label=f"{label} 拟合")
+        scatter_raw(ax, samples, label, "tps", color)
 
     ax.set_title("扩展实验吞吐量饱和边界拟合")
     ax.set_xlabel("节点数 N")
     ax.set_ylabel("T_sat (tx/s)")
-    ax.set_xticks(NODES)
-    ax.set_xlim(min(NODES) - 4, max(NODES) + 4)
+    set_node_ticks(ax, nodes)
+    ax.set_xlim(nodes.min() - 4, nodes.max() + 4)
     ax.set_ylim(bottom=0)
     ax.legend(ncol=2)
     fig.tight_layout()
@@ -153,49 +201,102 @@ def plot_tsat_fit(summary: dict, fits: dict) -> None:
 
 
 def p99_limit_n(fit: dict, limit: float = 2000.0) -> float | None:
-    a = float(fit["alpha"])
-    b = float(fit["beta"])
-    c = float(fit["gamma"]) - limit
-    if abs(a) < 1e-12:
-        if abs(b) < 1e-12:
-            return None
-        root = -c / b
-        return root if root > 0 else None
-    disc = b * b - 4 * a * c
-    if disc < 0:
-        return None
-    roots = [(-b + math.sqrt(disc)) / (2 * a), (-b - math.sqrt(disc)) / (2 * a)]
-    positive = [root for root in roots if root > 0]
-    return min(positive) if positive else None
-
-
-def plot_p99_fit(summary: dict, fits: dict) -> None:
-    x_max = max(
-        110.0,
-        max((p99_limit_n(fit) or 0.0) for fit in fits["p99"].values()) + 8.0,
-    )
-    xfit = np.linspace(min(NODES), x_max, 500)
+    root = float(capacity.p99_crossing(fit["alpha"], fit["beta"], fit["gamma"], limit))
+    return None if math.isnan(root) else root
+
+
+def p99_x_max(fits: dict) -> float:
+    return max(110.0, max(((p99_limit_n(fit) or 0.0) for fit in fits["p99"].values()), default=0.0) + 8.0)
+
+
+def p99_bands(samples: raw_samples.RawSamples, fits: dict) -> tuple[fit_engine.FitResult, fit_engine.Bands]:
+    nodes = samples.node_counts()
+    engines = [KEYS[label] for label in ALGO_ORDER]
+    x = np.linspace(nodes.min(), p99_x_max(fits), BAND_POINTS)
+    return fit_engine.bootstrap_bands(samples, "p99_ms", fit_engine.P99_DEGREE, x, engines=engines)
+
+
+def plot_p99_fit(
+    samples: raw_samples.RawSamples, fits: dict, fit_bands: tuple[fit_engine.FitResult, fit_engine.Bands] | None = None
+) -> None:
+    """Fig3_12; ``fit_bands`` from :func:`p99_bands` may be passed in to reuse an earlier bootstrap."""
+    nodes = samples.node_counts()
+    x_max = p99_x_max(fits)
+    xfit = np.linspace(nodes.min(), x_max, 500)
+    result, bands = fit_bands or p99_bands(samples, fits)
     fig, ax = plt.subplots(figsize=(10.5, 5.8))
-    for label in ALGO_ORDER:
+    for i, label in enumerate(ALGO_ORDER):
         engine = KEYS[label]
         color = COLORS[label]
-        fit = fits["p99"][engine]
-        yfit = fit["alpha"] * xfit**2 + fit["beta"] * xfit + fit["gamma"]
-        ax.plot(xfit, yfit, ls="-", lw=2.2, color=color, label=f"{label} 拟合")
-        scatter_raw(ax, summary, label, "p99_ms", color)
+        fit = fits["p99"].get(engine)
+        if fit is not None:
+            draw_bands(ax, result, bands, i, color)
+            yfit = fit["alpha"] * xfit**2 + fit["beta"] * xfit + fit["gamma"]
+            ax.plot(xfit, yfit, ls="-", lw=2.2, color=color, label=f"{label} 拟合")
+        scatter_raw(ax, samples, label, "p99_ms", color)
 
     ax.axhline(2000, color="#777777", lw=1.1, ls=":", label="P99=2000ms")
     ax.set_title("扩展实验P99尾延迟退化模型拟合")
     ax.set_xlabel("节点数 N")
     ax.set_ylabel("P99 (ms)")
-    ax.set_xticks(NODES + [112, 128, 144])
-    ax.set_xlim(min(NODES) - 4, x_max)
+    set_node_ticks(ax, nodes, list(range(int(nodes.max()) + 16, int(x_max) + 1, 16)))
+    ax.set_xlim(nodes.min() - 4, x_max)
     ax.set_ylim(bottom=0)
     ax.legend(ncol=2)
     fig.tight_layout()
     save(fig, "fig3_12_extended_p99_fit_scatter.png")
 
 
+def capacity_grid(fits: dict, slo: tuple[list[float], list[float]]) -> np.ndarray:
+    model = capacity.CapacityModel.from_fits(fits, [KEYS[label] for label in ALGO_ORDER])
+    return capacity.solve(model, *slo)
+
+
+def write_capacity_table(fits: dict, slo: tuple[list[float], list[float]]) -> None:
+    p99_limits, min_tsat = slo
+    grid = capacity_grid(fits, slo)
+    path = OUT_DIR / "extended_fit_capacity.csv"
+    with path.open("w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["algorithm", "engine", "P99_limit(ms)", "min_TSAT(tx/s)", "max_N"])
+        for i, label in enumerate(ALGO_ORDER):
+            for j, limit in enumerate(p99_limits):
+                for k, tsat in enumerate(min_tsat):
+                    writer.writerow([label, KEYS[label], f"{limit:g}", f"{tsat:g}", int(grid[i, j, k])])
+
+
+def plot_capacity_heatmap(fits: dict, slo: tuple[list[float], list[float]]) -> None:
+    p99_limits, min_tsat = slo
+    grid = capacity_grid(fits, slo)
+    fig, axes = plt.subplots(1, len(ALGO_ORDER), figsize=(3.2 * len(ALGO_ORDER), 3.9), sharey=True)
+    vmax = max(int(grid.max()), 1)
+    for ax, label, cells in zip(np.atleast_1d(axes), ALGO_ORDER, grid):
+        image = ax.imshow(cells, cmap="YlGnBu", vmin=0, vmax=vmax, aspect="auto", origin="lower")
+        for (j, k), value in np.ndenumerate(cells):
+            ax.text(
+                k,
+                j,
+                str(value) if value else "—",
+                ha="center",
+                va="center",
+                fontsize=8,
+                color="white" if value > 0.6 * vmax else "#222222",
+            )
+        ax.set_title(label)
+        ax.set_xticks(range(len(min_tsat)), [f"{v:g}" for v in min_tsat])
+        ax.set_xlabel("最低 T_sat (tx/s)")
+    first = np.atleast_1d(axes)[0]
+    first.set_yticks(range(len(p99_limits)), [f"{v:g}" for v in p99_limits])
+    first.set_ylabel("P99 上限 (ms)")
+    fig.colorbar(image, ax=axes, shrink=0.85, label="最大节点数 N")
+    fig.suptitle("扩展实验 SLO 组合下的最大可支撑节点数")
+    save(fig, "fig3_13_extended_capacity_heatmap.png")
+
+
+def parse_levels(text: str) -> list[float]:
+    return [float(part) for part in text.split(",") if part.strip()]
+
+
 def write_manifest() -> None:
     path = OUT_DIR / "README.md"
     path.write_text(
@@ -208,8 +309,12 @@ def write_manifest() -> None:
                 "Generated files:",
                 "- fig3_11_extended_tsat_fit_scatter.png",
                 "- fig3_12_extended_p99_fit_scatter.png",
+                "- fig3_13_extended_capacity_heatmap.png",
                 "- extended_fit_raw_points.csv",
+                "- extended_fit_raw_points.npz (points_export.load_npz gives memory-mapped columns)",
                 "- extended_fit_summary_used.json",
+                "- extended_fit_capacity.csv (largest N per engine under each P99 limit x minimum T_sat)",
+                "- extended_fit_stream_aggregates.csv (per engine/N/metric count, mean, std; written by stream_ingest.py)",
                 "",
                 "This directory is separate from hcap/image-output/chapter3 and does not overwrite original figures or data.",
             ]
@@ -219,15 +324,139 @@ def write_manifest() -> None:
     )
 
 
-def main() -> None:
+def select_steps(text: str | None) -> list[str]:
+    if not text:
+        return list(STEPS)
+    labels = [part.strip() for part in text.split(",") if part.strip()]
+    unknown = [label for label in labels if label not in STEPS]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown output(s): {', '.join(unknown)}; choose from {', '.join(STEPS)}")
+    return [label for label in STEPS if label in labels]
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clean", action="store_true", help="ignore the build cache and regenerate the selected outputs")
+    parser.add_argument(
+        "--only",
+        type=select_steps,
+        default=list(STEPS),
+        metavar="LABELS",
+        help="comma-separated outputs to build, e.g. fig3_12,extended_fit_capacity (default: all)",
+    )
+    parser.add_argument(
+        "--refit",
+        action="store_true",
+        help="fit the T_sat/P99 models from the raw points instead of reading fit_summary.json",
+    )
+    parser.add_argument(
+        "--store",
+        type=Path,
+        nargs="?",
+        const=results_store.DB_PATH,
+        help="read the runs and fits from the SQLite results store, ingesting changed reports first",
+    )
+    parser.add_argument("--gzip-csv", action="store_true", help="stream the raw points CSV through gzip (.csv.gz)")
+    parser.add_argument(
+        "--p99-limits",
+        type=parse_levels,
+        default=list(capacity.P99_LIMITS),
+        help="comma-separated P99 limits in ms for the capacity table",
+    )
+    parser.add_argument(
+        "--min-tsat",
+        type=parse_levels,
+        default=list(capacity.MIN_TSAT),
+        help="comma-separated minimum T_sat levels in tx/s for the capacity table",
+    )
+    figure_output.add_arguments(parser)
+    point_cloud.add_arguments(parser)
+    stage_trace.add_arguments(parser)
+    return parser
+
+
+def build(args: argparse.Namespace) -> list[str]:
+    """Regenerate the outputs whose inputs, code or settings changed; returns their labels."""
+    global OUTPUT, DENSITY_THRESHOLD
+    OUTPUT = figure_output.options_from_args(args)
+    DENSITY_THRESHOLD = args.density_threshold
     setup_style()
     OUT_DIR.mkdir(parents=True, exist_ok=True)
-    summary, fits = load_inputs()
-    write_points_csv(summary)
-    write_fit_summary(fits)
     write_manifest()
-    plot_tsat_fit(summary, fits)
-    plot_p99_fit(summary, fits)
+    cache = build_cache.BuildCache(OUT_DIR)
+    if args.clean:
+        cache.forget(args.only)
+    with results_store.ResultsStore(args.store) if args.store else contextlib.nullcontext() as store:
+        if store:
+            with stage_trace.span("store.ingest"):
+                store.ingest()
+        refit = args.refit or not FIT_PATH.exists()
+        if not SUMMARY_PATH.exists():
+            raise FileNotFoundError(f"missing extended input: {SUMMARY_PATH}")
+        # The store keeps the same content hashes, so switching --store on or off keeps the cache.
+        summary_key = store.source_digest(EXPERIMENT) if store else build_cache.file_digest(SUMMARY_PATH)
+        if refit:
+            fits_key, fit_sections = ["refit", summary_key], {}
+        elif store:
+            fits_key, fit_sections = store.source_digest(EXPERIMENT, "fits"), store.fits(EXPERIMENT)
+        else:
+            fits_key, fit_sections = build_cache.file_digest(FIT_PATH), json.loads(FIT_PATH.read_text(encoding="utf-8"))
+        input_keys = {
+            "summary": summary_key,
+            "fits": fits_key,
+            "compress": args.gzip_csv,
+            "slo": [args.p99_limits, args.min_tsat],
+        }
+        # Each fit plot reads one model, so editing the other one leaves it cached.
+        for section in ("throughput", "p99"):
+            input_keys[f"fits:{section}"] = input_keys["fits"] if refit else fit_sections.get(section)
+        shared = build_cache.digest(
+            matplotlib.__version__,
+            build_cache.module_constants(globals()),
+            build_cache.source_digest(
+                setup_style,
+                save,
+                engine_order,
+                set_node_ticks,
+                scatter_raw,
+                draw_bands,
+                p99_limit_n,
+                capacity_grid,
+                tsat_bands,
+                p99_x_max,
+                p99_bands,
+            ),
+            build_cache.source_digest(capacity, fit_engine, figure_output, point_cloud),
+            OUTPUT,
+        )
+        stale: dict[str, str] = {}
+        for label in args.only:
+            func_name, inputs = STEPS[label]
+            key = build_cache.digest(
+                shared, build_cache.source_digest(globals()[func_name]), [input_keys[name] for name in inputs]
+            )
+            if not cache.fresh(label, key):
+                stale[label] = key
+        if not stale:
+            print(f"all outputs up to date in {OUT_DIR}")
+            return []
+        samples, fits = load_inputs(refit, store)
+    loaded = {"summary": samples, "fits": fits, "compress": args.gzip_csv, "slo": (args.p99_limits, args.min_tsat)}
+    loaded["fits:throughput"] = loaded["fits:p99"] = fits
+    for label, key in stale.items():
+        func_name, inputs = STEPS[label]
+        with stage_trace.span(label, cat="figure"):
+            globals()[func_name](*(loaded[name] for name in inputs))
+        cache.record(label, key)
+    cache.save()
+    return list(stale)
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = build_parser().parse_args(argv)
+    stage_trace.configure_from_args(args)
+    build(args)
+    stage_trace.write(OUT_DIR)
 
 
 if __name__ == "__main__":
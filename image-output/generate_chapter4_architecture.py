@@ -2,14 +2,26 @@
 """Generate corrected Chapter 4 HCP-Bench architecture figures."""
 from __future__ import annotations
 
+import argparse
+import time
 from pathlib import Path
 from typing import Iterable
 import math
 
-from PIL import Image, ImageDraw, ImageFont
+import PIL
+from PIL import ImageFont
+
+import build_cache
+import diagram_backend
+import figure_output
+import font_registry
+import render_pool
+import stage_trace
+import text_layout
 
 
 OUT_DIR = Path(__file__).resolve().parent / "chapter4"
+OUTPUT = figure_output.OutputOptions()
 W, H = 1800, 1180
 
 BG = "#FFFFFF"
@@ -36,109 +48,86 @@ TEAL = "#2A8C96"
 TEAL_L = "#E7F8FA"
 
 
-def font(size: int, bold: bool = False) -> ImageFont.FreeTypeFont:
-    candidates = [
-        "C:/Windows/Fonts/msyhbd.ttc" if bold else "C:/Windows/Fonts/msyh.ttc",
-        "C:/Windows/Fonts/simhei.ttf",
-        "C:/Windows/Fonts/simsun.ttc",
-        "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
-        "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
-    ]
-    for path in candidates:
-        if Path(path).exists():
-            return ImageFont.truetype(path, size=size)
-    return ImageFont.load_default()
-
-
-F_TITLE = font(42, True)
-F_SUB = font(22)
-F_SECTION = font(25, True)
-F_HEAD = font(23, True)
-F_BODY = font(17)
-F_SMALL = font(15)
-
-
-def text_size(d: ImageDraw.ImageDraw, text: str, fnt: ImageFont.FreeTypeFont) -> tuple[int, int]:
-    box = d.textbbox((0, 0), text, font=fnt)
-    return box[2] - box[0], box[3] - box[1]
-
-
-def wrap(d: ImageDraw.ImageDraw, text: str, fnt: ImageFont.FreeTypeFont, max_w: int) -> list[str]:
-    out: list[str] = []
-    for raw in text.split("\n"):
-        cur = ""
-        for ch in raw:
-            trial = cur + ch
-            if not cur or text_size(d, trial, fnt)[0] <= max_w:
-                cur = trial
-            else:
-                out.append(cur)
-                cur = ch
-        if cur:
-            out.append(cur)
-    return out or [""]
-
-
-def canvas(title: str, subtitle: str = "") -> tuple[Image.Image, ImageDraw.ImageDraw]:
-    img = Image.new("RGB", (W, H), BG)
-    d = ImageDraw.Draw(img)
-    d.text((W // 2, 46), title, fill=TEXT, font=F_TITLE, anchor="mm")
+# Font roles as (size, bold); the fonts themselves load on first use via font_registry.
+F_TITLE = (42, True)
+F_SUB = (22, False)
+F_SECTION = (25, True)
+F_HEAD = (23, True)
+F_BODY = (17, False)
+F_SMALL = (15, False)
+
+
+def font(spec: tuple[int, bool]) -> ImageFont.FreeTypeFont:
+    return font_registry.get(*spec)
+
+
+def text_size(d: diagram_backend.Drawing, text: str, fnt: ImageFont.FreeTypeFont) -> tuple[int, int]:
+    return text_layout.text_size(fnt, text)
+
+
+def wrap(d: diagram_backend.Drawing, text: str, fnt: ImageFont.FreeTypeFont, max_w: int) -> list[str]:
+    return list(text_layout.wrap(text, fnt, max_w))
+
+
+def canvas(title: str, subtitle: str = "") -> diagram_backend.Drawing:
+    d = diagram_backend.Drawing(W, H, BG)
+    d.text((W // 2, 46), title, fill=TEXT, font=font(F_TITLE), anchor="mm")
     if subtitle:
-        d.text((W // 2, 88), subtitle, fill=MUTED, font=F_SUB, anchor="mm")
-    return img, d
+        d.text((W // 2, 88), subtitle, fill=MUTED, font=font(F_SUB), anchor="mm")
+    return d
 
 
-def rounded(d: ImageDraw.ImageDraw, box: tuple[int, int, int, int], fill: str, outline: str, width: int = 3, r: int = 22) -> None:
+def rounded(d: diagram_backend.Drawing, box: tuple[int, int, int, int], fill: str, outline: str, width: int = 3, r: int = 22) -> None:
     d.rounded_rectangle(box, radius=r, fill=fill, outline=outline, width=width)
 
 
-def section(d: ImageDraw.ImageDraw, box: tuple[int, int, int, int], title: str, fill: str, outline: str) -> None:
+def section(d: diagram_backend.Drawing, box: tuple[int, int, int, int], title: str, fill: str, outline: str) -> None:
     rounded(d, box, fill, outline, 3, 26)
-    d.text(((box[0] + box[2]) // 2, box[1] + 34), title, fill=outline, font=F_SECTION, anchor="mm")
+    d.text(((box[0] + box[2]) // 2, box[1] + 34), title, fill=outline, font=font(F_SECTION), anchor="mm")
 
 
 def box(
-    d: ImageDraw.ImageDraw,
+    d: diagram_backend.Drawing,
     rect: tuple[int, int, int, int],
     title: str,
     lines: Iterable[str] = (),
     fill: str = "#FFFFFF",
     outline: str = BLUE,
     title_color: str | None = None,
-    body_font: ImageFont.FreeTypeFont = F_BODY,
+    body_font: tuple[int, bool] = F_BODY,
 ) -> None:
     rounded(d, rect, fill, outline, 2, 18)
     x1, y1, x2, y2 = rect
     title_color = title_color or outline
     body_lines: list[str] = []
     for line in lines:
-        body_lines.extend(wrap(d, line, body_font, x2 - x1 - 34))
-    title_lines = wrap(d, title, F_HEAD, x2 - x1 - 34)
+        body_lines.extend(wrap(d, line, font(body_font), x2 - x1 - 34))
+    title_lines = wrap(d, title, font(F_HEAD), x2 - x1 - 34)
     total = len(title_lines) * 30 + (8 if body_lines else 0) + len(body_lines) * 21
     y = y1 + max(16, ((y2 - y1) - total) // 2)
     for t in title_lines:
-        d.text(((x1 + x2) // 2, y), t, fill=title_color, font=F_HEAD, anchor="ma")
+        d.text(((x1 + x2) // 2, y), t, fill=title_color, font=font(F_HEAD), anchor="ma")
         y += 30
     y += 6
     for line in body_lines:
-        d.text(((x1 + x2) // 2, y), line, fill=TEXT, font=body_font, anchor="ma")
+        d.text(((x1 + x2) // 2, y), line, fill=TEXT, font=font(body_font), anchor="ma")
         y += 21
 
 
-def small_box(d: ImageDraw.ImageDraw, rect: tuple[int, int, int, int], title: str, body: str, fill: str, outline: str) -> None:
-    box(d, rect, title, wrap(d, body, F_SMALL, rect[2] - rect[0] - 30), fill, outline, body_font=F_SMALL)
+def small_box(d: diagram_backend.Drawing, rect: tuple[int, int, int, int], title: str, body: str, fill: str, outline: str) -> None:
+    box(d, rect, title, [body], fill, outline, body_font=F_SMALL)
 
 
-def chip(d: ImageDraw.ImageDraw, xy: tuple[int, int], text: str, color: str, fill: str) -> tuple[int, int, int, int]:
+def chip(d: diagram_backend.Drawing, xy: tuple[int, int], text: str, color: str, fill: str) -> tuple[int, int, int, int]:
     x, y = xy
-    tw, th = text_size(d, text, F_SMALL)
+    tw, th = text_size(d, text, font(F_SMALL))
     rect = (x, y, x + tw + 30, y + th + 18)
     rounded(d, rect, fill, color, 2, 18)
-    d.text((x + 15, y + 9), text, fill=color, font=F_SMALL, anchor="la")
+    d.text((x + 15, y + 9), text, fill=color, font=font(F_SMALL), anchor="la")
     return rect
 
 
-def arrow(d: ImageDraw.ImageDraw, start: tuple[int, int], end: tuple[int, int], color: str = GRAY, width: int = 4) -> None:
+def arrow(d: diagram_backend.Drawing, start: tuple[int, int], end: tuple[int, int], color: str = GRAY, width: int = 4) -> None:
     d.line([start, end], fill=color, width=width)
     sx, sy = start
     ex, ey = end
@@ -150,14 +139,20 @@ def arrow(d: ImageDraw.ImageDraw, start: tuple[int, int], end: tuple[int, int],
     d.polygon([end, p1, p2], fill=color)
 
 
-def save(img: Image.Image, name: str) -> None:
+def save(d: diagram_backend.Drawing, name: str) -> None:
     OUT_DIR.mkdir(parents=True, exist_ok=True)
-    img.save(OUT_DIR / name, quality=95)
-    print(f"created {OUT_DIR / name}")
+    for path in figure_output.save_drawing(d, OUT_DIR / name, OUTPUT):
+        print(f"created {path}")
+
+
+def configure(options: figure_output.OutputOptions) -> None:
+    """Apply the output settings; pool workers run this once at start-up."""
+    global OUTPUT
+    OUTPUT = options
 
 
 def fig1() -> None:
-    img, d = canvas("HCP-Bench总体架构", "统一负载、统一共识入口、统一指标口径的高频共识性能测试平台")
+    d = canvas("HCP-Bench总体架构", "统一负载、统一共识入口、统一指标口径的高频共识性能测试平台")
     section(d, (55, 135, 540, 940), "负载生成子系统", GREEN_L, GREEN)
     section(d, (660, 135, 1145, 940), "共识执行子系统", BLUE_L, BLUE)
     section(d, (1260, 135, 1745, 940), "实验编排与分析子系统", PURPLE_L, PURPLE)
@@ -201,11 +196,11 @@ def fig1() -> None:
     ]:
         chip(d, (x, 980), label, color, fill)
     box(d, (210, 1040, 1590, 1125), "设计原则", ["自研算法共享同一负载入口和统计链路；官方CometBFT作为独立工程基线，不与轻量实现混跑"], GRAY_L, GRAY)
-    save(img, "fig4_1_hcap_bench_overall_architecture.png")
+    save(d, "fig4_1_hcap_bench_overall_architecture.png")
 
 
 def fig2() -> None:
-    img, d = canvas("单轮实验数据流", "从参数配置到共识确认、状态执行和指标归档的端到端数据路径")
+    d = canvas("单轮实验数据流", "从参数配置到共识确认、状态执行和指标归档的端到端数据路径")
     flow = [
         ("实验配置", ["读取实验矩阵", "确定算法与规模"], ORANGE, ORANGE_L),
         ("负载生成", ["生成SDK交易字节", "写入负载记录"], GREEN, GREEN_L),
@@ -237,11 +232,11 @@ def fig2() -> None:
     for x, label in [(250, "TPS"), (360, "P50"), (470, "P95"), (580, "P99"), (705, "成功率"), (850, "消息数"), (985, "字节数"), (1120, "提交数量")]:
         chip(d, (x, 875), label, BLUE if x < 650 else ORANGE, BLUE_L if x < 650 else ORANGE_L)
     box(d, (180, 980, 1620, 1075), "闭环说明", ["当前实现按实验矩阵顺序运行；统计结果用于实验分析和参数校验，不在单轮运行中自动调整负载"], GRAY_L, GRAY)
-    save(img, "fig4_2_experiment_data_flow.png")
+    save(d, "fig4_2_experiment_data_flow.png")
 
 
 def fig3() -> None:
-    img, d = canvas("共识执行子系统结构", "自研共识引擎驱动SDK执行层，官方CometBFT作为独立对照")
+    d = canvas("共识执行子系统结构", "自研共识引擎驱动SDK执行层，官方CometBFT作为独立对照")
     section(d, (60, 135, 500, 1030), "负载入口", GREEN_L, GREEN)
     for y, title, lines in [
         (205, "交易提交接口", ["接收SDK交易字节", "支持HTTP与gRPC"]),
@@ -272,11 +267,11 @@ def fig3() -> None:
 
     arrow(d, (500, 580), (545, 580), GREEN)
     arrow(d, (1135, 580), (1180, 580), BLUE)
-    save(img, "fig4_3_consensus_execution_subsystem.png")
+    save(d, "fig4_3_consensus_execution_subsystem.png")
 
 
 def fig4() -> None:
-    img, d = canvas("共识引擎选择与执行路径", "同一负载入口下切换算法，保持统一测量口径")
+    d = canvas("共识引擎选择与执行路径", "同一负载入口下切换算法，保持统一测量口径")
     box(d, (100, 150, 430, 270), "实验配置", ["算法类型", "节点规模", "负载强度"], ORANGE_L, ORANGE)
     box(d, (560, 150, 1240, 270), "统一负载入口", ["交易字节进入共识子系统", "所有算法使用相同提交口径"], TEAL_L, TEAL)
     box(d, (1370, 150, 1700, 270), "指标输出", ["TPS、P50、P95、P99", "成功率、消息开销"], PURPLE_L, PURPLE)
@@ -314,11 +309,11 @@ def fig4() -> None:
         if i < len(stages) - 1:
             arrow(d, (x0 + i * 320 + 245, y0 + 52), (x0 + i * 320 + 315, y0 + 52))
     box(d, (260, 1000, 1540, 1085), "执行边界", ["自研算法在统一实验入口切换；官方CometBFT独立运行，不与轻量实现混合"], GRAY_L, GRAY)
-    save(img, "fig4_4_engine_selection_and_execution_path.png")
+    save(d, "fig4_4_engine_selection_and_execution_path.png")
 
 
 def fig5() -> None:
-    img, d = canvas("负载生成子系统结构", "生成SDK交易字节，记录负载侧过程数据")
+    d = canvas("负载生成子系统结构", "生成SDK交易字节，记录负载侧过程数据")
     box(d, (650, 135, 1150, 235), "实验参数", ["交易总量、发送节奏、账户分布、实验标识"], ORANGE_L, ORANGE)
     section(d, (80, 300, 1720, 1010), "HCP-Loadgen", GREEN_L, GREEN)
     modules = [
@@ -341,11 +336,11 @@ def fig5() -> None:
 
     box(d, (250, 830, 750, 925), "热路径", ["交易字节直接发送到共识入口", "优先保证发送效率"], TEAL_L, TEAL)
     box(d, (1050, 830, 1550, 925), "冷路径", ["负载侧记录异步持久化", "不参与共识主路径"], ORANGE_L, ORANGE)
-    save(img, "fig4_5_load_generation_subsystem.png")
+    save(d, "fig4_5_load_generation_subsystem.png")
 
 
 def fig6() -> None:
-    img, d = canvas("实验编排与分析子系统结构", "负责实验矩阵、运行调度、指标聚合和结果归档")
+    d = canvas("实验编排与分析子系统结构", "负责实验矩阵、运行调度、指标聚合和结果归档")
     section(d, (70, 135, 1730, 1030), "HCP-Lab", PURPLE_L, PURPLE)
     for x, title, lines in [
         (140, "实验定义", ["每个实验独立配置", "包含运行与验证脚本"]),
@@ -367,11 +362,11 @@ def fig6() -> None:
     box(d, (160, 735, 800, 865), "中间过程数据区", ["二进制文件、节点数据、运行日志、明细记录", "用于复现实验过程和排查异常"], GRAY_L, GRAY)
     box(d, (1000, 735, 1640, 865), "结果数据区", ["每轮统计样本、聚合结果、模型输入数据", "用于后续实验分析和边界建模"], ORANGE_L, ORANGE)
     box(d, (220, 950, 1580, 1025), "数据原则", ["中间过程与结果数据分区保存；实验结果必须能追溯到对应参数、负载记录和节点状态"], GRAY_L, GRAY)
-    save(img, "fig4_6_lab_orchestration_subsystem.png")
+    save(d, "fig4_6_lab_orchestration_subsystem.png")
 
 
 def fig7() -> None:
-    img, d = canvas("HCP-Bench数据分层与流转", "链上执行数据与链下实验数据职责分离，降低观测路径耦合")
+    d = canvas("HCP-Bench数据分层与流转", "链上执行数据与链下实验数据职责分离，降低观测路径耦合")
     box(d, (130, 150, 520, 260), "数据输入源", ["负载生成器", "共识引擎", "SDK执行层"], BLUE_L, BLUE)
     box(d, (705, 150, 1095, 260), "分类规则", ["是否参与状态提交", "是否参与共识验证"], ORANGE_L, ORANGE)
     box(d, (1280, 150, 1670, 260), "分析使用", ["性能统计", "异常定位", "边界建模"], PURPLE_L, PURPLE)
@@ -401,11 +396,11 @@ def fig7() -> None:
         y = 500 + (i // 2) * 170
         small_box(d, (x, y, x + 270, y + 115), title, body, "#FFFFFF", RED)
     box(d, (1070, 845, 1605, 940), "特征", ["不参与共识，仅用于复现、观测和性能分析"], RED_M, RED)
-    save(img, "fig4_7_data_layers_and_flow.png")
+    save(d, "fig4_7_data_layers_and_flow.png")
 
 
 def fig8() -> None:
-    img, d = canvas("区块链节点数据存储架构", "共识提交后由SDK执行层写入真实节点数据")
+    d = canvas("区块链节点数据存储架构", "共识提交后由SDK执行层写入真实节点数据")
     box(d, (150, 160, 520, 300), "共识提交", ["自研引擎完成排序", "形成已确认区块"], BLUE_L, BLUE)
     box(d, (715, 160, 1085, 300), "SDK执行适配层", ["执行交易", "提交应用状态"], PURPLE_L, PURPLE)
     box(d, (1280, 160, 1650, 300), "节点数据目录", ["每个节点独立保存", "高度、哈希与执行结果"], GREEN_L, GREEN)
@@ -422,11 +417,11 @@ def fig8() -> None:
     box(d, (1030, 535, 1625, 660), "完整节点数据", ["网络、内存池、区块提议、投票", "区块存储和状态库由官方节点维护"], "#FFFFFF", ORANGE)
     box(d, (1030, 730, 1625, 845), "使用边界", ["只用于CometBFT工程基线对比", "不代表自研共识内部结构"], "#FFFFFF", ORANGE)
     box(d, (1030, 900, 1625, 980), "对比意义", ["连接自研轻量实现与成熟工程项目"], "#FFFFFF", ORANGE)
-    save(img, "fig4_8_blockchain_node_storage.png")
+    save(d, "fig4_8_blockchain_node_storage.png")
 
 
 def fig9() -> None:
-    img, d = canvas("系统实验数据存储架构", "PostgreSQL保存负载侧结构化数据，文件系统保存实验过程与结果数据")
+    d = canvas("系统实验数据存储架构", "PostgreSQL保存负载侧结构化数据，文件系统保存实验过程与结果数据")
     section(d, (90, 155, 830, 1010), "PostgreSQL结构化存储", BLUE_L, BLUE)
     box(d, (160, 270, 760, 390), "实验隔离", ["每轮实验使用独立数据命名空间", "运行开始前重建数据表"], "#FFFFFF", BLUE)
     for i, title in enumerate(["账户信息", "余额快照", "订单记录", "交易记录"]):
@@ -442,15 +437,86 @@ def fig9() -> None:
     small_box(d, (1040, 740, 1320, 875), "统计样本", "每轮实验指标样本", "#FFFFFF", ORANGE)
     small_box(d, (1360, 740, 1640, 875), "聚合结果", "多轮重复后的均值与波动", "#FFFFFF", ORANGE)
     box(d, (250, 1045, 1550, 1125), "存储原则", ["链上数据用于验证状态提交；系统数据用于复现实验过程与支撑性能分析"], GRAY_L, GRAY)
-    save(img, "fig4_9_system_data_storage.png")
-
-
-def main() -> None:
+    save(d, "fig4_9_system_data_storage.png")
+
+
+FIGURES = {
+    "fig4_1": fig1,
+    "fig4_2": fig2,
+    "fig4_3": fig3,
+    "fig4_4": fig4,
+    "fig4_5": fig5,
+    "fig4_6": fig6,
+    "fig4_7": fig7,
+    "fig4_8": fig8,
+    "fig4_9": fig9,
+}
+
+
+def select_figures(text: str | None) -> list[str]:
+    if not text:
+        return list(FIGURES)
+    labels = [part.strip() for part in text.split(",") if part.strip()]
+    unknown = [label for label in labels if label not in FIGURES]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown figure(s): {', '.join(unknown)}; choose from {', '.join(FIGURES)}")
+    return [label for label in FIGURES if label in labels]
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    render_pool.add_arguments(parser)
+    parser.add_argument(
+        "--only",
+        type=select_figures,
+        default=list(FIGURES),
+        metavar="LABELS",
+        help="comma-separated figures to build, e.g. fig4_3,fig4_7 (default: all)",
+    )
+    parser.add_argument("--clean", action="store_true", help="delete the selected figures and redraw them")
+    figure_output.add_arguments(parser)
+    stage_trace.add_arguments(parser)
+    args = parser.parse_args(argv)
+    stage_trace.configure_from_args(args)
+    options = figure_output.options_from_args(args)
+    configure(options)
     OUT_DIR.mkdir(parents=True, exist_ok=True)
-    for item in OUT_DIR.glob("fig4_*.png"):
-        item.unlink()
-    for fn in [fig1, fig2, fig3, fig4, fig5, fig6, fig7, fig8, fig9]:
-        fn()
+    cache = build_cache.BuildCache(OUT_DIR)
+    if args.clean:
+        for label in args.only:
+            for name in cache.outputs(label):
+                (OUT_DIR / name).unlink()
+        cache.forget(args.only)
+    shared = build_cache.digest(
+        PIL.__version__,
+        font_registry.font_path(),
+        font_registry.font_path(bold=True),
+        build_cache.module_constants(globals()),
+        build_cache.source_digest(font, text_size, wrap, canvas, rounded, section, box, small_box, chip, arrow, save, text_layout),
+        build_cache.source_digest(diagram_backend),
+        build_cache.source_digest(figure_output),
+        options,
+    )
+    jobs: list[render_pool.Job] = []
+    keys: dict[str, str] = {}
+    for label in args.only:
+        fn = FIGURES[label]
+        key = build_cache.digest(shared, build_cache.source_digest(fn))
+        if not cache.fresh(label, key):
+            jobs.append((label, fn, ()))
+            keys[label] = key
+    if not jobs:
+        print(f"all figures up to date in {OUT_DIR}")
+        stage_trace.write(OUT_DIR)
+        return
+    workers = render_pool.worker_count(args.jobs, len(jobs), args.max_memory_mb)
+    start = time.perf_counter()
+    timings = render_pool.run_jobs(Path(__file__).stem, jobs, workers, setup="configure", setup_args=(options,), backend=None)
+    render_pool.report(timings, time.perf_counter() - start, workers)
+    for label, _ in timings:
+        cache.record(label, keys[label])
+    cache.save()
+    stage_trace.write(OUT_DIR)
 
 
 if __name__ == "__main__":
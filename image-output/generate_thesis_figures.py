@@ -2,19 +2,38 @@
 """Generate thesis figures from hcap-lab/experiments/report/summary_all.md."""
 from __future__ import annotations
 
+import argparse
+import contextlib
+import functools
 import re
+import sys
+import time
 from pathlib import Path
-import json
 
 import matplotlib
 import matplotlib.pyplot as plt
 import numpy as np
 
+import build_cache
+import figure_output
+import fit_engine
+import font_registry
+import latency_sketch
+import pb_cpbq
+import point_cloud
+import raw_samples
+import render_pool
+import results_store
+import stage_trace
+import summary_tables
+
 
 ROOT = Path(__file__).resolve().parents[2]
 SUMMARY = ROOT / "hcap-lab" / "experiments" / "report" / "summary_all.md"
 EXP1_SUMMARY = ROOT / "hcap-lab" / "experiments" / "exp1_benchmark" / "report" / "summary.json"
 OUT_DIR = Path(__file__).resolve().parent / "chapter3"
+OUTPUT = figure_output.OutputOptions()
+DENSITY_THRESHOLD = point_cloud.DENSITY_THRESHOLD
 
 ALGO_ORDER = ["PBFT", "HotStuff", "Raft", "CometBFT-light", "tPBFT"]
 COLORS = {
@@ -31,30 +50,41 @@ COLORS = {
     "D": "#D9802E",
 }
 
+FIGURES = tuple(f"fig3_{i}" for i in range(1, 13))
 BAR_WIDTH_2_3 = 0.8 * 2 / 3
+BAND_POINTS = 120
+
+FONT_FAMILIES = [
+    "Microsoft YaHei",
+    "SimHei",
+    "Noto Sans CJK SC",
+    "Arial Unicode MS",
+    "DejaVu Sans",
+]
+STYLE_RC = {
+    "axes.unicode_minus": False,
+    "figure.facecolor": "white",
+    "savefig.facecolor": "white",
+    "axes.edgecolor": "#333333",
+    "axes.grid": False,
+    "grid.color": "#DDDDDD",
+    "grid.linestyle": "--",
+    "grid.linewidth": 0.6,
+    "legend.frameon": False,
+}
 
 
 def setup_style() -> None:
-    matplotlib.rcParams["font.sans-serif"] = [
-        "Microsoft YaHei",
-        "SimHei",
-        "Noto Sans CJK SC",
-        "Arial Unicode MS",
-        "DejaVu Sans",
-    ]
-    matplotlib.rcParams["axes.unicode_minus"] = False
-    plt.rcParams.update(
-        {
-            "figure.facecolor": "white",
-            "savefig.facecolor": "white",
-            "axes.edgecolor": "#333333",
-            "axes.grid": False,
-            "grid.color": "#DDDDDD",
-            "grid.linestyle": "--",
-            "grid.linewidth": 0.6,
-            "legend.frameon": False,
-        }
-    )
+    matplotlib.rcParams["font.sans-serif"] = list(font_registry.matplotlib_families(tuple(FONT_FAMILIES)))
+    plt.rcParams.update(STYLE_RC)
+
+
+def configure(options: figure_output.OutputOptions, density_threshold: int = point_cloud.DENSITY_THRESHOLD) -> None:
+    """Apply the style and output settings; pool workers run this once at start-up."""
+    global OUTPUT, DENSITY_THRESHOLD
+    OUTPUT = options
+    DENSITY_THRESHOLD = density_threshold
+    setup_style()
 
 
 def clean_outputs() -> None:
@@ -64,9 +94,13 @@ def clean_outputs() -> None:
             path.unlink()
 
 
+NUMBER = re.compile(r"[-+]?\d+(?:\.\d+)?(?:e[-+]?\d+)?", re.I)
+
+
+@functools.lru_cache(maxsize=4096)
 def parse_mean(value: str) -> float:
     text = str(value).split("±", 1)[0].replace("%", "").replace(",", "").strip()
-    match = re.search(r"[-+]?\d+(?:\.\d+)?(?:e[-+]?\d+)?", text, re.I)
+    match = NUMBER.search(text)
     return float(match.group(0)) if match else 0.0
 
 
@@ -81,36 +115,19 @@ def algo_name(value: str) -> str:
     return mapping.get(value.strip(), value.strip())
 
 
-def extract_table(markdown: str, number: str) -> list[dict[str, str]]:
-    marker = f"## 表{number} "
-    start = markdown.find(marker)
-    if start < 0:
+def extract_table(index: dict[str, summary_tables.Table], number: str) -> list[dict[str, str]]:
+    table = index.get(number)
+    if table is None:
         raise ValueError(f"missing table {number}: {SUMMARY}")
-    lines = markdown[start:].splitlines()
-    table_lines: list[str] = []
-    in_table = False
-    for line in lines:
-        if line.startswith("|"):
-            in_table = True
-            table_lines.append(line)
-        elif in_table:
-            break
-    if len(table_lines) < 3:
+    if not table.header:
         raise ValueError(f"table {number} has no body")
-    header = [c.strip() for c in table_lines[0].strip("|").split("|")]
-    rows = []
-    for line in table_lines[2:]:
-        cells = [c.strip() for c in line.strip("|").split("|")]
-        if len(cells) == len(header):
-            rows.append(dict(zip(header, cells)))
-    return rows
+    return table.rows
 
 
 def save(fig: plt.Figure, name: str, _caption: str, _description: str, *, pad_inches: float = 0.1) -> None:
-    path = OUT_DIR / name
-    fig.savefig(path, dpi=300, bbox_inches="tight", pad_inches=pad_inches)
+    for path in figure_output.save_figure(fig, OUT_DIR / name, OUTPUT, pad_inches=pad_inches):
+        print(f"created {path}")
     plt.close(fig)
-    print(f"created {path}")
 
 
 def pick(row: dict[str, str], *names: str) -> str:
@@ -120,21 +137,19 @@ def pick(row: dict[str, str], *names: str) -> str:
     raise KeyError(f"missing any of columns {names}")
 
 
-def load_benchmark_raw_points() -> dict[str, dict[int, dict[str, list[float]]]]:
+def load_benchmark_raw_points(store: results_store.ResultsStore | None = None) -> raw_samples.RawSamples | None:
     if not EXP1_SUMMARY.exists():
-        return {}
-    summary = json.loads(EXP1_SUMMARY.read_text(encoding="utf-8"))
-    points: dict[str, dict[int, dict[str, list[float]]]] = {}
-    for engine, by_node in summary.items():
-        algo = algo_name(engine.replace("_", "-"))
-        for node_text, stats in by_node.items():
-            node = int(node_text)
-            metrics = points.setdefault(algo, {}).setdefault(node, {"tps": [], "p99": []})
-            for item in stats.get("raw", []):
-                raw_metrics = item.get("metrics", {})
-                metrics["tps"].append(float(raw_metrics.get("tps", 0.0)))
-                metrics["p99"].append(float(raw_metrics.get("p99_ms", 0.0)))
-    return points
+        return None
+    if store is not None:
+        return store.samples(EXP1_SUMMARY.parents[1].name, ("tps", "p99_ms"))
+    return raw_samples.load_cached(EXP1_SUMMARY, ("tps", "p99_ms"))
+
+
+def scatter_benchmark_raw(ax: plt.Axes, raw_points: raw_samples.RawSamples | None, algo: str, metric: str, color: str) -> None:
+    if raw_points is None:
+        return
+    style = point_cloud.PointStyle(jitter=0.28, size=34, alpha=0.76, edge_width=0.6)
+    point_cloud.draw(ax, raw_points, algo, metric, color, style, DENSITY_THRESHOLD)
 
 
 def plot_load_pattern(rows: list[dict[str, str]]) -> None:
@@ -204,6 +219,22 @@ def matrix(rows: list[dict[str, str]]) -> dict[str, dict[int, dict[str, float]]]
     return out
 
 
+def apply_latency_percentiles(
+    bench: dict[str, dict[int, dict[str, float]]], percentiles: dict[str, dict[int, dict[str, float]]]
+) -> dict[str, dict[int, dict[str, float]]]:
+    """Replace the table's P50/P95/P99 with sketch percentiles for every cell the sketches cover."""
+    out = {algo: {n: dict(cell) for n, cell in by_node.items()} for algo, by_node in bench.items()}
+    for engine, by_node in percentiles.items():
+        if algo_name(engine) not in out:
+            print(f"latency sketches: engine {engine!r} matches no row of table 3-5; ignored", file=sys.stderr)
+            continue
+        for n, values in by_node.items():
+            cell = out[algo_name(engine)].get(n)
+            if cell is not None:
+                cell.update({name: values[name] for name in ("p50", "p95", "p99")})
+    return out
+
+
 def plot_benchmark(data: dict[str, dict[int, dict[str, float]]]) -> None:
     nodes = [8, 16, 32]
     fig, axes = plt.subplots(1, 2, figsize=(13, 4.8))
@@ -291,11 +322,13 @@ def plot_degradation(rows: list[dict[str, str]]) -> None:
 
 
 def plot_saturation(rows: list[dict[str, str]]) -> None:
-    lambdas = [250, 500, 1000, 1500, 2000, 2500]
+    # The λ grid is whatever the scan ran, e.g. after saturation.py added points around the knee.
+    columns = [column for column in rows[0] if column != "算法\\lambda"]
+    lambdas = [parse_mean(column) for column in columns]
     fig, ax = plt.subplots(figsize=(9.2, 5.2))
     for row in rows:
         algo = row["算法\\lambda"]
-        ax.plot(lambdas, [parse_mean(row[str(v)]) for v in lambdas], marker="o", ls=":", lw=2.1, label=algo, color=COLORS.get(algo))
+        ax.plot(lambdas, [parse_mean(row[column]) for column in columns], marker="o", ls=":", lw=2.1, label=algo, color=COLORS.get(algo))
     ax.set_title("负载强度扫描下的吞吐饱和趋势")
     ax.set_xlabel("负载强度 λ (tx/s)")
     ax.set_ylabel("TPS (tx/s)")
@@ -384,10 +417,29 @@ def plot_scores(algo_rows: list[dict[str, str]], opt_rows: list[dict[str, str]])
     save(fig, "fig3_10_pb_cpbq_scores.png", "图3-10 PB-CPBQ边界向量综合评分", "基于表3-19和表3-20绘制。")
 
 
-def plot_tsat_fit(rows: list[dict[str, str]], raw_points: dict[str, dict[int, dict[str, list[float]]]]) -> None:
-    nodes = np.array([8, 16, 32], dtype=float)
+def draw_fit_bands(
+    ax: plt.Axes,
+    raw_points: raw_samples.RawSamples | None,
+    algos: list[str],
+    metric: str,
+    degree: int,
+    x: np.ndarray,
+) -> None:
+    if raw_points is None:
+        return
+    result, bands = fit_engine.bootstrap_bands(raw_points, metric, degree, x, engines=algos)
+    for i, algo in enumerate(algos):
+        if not result.n[i]:
+            continue
+        color = COLORS.get(algo, "#777777")
+        ax.fill_between(bands.x, bands.pi_low[i], bands.pi_high[i], color=color, alpha=0.07, lw=0, zorder=1)
+        ax.fill_between(bands.x, bands.ci_low[i], bands.ci_high[i], color=color, alpha=0.2, lw=0, zorder=1)
+
+
+def plot_tsat_fit(rows: list[dict[str, str]], raw_points: raw_samples.RawSamples | None) -> None:
     xfit = np.linspace(8, 32, 160)
     fig, ax = plt.subplots(figsize=(9.4, 5.4))
+    draw_fit_bands(ax, raw_points, [row["算法"] for row in rows], "tps", fit_engine.TSAT_DEGREE, np.linspace(8, 32, BAND_POINTS))
 
     for row in rows:
         algo = row["算法"]
@@ -395,10 +447,7 @@ def plot_tsat_fit(rows: list[dict[str, str]], raw_points: dict[str, dict[int, di
         beta = parse_mean(pick(row, "β_A", "beta", "斜率"))
         color = COLORS.get(algo, "#777777")
         ax.plot(xfit, alpha + beta * xfit, ls="-", lw=2.2, color=color, label=f"{algo} 拟合")
-        for node in nodes.astype(int):
-            values = raw_points.get(algo, {}).get(node, {}).get("tps", [])
-            offsets = np.linspace(-0.28, 0.28, len(values)) if values else []
-            ax.scatter(node + offsets, values, s=34, color=color, alpha=0.76, edgecolor="white", linewidth=0.6, zorder=3)
+        scatter_benchmark_raw(ax, raw_points, algo, "tps", color)
 
     ax.set_title("吞吐量饱和边界拟合")
     ax.set_xlabel("节点数 N")
@@ -409,10 +458,10 @@ def plot_tsat_fit(rows: list[dict[str, str]], raw_points: dict[str, dict[int, di
     save(fig, "fig3_11_tsat_fit_scatter.png", "图3-11 吞吐量饱和边界拟合曲线与散点", "基于表3-17绘制。")
 
 
-def plot_p99_fit(rows: list[dict[str, str]], raw_points: dict[str, dict[int, dict[str, list[float]]]]) -> None:
-    nodes = np.array([8, 16, 32], dtype=float)
+def plot_p99_fit(rows: list[dict[str, str]], raw_points: raw_samples.RawSamples | None) -> None:
     xfit = np.linspace(8, 64, 220)
     fig, ax = plt.subplots(figsize=(9.4, 5.4))
+    draw_fit_bands(ax, raw_points, [row["算法"] for row in rows], "p99_ms", fit_engine.P99_DEGREE, np.linspace(8, 64, BAND_POINTS))
     for row in rows:
         algo = row["算法"]
         alpha = parse_mean(pick(row, "alpha", "α"))
@@ -421,10 +470,7 @@ def plot_p99_fit(rows: list[dict[str, str]], raw_points: dict[str, dict[int, dic
         color = COLORS.get(algo, "#777777")
         yfit = alpha * xfit**2 + beta * xfit + gamma
         ax.plot(xfit, yfit, ls="-", lw=2.1, color=color, label=f"{algo} 拟合")
-        for node in nodes.astype(int):
-            values = raw_points.get(algo, {}).get(node, {}).get("p99", [])
-            offsets = np.linspace(-0.28, 0.28, len(values)) if values else []
-            ax.scatter(node + offsets, values, s=34, color=color, alpha=0.76, edgecolor="white", linewidth=0.6, zorder=3)
+        scatter_benchmark_raw(ax, raw_points, algo, "p99_ms", color)
 
     ax.axhline(2000, color="#777777", lw=1.0, ls=":")
     ax.set_title("P99尾延迟退化模型拟合")
@@ -436,25 +482,154 @@ def plot_p99_fit(rows: list[dict[str, str]], raw_points: dict[str, dict[int, dic
     save(fig, "fig3_12_p99_fit_scatter.png", "图3-12 P99尾延迟拟合曲线与散点", "基于表3-18绘制。")
 
 
-def main() -> None:
-    setup_style()
-    clean_outputs()
-    md = SUMMARY.read_text(encoding="utf-8")
-    raw_points = load_benchmark_raw_points()
-    tables = {f"3-{i}": extract_table(md, f"3-{i}") for i in range(3, 21)}
-    plot_load_pattern(tables["3-3"])
-    plot_comet(tables["3-4"])
+def figure_jobs(
+    tables: dict[str, list[dict[str, str]]],
+    raw_points: raw_samples.RawSamples | None,
+    latency: dict[str, dict[int, dict[str, float]]] | None = None,
+) -> list[render_pool.Job]:
     bench = matrix(tables["3-5"])
-    plot_benchmark(bench)
-    plot_latency(bench)
-    plot_p99_3d(bench)
-    plot_degradation(tables["3-6"])
-    plot_saturation(tables["3-7"])
-    plot_group(tables["3-8"], tables["3-9"])
-    plot_ablation(tables["3-10"])
-    plot_scores(tables["3-19"], tables["3-20"])
-    plot_tsat_fit(tables["3-15"], raw_points)
-    plot_p99_fit(tables["3-16"], raw_points)
+    if latency:
+        bench = apply_latency_percentiles(bench, latency)
+    return [
+        ("fig3_1", plot_load_pattern, (tables["3-3"],)),
+        ("fig3_2", plot_comet, (tables["3-4"],)),
+        ("fig3_3", plot_benchmark, (bench,)),
+        ("fig3_4", plot_latency, (bench,)),
+        ("fig3_5", plot_p99_3d, (bench,)),
+        ("fig3_6", plot_degradation, (tables["3-6"],)),
+        ("fig3_7", plot_saturation, (tables["3-7"],)),
+        ("fig3_8", plot_group, (tables["3-8"], tables["3-9"])),
+        ("fig3_9", plot_ablation, (tables["3-10"],)),
+        ("fig3_10", plot_scores, (tables["3-19"], tables["3-20"])),
+        ("fig3_11", plot_tsat_fit, (tables["3-15"], raw_points)),
+        ("fig3_12", plot_p99_fit, (tables["3-16"], raw_points)),
+    ]
+
+
+def select_figures(text: str | None) -> list[str]:
+    if not text:
+        return list(FIGURES)
+    labels = [part.strip() for part in text.split(",") if part.strip()]
+    unknown = [label for label in labels if label not in FIGURES]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown figure(s): {', '.join(unknown)}; choose from {', '.join(FIGURES)}")
+    return [label for label in FIGURES if label in labels]
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__)
+    render_pool.add_arguments(parser)
+    parser.add_argument(
+        "--only",
+        type=select_figures,
+        default=list(FIGURES),
+        metavar="LABELS",
+        help="comma-separated figures to build, e.g. fig3_11,fig3_12 (default: all)",
+    )
+    parser.add_argument(
+        "--store",
+        type=Path,
+        nargs="?",
+        const=results_store.DB_PATH,
+        help="read the tables and raw points from the SQLite results store, ingesting changed reports first",
+    )
+    parser.add_argument(
+        "--latency-sketches",
+        type=Path,
+        metavar="JSON",
+        help="take P50/P95/P99 from per-transaction latency sketches (latency_sketch.py build) instead of table 3-5",
+    )
+    parser.add_argument(
+        "--score-weights",
+        type=pb_cpbq.parse_weights,
+        metavar="WEIGHTS",
+        help="recompute the PB-CPBQ scores of fig3_10 with these T_sat,L_tail,R_deg weights instead of tables 3-19/3-20",
+    )
+    figure_output.add_arguments(parser)
+    point_cloud.add_arguments(parser)
+    stage_trace.add_arguments(parser)
+    parser.add_argument("--clean", action="store_true", help="delete previous outputs and re-render the selected figures")
+    return parser
+
+
+def build(args: argparse.Namespace) -> list[str]:
+    """Render the figures whose inputs, code or settings changed; returns their labels."""
+    options = figure_output.options_from_args(args)
+    configure(options, args.density_threshold)
+    selected = set(args.only)
+    if args.clean and len(selected) == len(FIGURES):
+        clean_outputs()
+    OUT_DIR.mkdir(parents=True, exist_ok=True)
+    cache = build_cache.BuildCache(OUT_DIR)
+    if args.clean:
+        for label in selected:
+            for name in cache.outputs(label):
+                (OUT_DIR / name).unlink()
+        cache.forget(selected)
+    with results_store.ResultsStore(args.store) if args.store else contextlib.nullcontext() as store:
+        if store:
+            with stage_trace.span("store.ingest"):
+                store.ingest()
+        with stage_trace.span("load.summary_tables"):
+            index = store.tables() if store else summary_tables.load_index(SUMMARY)
+        with stage_trace.span("load.raw_points"):
+            raw_points = load_benchmark_raw_points(store)
+    with stage_trace.span("parse.tables"):
+        tables = {f"3-{i}": extract_table(index, f"3-{i}") for i in range(3, 21)}
+    if args.score_weights is not None:
+        with stage_trace.span("score.pb_cpbq"):
+            tables["3-19"], tables["3-20"] = pb_cpbq.score_rows(index, args.score_weights)
+    latency = None
+    if args.latency_sketches:
+        with stage_trace.span("load.latency_sketches"):
+            latency = latency_sketch.SketchSet.load(args.latency_sketches).percentile_table((50, 95, 99))
+    shared = build_cache.digest(
+        matplotlib.__version__,
+        build_cache.module_constants(globals()),
+        build_cache.source_digest(
+            setup_style,
+            save,
+            parse_mean,
+            algo_name,
+            pick,
+            matrix,
+            apply_latency_percentiles,
+            scatter_benchmark_raw,
+            draw_fit_bands,
+            fit_engine,
+        ),
+        build_cache.source_digest(figure_output, point_cloud),
+        options,
+    )
+    jobs: list[render_pool.Job] = []
+    keys: dict[str, str] = {}
+    for label, func, func_args in figure_jobs(tables, raw_points, latency):
+        if label not in selected:
+            continue
+        key = build_cache.digest(shared, build_cache.source_digest(func), func_args)
+        if not cache.fresh(label, key):
+            keys[label] = key
+            jobs.append((label, func, func_args))
+    if not jobs:
+        print(f"all figures up to date in {OUT_DIR}")
+        return []
+    workers = render_pool.worker_count(args.jobs, len(jobs), args.max_memory_mb)
+    start = time.perf_counter()
+    timings = render_pool.run_jobs(
+        Path(__file__).stem, jobs, workers, setup="configure", setup_args=(options, args.density_threshold)
+    )
+    render_pool.report(timings, time.perf_counter() - start, workers)
+    for label, _ in timings:
+        cache.record(label, keys[label])
+    cache.save()
+    return [label for label, _ in timings]
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = build_parser().parse_args(argv)
+    stage_trace.configure_from_args(args)
+    build(args)
+    stage_trace.write(OUT_DIR)
 
 
 if __name__ == "__main__":
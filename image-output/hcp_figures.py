@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""One entry point for every figure generator; heavy modules load only for the command run.
+
+Examples:
+    python hcp_figures.py list
+    python hcp_figures.py chapter3 --jobs 0
+    python hcp_figures.py fig3_11 fig4_2 extended-fit:fig3_13 -- --formats png,svg
+    python hcp_figures.py watch --only chapter3
+"""
+from __future__ import annotations
+
+import time
+
+_START = time.perf_counter()
+
+import importlib  # noqa: E402
+import sys  # noqa: E402
+from pathlib import Path  # noqa: E402
+
+
+# command -> (module, summary); modules are imported only when their command runs.
+COMMANDS = {
+    "chapter3": ("generate_thesis_figures", "Chapter 3 figures from summary_all.md and exp1 raw points"),
+    "extended-fit": ("generate_chapter3_extended_fit", "Section 3.7 extended-fit figures, CSV and capacity table"),
+    "chapter4": ("generate_chapter4_architecture", "Chapter 4 architecture diagrams"),
+    "watch": ("watch_figures", "re-render Chapter 3 figures whenever their inputs change"),
+    "compare": ("regression_compare", "compare a candidate summary.json against a baseline and fail on regressions"),
+    "results": ("results_store", "ingest experiment reports into SQLite and query them"),
+    "latency": ("latency_sketch", "build and query mergeable percentile sketches of per-transaction latencies"),
+    "repeats": ("repeat_planner", "plan extra repeats per (engine, N) until each CI reaches its target width"),
+    "saturation": ("saturation", "find throughput knees in the λ scan and plan the next λ points"),
+    "scores": ("pb_cpbq", "recompute PB-CPBQ scores and their rank stability under sampled weights"),
+    "stream": ("stream_ingest", "follow a sweep's per-run JSONL and refresh the extended-fit CSV and fits"),
+}
+# Per-figure targets; a bare label names a chapter3/chapter4 figure, other outputs need "command:label".
+TARGETS = {
+    "chapter3": {
+        "fig3_1": "load pattern sensitivity",
+        "fig3_2": "CometBFT vs CometBFT-light",
+        "fig3_3": "benchmark TPS and P99 over N",
+        "fig3_4": "latency percentiles",
+        "fig3_5": "P99 3D distribution",
+        "fig3_6": "scale degradation",
+        "fig3_7": "saturation scan",
+        "fig3_8": "group and complexity scan",
+        "fig3_9": "ablation TPS and P99",
+        "fig3_10": "PB-CPBQ scores",
+        "fig3_11": "T_sat fit with raw points",
+        "fig3_12": "P99 fit with raw points",
+    },
+    "extended-fit": {
+        "extended_fit_raw_points": "raw points CSV and NPZ",
+        "extended_fit_summary_used": "fit summary actually used",
+        "fig3_11": "extended T_sat fit with raw points",
+        "fig3_12": "extended P99 fit with raw points",
+        "extended_fit_capacity": "capacity table per SLO",
+        "fig3_13": "capacity heatmap",
+    },
+    "chapter4": {
+        "fig4_1": "HCAP-Bench overall architecture",
+        "fig4_2": "experiment data flow",
+        "fig4_3": "consensus execution subsystem",
+        "fig4_4": "engine selection and execution path",
+        "fig4_5": "load generation subsystem",
+        "fig4_6": "lab orchestration subsystem",
+        "fig4_7": "data layers and flow",
+        "fig4_8": "blockchain node storage",
+        "fig4_9": "system data storage",
+    },
+}
+
+
+def usage() -> str:
+    lines = [__doc__.strip(), "", "commands:"]
+    lines += [f"  {name:<14} {summary}" for name, (_, summary) in COMMANDS.items()]
+    lines += [f"  {'list':<14} show the per-figure targets", "", "Arguments after the command go to its generator (try <command> --help)."]
+    return "\n".join(lines)
+
+
+def list_targets() -> None:
+    for command, targets in TARGETS.items():
+        print(f"{command}:")
+        for label, summary in targets.items():
+            name = label if command != "extended-fit" else f"{command}:{label}"
+            print(f"  {name:<40} {summary}")
+
+
+def resolve(target: str) -> tuple[str, str]:
+    """``(command, label)`` for ``fig3_11`` or ``extended-fit:fig3_11``; exits on unknown names."""
+    command, _, label = target.rpartition(":")
+    if command:
+        if label in TARGETS.get(command, {}):
+            return command, label
+    else:
+        for command in ("chapter3", "chapter4"):
+            if label in TARGETS[command]:
+                return command, label
+    sys.exit(f"unknown target {target!r}; run '{Path(sys.argv[0]).name} list'")
+
+
+def load(command: str):
+    module_name = COMMANDS[command][0]
+    sys.path.insert(0, str(Path(__file__).resolve().parent))
+    before = time.perf_counter()
+    module = importlib.import_module(module_name)
+    now = time.perf_counter()
+    print(
+        f"{module_name} ready {now - _START:.2f}s after launch (its imports {now - before:.2f}s)",
+        file=sys.stderr,
+        flush=True,
+    )
+    return module
+
+
+def run_targets(targets: list[str], rest: list[str]) -> None:
+    selected: dict[str, list[str]] = {}
+    for target in targets:
+        command, label = resolve(target)
+        selected.setdefault(command, []).append(label)
+    for command, labels in selected.items():
+        load(command).main(["--only", ",".join(labels), *rest])
+
+
+def main(argv: list[str] | None = None) -> None:
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if not argv or argv[0] in ("-h", "--help"):
+        print(usage())
+        return
+    command, rest = argv[0], argv[1:]
+    if command == "list":
+        list_targets()
+    elif command in COMMANDS:
+        load(command).main(rest)
+    else:
+        split = rest.index("--") if "--" in rest else len(rest)
+        targets = [command, *rest[:split]]
+        run_targets(targets, rest[split + 1 :])
+
+
+if __name__ == "__main__":
+    main()
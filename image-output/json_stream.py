@@ -0,0 +1,121 @@
+"""Incremental JSON reader that keeps only the leaves a caller asks for."""
+from __future__ import annotations
+
+import json
+import re
+from typing import Any, Callable, Iterator, TextIO
+
+
+CHUNK_SIZE = 1 << 16
+# Unread characters required after a token before trusting it, so a number cut
+# by a chunk boundary ("12" of "12.5e3") is never accepted early.
+LOOKAHEAD = 8
+TOKEN = re.compile(
+    r"""\s*(?:
+        (?P<punct>[{}\[\]:,])
+      | (?P<string>"(?:[^"\\]|\\.)*")
+      | (?P<number>-?(?:\d+)(?:\.\d+)?(?:[eE][-+]?\d+)?)
+      | (?P<literal>true|false|null|NaN|-?Infinity)
+    )""",
+    re.VERBOSE,
+)
+# Skips to the next string, bracket or unterminated quote while discarding a subtree.
+SKIP = re.compile(r'[^"\[\]{}]*(?:(?P<string>"(?:[^"\\]|\\.)*")|(?P<bracket>[\[\]{}])|(?P<open>"))')
+LITERALS = {"true": True, "false": False, "null": None, "NaN": float("nan"), "Infinity": float("inf"), "-Infinity": float("-inf")}
+
+Path = tuple[Any, ...]
+
+
+class _Tokens:
+    def __init__(self, f: TextIO, chunk_size: int = CHUNK_SIZE) -> None:
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def next(self) -> tuple[str, str]:
+        while True:
+            match = TOKEN.match(self.buf, self.pos)
+            if match and (match.end() + LOOKAHEAD <= len(self.buf) or self.eof):
+                self.pos = match.end()
+                kind = match.lastgroup or ""
+                return kind, match.group(kind)
+            if self.eof:
+                rest = self.buf[self.pos :].strip()
+                raise ValueError(f"invalid JSON near {rest[:40]!r}" if rest else "unexpected end of JSON")
+            self._refill()
+
+    def _refill(self) -> None:
+        chunk = self.f.read(self.chunk_size)
+        self.buf = self.buf[self.pos :] + chunk
+        self.pos = 0
+        self.eof = not chunk
+
+    def skip_container(self) -> None:
+        """Discard the rest of an object/array whose opening bracket was just read."""
+        depth = 1
+        while depth:
+            match = SKIP.match(self.buf, self.pos)
+            if match is None or match.lastgroup == "open":
+                if self.eof:
+                    raise ValueError("unexpected end of JSON")
+                if match is None:
+                    self.pos = len(self.buf)
+                else:
+                    self.pos = match.start("open")
+                self._refill()
+                continue
+            self.pos = match.end()
+            if match.lastgroup == "bracket":
+                depth += 1 if match.group("bracket") in "{[" else -1
+
+
+def _scalar(kind: str, text: str) -> Any:
+    if kind == "string":
+        return json.loads(text)
+    if kind == "number":
+        return float(text) if any(c in text for c in ".eE") else int(text)
+    return LITERALS[text]
+
+
+def _skip(tokens: _Tokens, kind: str, text: str) -> None:
+    if kind == "punct":
+        tokens.skip_container()
+
+
+def _walk(tokens: _Tokens, path: Path, keep: Callable[[Path], bool], kind: str, text: str) -> Iterator[tuple[Path, Any]]:
+    if kind != "punct":
+        yield path, _scalar(kind, text)
+        return
+    if text not in "{[":
+        raise ValueError(f"unexpected {text!r} in JSON")
+    close = "}" if text == "{" else "]"
+    index = 0
+    kind, text = tokens.next()
+    while text != close:
+        if close == "}":
+            child = path + (json.loads(text),)
+            tokens.next()  # ':'
+            kind, text = tokens.next()
+        else:
+            child = path + (index,)
+            index += 1
+        if keep(child):
+            yield from _walk(tokens, child, keep, kind, text)
+        else:
+            _skip(tokens, kind, text)
+        kind, text = tokens.next()
+        if text == ",":
+            kind, text = tokens.next()
+
+
+def iter_leaves(f: TextIO, keep: Callable[[Path], bool], chunk_size: int = CHUNK_SIZE) -> Iterator[tuple[Path, Any]]:
+    """Yield ``(path, value)`` for scalar leaves under paths accepted by ``keep``.
+
+    ``keep`` sees every object key / array index path before its value is read;
+    rejected subtrees are skipped token by token without being materialized, so
+    memory stays bounded by ``chunk_size`` and the longest single token.
+    """
+    tokens = _Tokens(f, chunk_size)
+    yield from _walk(tokens, (), keep, *tokens.next())
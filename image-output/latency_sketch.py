@@ -0,0 +1,423 @@
+#!/usr/bin/env python3
+"""Mergeable relative-error quantile sketches (DDSketch style) over raw per-transaction latencies.
+
+A sketch keeps one counter per logarithmic bucket: a value v lands in bucket
+ceil(log_gamma(v)) with gamma = (1 + a) / (1 - a), so every quantile it returns is
+within relative error ``a`` of the exact one. Latencies from 1 µs to hours fit in a
+few thousand counters, sketches of the same accuracy merge by adding counters, and
+tens of millions of samples stream through in fixed-size chunks without ever
+being sorted or held in memory at once.
+
+Loadgen files are one per run (or several chunks per run); engine, N and repeat
+come from the path, e.g. ``latency/pbft/n32/r3/part-0001.csv.gz``.
+
+Examples:
+    python latency_sketch.py build ../../hcap-lab/experiments/exp1_benchmark/latency
+    python latency_sketch.py query ../../hcap-lab/experiments/exp1_benchmark/latency/latency_sketches.json
+    python latency_sketch.py query latency_sketches.json --by engine --cdf tail.csv
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import gzip
+import itertools
+import json
+import math
+import re
+import sys
+from pathlib import Path
+from typing import Iterator, Mapping, Sequence
+
+import numpy as np
+
+import raw_samples
+
+
+RELATIVE_ACCURACY = 0.01
+# Latencies at or below this many ms share one zero bucket.
+MIN_VALUE = 1e-3
+CHUNK_ROWS = 1_000_000
+SKETCH_NAME = "latency_sketches.json"
+LATENCY_COLUMNS = ("latency_ms", "latency", "lat_ms", "duration_ms")
+SUFFIXES = (".csv", ".txt", ".npy", ".csv.gz", ".txt.gz")
+PERCENTILES = (50.0, 95.0, 99.0, 99.9)
+# Matched against the lower-cased path below the input root; ``repeat`` is optional. The engine
+# starts at a path segment and may itself contain ``_`` (``cometbft_light/n16/r1``).
+PATH_PATTERN = (
+    r"(?:^|/)(?P<engine>[a-z][a-z0-9_-]*?)[_/]n(?:odes)?[_=-]?(?P<nodes>\d+)"
+    r"(?:[_/]r(?:ep(?:eat)?)?[_=-]?(?P<repeat>\d+))?(?:[_/.]|$)"
+)
+LEVELS = {"run": 3, "node": 2, "engine": 1}
+
+RunKey = tuple[str, int, int]
+
+
+class LatencySketch:
+    """Counts per logarithmic bucket in one dense array starting at bucket ``offset``."""
+
+    def __init__(self, relative_accuracy: float = RELATIVE_ACCURACY) -> None:
+        if not 0.0 < relative_accuracy < 1.0:
+            raise ValueError(f"relative accuracy must be in (0, 1), got {relative_accuracy}")
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1.0 + relative_accuracy) / (1.0 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.offset = 0
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def key(self, values: np.ndarray) -> np.ndarray:
+        return np.ceil(np.log(values) / self._log_gamma).astype(np.int64)
+
+    def _grow(self, low: int, high: int) -> None:
+        """Make room for buckets ``low..high``."""
+        if not len(self.counts):
+            self.offset = low
+            self.counts = np.zeros(high - low + 1, dtype=np.int64)
+            return
+        start = min(low, self.offset)
+        stop = max(high, self.offset + len(self.counts) - 1)
+        if start == self.offset and stop == self.offset + len(self.counts) - 1:
+            return
+        grown = np.zeros(stop - start + 1, dtype=np.int64)
+        grown[self.offset - start : self.offset - start + len(self.counts)] = self.counts
+        self.offset, self.counts = start, grown
+
+    def add(self, values: np.ndarray) -> None:
+        """Add a chunk of latencies in ms; NaNs are dropped, negatives count as zero."""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        self.count += len(values)
+        self.sum += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        positive = values[values > MIN_VALUE]
+        self.zero_count += len(values) - len(positive)
+        if not len(positive):
+            return
+        keys = self.key(positive)
+        low, high = int(keys.min()), int(keys.max())
+        self._grow(low, high)
+        self.counts[low - self.offset : high - self.offset + 1] += np.bincount(keys - low, minlength=high - low + 1)
+
+    def merge(self, other: LatencySketch) -> None:
+        if not math.isclose(other.relative_accuracy, self.relative_accuracy):
+            raise ValueError(
+                f"cannot merge sketches of accuracy {other.relative_accuracy} into {self.relative_accuracy}"
+            )
+        if len(other.counts):
+            self._grow(other.offset, other.offset + len(other.counts) - 1)
+            start = other.offset - self.offset
+            self.counts[start : start + len(other.counts)] += other.counts
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else math.nan
+
+    def quantiles(self, qs: Sequence[float]) -> np.ndarray:
+        """Values at quantiles ``qs`` (0..1), each within the relative accuracy of the exact one."""
+        qs = np.asarray(qs, dtype=np.float64)
+        if not self.count:
+            return np.full(qs.shape, np.nan)
+        ranks = np.clip(qs, 0.0, 1.0) * (self.count - 1)
+        cumulative = self.zero_count + np.cumsum(self.counts)
+        index = np.searchsorted(cumulative, ranks, side="right")
+        index = np.minimum(index, len(self.counts) - 1) if len(self.counts) else index
+        buckets = self.offset + index
+        # The bucket (gamma^(i-1), gamma^i] is represented by the point of equal relative error to both ends.
+        values = 2.0 * self.gamma**buckets / (self.gamma + 1.0) if len(self.counts) else np.zeros(qs.shape)
+        values = np.where(ranks < self.zero_count, 0.0, values)
+        return np.clip(values, self.min, self.max)
+
+    def percentiles(self, ps: Sequence[float]) -> np.ndarray:
+        return self.quantiles(np.asarray(ps, dtype=np.float64) / 100.0)
+
+    def cdf(self, x: np.ndarray) -> np.ndarray:
+        """Fraction of samples at or below each ``x``, at bucket resolution."""
+        x = np.asarray(x, dtype=np.float64)
+        if not self.count:
+            return np.full(x.shape, np.nan)
+        cumulative = np.r_[0, np.cumsum(self.counts)]
+        keys = np.where(x > MIN_VALUE, self.key(np.maximum(x, MIN_VALUE)), self.offset - 1)
+        below = cumulative[np.clip(keys - self.offset + 1, 0, len(self.counts))]
+        return np.where(x < 0.0, 0.0, (self.zero_count + below) / self.count)
+
+    def bucket_bounds(self) -> tuple[np.ndarray, np.ndarray]:
+        """Upper bound and count of every non-empty bucket, the zero bucket first."""
+        nonzero = np.flatnonzero(self.counts)
+        upper = self.gamma ** (self.offset + nonzero).astype(np.float64)
+        counts = self.counts[nonzero]
+        if self.zero_count:
+            upper, counts = np.r_[MIN_VALUE, upper], np.r_[self.zero_count, counts]
+        return upper, counts
+
+    def to_dict(self) -> dict:
+        nonzero = np.flatnonzero(self.counts)
+        counts = self.counts[nonzero[0] : nonzero[-1] + 1] if len(nonzero) else self.counts[:0]
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "offset": self.offset + (int(nonzero[0]) if len(nonzero) else 0),
+            "counts": counts.tolist(),
+            "zero_count": self.zero_count,
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, object]) -> LatencySketch:
+        sketch = cls(float(data["relative_accuracy"]))
+        sketch.offset = int(data["offset"])
+        sketch.counts = np.asarray(data["counts"], dtype=np.int64)
+        sketch.zero_count = int(data["zero_count"])
+        sketch.count = int(data["count"])
+        sketch.sum = float(data["sum"])
+        if sketch.count:
+            sketch.min, sketch.max = float(data["min"]), float(data["max"])
+        return sketch
+
+
+def run_key(relative: str, pattern: re.Pattern[str]) -> RunKey | None:
+    """``(engine, N, repeat)`` from a path below the input root; repeat defaults to 0."""
+    match = pattern.search(relative.lower())
+    if match is None:
+        return None
+    repeat = match.groupdict().get("repeat")
+    return raw_samples.normalize_engine(match["engine"]), int(match["nodes"]), int(repeat) if repeat else 0
+
+
+def _open_text(path: Path):
+    if path.suffix == ".gz":
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return path.open("r", encoding="utf-8", newline="")
+
+
+def is_number(text: str) -> bool:
+    try:
+        float(text)
+    except ValueError:
+        return False
+    return True
+
+
+def read_latencies(path: Path, column: str | None = None, chunk_rows: int = CHUNK_ROWS) -> Iterator[np.ndarray]:
+    """Latency chunks from a ``.npy`` array or a text/CSV file with or without a header."""
+    if path.suffix == ".npy":
+        values = np.load(path, mmap_mode="r")
+        if values.ndim > 1:
+            raise ValueError(f"{path}: expected a 1-D latency array, got shape {values.shape}")
+        for start in range(0, len(values), chunk_rows):
+            yield np.asarray(values[start : start + chunk_rows], dtype=np.float64)
+        return
+    with _open_text(path) as f:
+        first = f.readline()
+        if not first.strip():
+            return
+        sep = "," if "," in first else ("\t" if "\t" in first else None)
+        fields = [part.strip() for part in first.split(sep)]
+        pending: list[str] = []
+        if all(is_number(part) for part in fields if part):
+            index = 0 if column is None else int(column)
+            pending.append(first)
+        else:
+            names = [name.lower() for name in fields]
+            wanted = [column.lower()] if column is not None else list(LATENCY_COLUMNS)
+            found = [name for name in wanted if name in names]
+            if not found:
+                raise ValueError(f"{path}: no latency column among {', '.join(wanted)}; have {', '.join(fields)}")
+            index = names.index(found[0])
+        while True:
+            lines = pending + list(itertools.islice(f, chunk_rows - len(pending)))
+            pending = []
+            if not lines:
+                return
+            if sep is None:
+                yield np.array([line for line in lines if line.strip()], dtype=np.float64)
+            else:
+                yield np.array([line.split(sep, index + 1)[index] for line in lines if line.strip()], dtype=np.float64)
+
+
+def latency_files(root: Path) -> list[Path]:
+    return sorted(path for path in root.rglob("*") if path.is_file() and path.name.lower().endswith(SUFFIXES))
+
+
+class SketchSet:
+    """One sketch per (engine, N, repeat) run; coarser views are merges of these."""
+
+    def __init__(self, relative_accuracy: float = RELATIVE_ACCURACY) -> None:
+        self.relative_accuracy = relative_accuracy
+        self.runs: dict[RunKey, LatencySketch] = {}
+
+    def sketch(self, key: RunKey) -> LatencySketch:
+        sketch = self.runs.get(key)
+        if sketch is None:
+            sketch = self.runs[key] = LatencySketch(self.relative_accuracy)
+        return sketch
+
+    def ingest(
+        self,
+        root: Path,
+        pattern: str = PATH_PATTERN,
+        column: str | None = None,
+        scale: float = 1.0,
+        chunk_rows: int = CHUNK_ROWS,
+    ) -> list[Path]:
+        """Sketch every latency file below ``root``; returns the files whose path named no run."""
+        compiled = re.compile(pattern)
+        skipped = []
+        for path in latency_files(root):
+            key = run_key(path.relative_to(root).as_posix(), compiled)
+            if key is None:
+                skipped.append(path)
+                continue
+            sketch = self.sketch(key)
+            for chunk in read_latencies(path, column, chunk_rows):
+                sketch.add(chunk * scale if scale != 1.0 else chunk)
+        return skipped
+
+    def merge(self, other: SketchSet) -> None:
+        for key, sketch in other.runs.items():
+            self.sketch(key).merge(sketch)
+
+    def rollup(self, level: str = "node") -> dict[tuple, LatencySketch]:
+        """Merge the runs per key prefix: ``run`` (engine, N, repeat), ``node`` (engine, N) or ``engine``."""
+        width = LEVELS[level]
+        out: dict[tuple, LatencySketch] = {}
+        for key in sorted(self.runs):
+            prefix = key[:width]
+            if prefix not in out:
+                out[prefix] = LatencySketch(self.relative_accuracy)
+            out[prefix].merge(self.runs[key])
+        return out
+
+    def percentile_table(self, ps: Sequence[float] = PERCENTILES) -> dict[str, dict[int, dict[str, float]]]:
+        """``{engine: {N: {"p50": ..., "p99": ...}}}`` over all repeats of each cell."""
+        out: dict[str, dict[int, dict[str, float]]] = {}
+        for (engine, nodes), sketch in self.rollup("node").items():
+            values = sketch.percentiles(ps)
+            out.setdefault(engine, {})[nodes] = {percentile_name(p): float(v) for p, v in zip(ps, values)}
+        return out
+
+    def save(self, path: Path) -> None:
+        data = {
+            "relative_accuracy": self.relative_accuracy,
+            "runs": [
+                {"engine": engine, "N": nodes, "repeat": repeat, **self.runs[(engine, nodes, repeat)].to_dict()}
+                for engine, nodes, repeat in sorted(self.runs)
+            ],
+        }
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(data, separators=(",", ":")), encoding="utf-8")
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path: Path) -> SketchSet:
+        data = json.loads(path.read_text(encoding="utf-8"))
+        sketches = cls(float(data["relative_accuracy"]))
+        for run in data["runs"]:
+            sketches.runs[(run["engine"], int(run["N"]), int(run["repeat"]))] = LatencySketch.from_dict(run)
+        return sketches
+
+
+def percentile_name(p: float) -> str:
+    return f"p{p:g}".replace(".", "_")
+
+
+def parse_percentiles(text: str) -> list[float]:
+    return [float(part) for part in text.split(",") if part.strip()]
+
+
+def write_curves(path: Path, sketches: Mapping[tuple, LatencySketch], names: Sequence[str]) -> None:
+    """CDF and tail (1 - CDF) at every bucket edge, one row per group and edge."""
+    with path.open("w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow([*names, "latency_ms", "cdf", "tail"])
+        for key, sketch in sketches.items():
+            upper, counts = sketch.bucket_bounds()
+            cdf = np.cumsum(counts) / sketch.count
+            for edge, value in zip(upper, cdf):
+                writer.writerow([*key, f"{min(edge, sketch.max):.6g}", f"{value:.9f}", f"{1.0 - value:.3e}"])
+
+
+def cmd_build(args: argparse.Namespace) -> None:
+    sketches = SketchSet(args.accuracy)
+    if args.output.exists() and args.merge:
+        sketches = SketchSet.load(args.output)
+    for root in args.roots:
+        for path in sketches.ingest(root, args.pattern, args.column, args.scale, args.chunk_rows):
+            print(f"skipped {path}: path names no engine/N", file=sys.stderr)
+    sketches.save(args.output)
+    samples = sum(sketch.count for sketch in sketches.runs.values())
+    buckets = sum(len(sketch.counts) for sketch in sketches.runs.values())
+    print(f"{args.output}: {len(sketches.runs)} run(s), {samples} samples in {buckets} buckets")
+
+
+def cmd_query(args: argparse.Namespace) -> None:
+    names = ("engine", "N", "repeat")[: LEVELS[args.by]]
+    merged = SketchSet.load(args.sketches[0])
+    for path in args.sketches[1:]:
+        merged.merge(SketchSet.load(path))
+    groups = merged.rollup(args.by)
+    headers = [*names, "count", "mean", *(percentile_name(p) for p in args.percentiles)]
+    writer = csv.writer(sys.stdout)
+    writer.writerow(headers)
+    for key, sketch in groups.items():
+        values = sketch.percentiles(args.percentiles)
+        writer.writerow([*key, sketch.count, f"{sketch.mean:.3f}", *(f"{v:.3f}" for v in values)])
+    if args.cdf:
+        write_curves(args.cdf, groups, names)
+        print(f"created {args.cdf}", file=sys.stderr)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="sketch every latency file below the given directories")
+    build.add_argument("roots", type=Path, nargs="+")
+    build.add_argument("--output", type=Path, help=f"sketch file (default: <first root>/{SKETCH_NAME})")
+    build.add_argument("--merge", action="store_true", help="add to the runs already in --output instead of replacing them")
+    build.add_argument(
+        "--accuracy",
+        type=float,
+        default=RELATIVE_ACCURACY,
+        help=f"relative error bound of every quantile (default {RELATIVE_ACCURACY:g})",
+    )
+    build.add_argument("--pattern", default=PATH_PATTERN, help="regex with engine, nodes and optional repeat groups")
+    build.add_argument("--column", help=f"latency column name or index (default: first of {', '.join(LATENCY_COLUMNS)})")
+    build.add_argument("--scale", type=float, default=1.0, help="multiply values by this to get ms, e.g. 0.001 for µs")
+    build.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help=f"rows read at once (default {CHUNK_ROWS})")
+    build.set_defaults(func=cmd_build)
+
+    query = sub.add_parser("query", help="percentiles (and optionally CDF/tail curves) from merged sketches")
+    query.add_argument("sketches", type=Path, nargs="+")
+    query.add_argument("--by", choices=list(LEVELS), default="node", help="group runs per run, per engine and N, or per engine")
+    query.add_argument(
+        "--percentiles",
+        type=parse_percentiles,
+        default=list(PERCENTILES),
+        help=f"comma-separated, default {','.join(f'{p:g}' for p in PERCENTILES)}",
+    )
+    query.add_argument("--cdf", type=Path, metavar="CSV", help="also write each group's CDF and tail curve here")
+    query.set_defaults(func=cmd_query)
+
+    args = parser.parse_args(argv)
+    if args.command == "build" and args.output is None:
+        args.output = args.roots[0] / SKETCH_NAME
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
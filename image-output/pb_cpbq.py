@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""PB-CPBQ composite scores from the performance boundary vector, with a weight-sensitivity Monte Carlo.
+
+Every candidate (an algorithm configuration, or an optimization group of the
+ablation study) gets a boundary vector (T_sat, L_tail, R_deg) from summary_all.md:
+
+    algorithms     T_sat = saturation plateau (table 3-7), L_tail = P99 at the largest
+                   benchmark N (table 3-5), R_deg = scale degradation (table 3-6)
+    optimizations  T_sat = 32-node TPS, L_tail = 32-node P99, R_deg = 1 - TPS32 / TPS16 (table 3-10)
+
+Each dimension is normalized against the best candidate of the same set (T_sat / max,
+min / L_tail, (1 - R_deg) / max(1 - R_deg)), so every component lies in (0, 1] and the
+score S = w · v is 1 only for a candidate that is best on every dimension. Thousands
+of weight vectors score all candidates in one matrix product, which is what the rank
+stability report is built from.
+
+Examples:
+    python pb_cpbq.py
+    python pb_cpbq.py --weights t_sat=0.5,l_tail=0.3,r_deg=0.2 --draws 20000 --output scores.json
+"""
+from __future__ import annotations
+
+import argparse
+import json
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+import raw_samples
+import summary_tables
+
+
+ROOT = Path(__file__).resolve().parents[2]
+SUMMARY = ROOT / "hcap-lab" / "experiments" / "report" / "summary_all.md"
+DIMENSIONS = ("t_sat", "l_tail", "r_deg")
+WEIGHTS = (0.4, 0.4, 0.2)
+DRAWS = 5000
+SEED = 20240601
+# Spread of the sampled weights: 0 draws uniformly from the whole simplex, larger values stay near --weights.
+CONCENTRATION = 0.0
+SETS = ("algorithm", "optimization")
+
+
+@dataclass
+class Candidates:
+    names: list[str]
+    sets: np.ndarray
+    vectors: np.ndarray
+
+    def members(self, name: str) -> np.ndarray:
+        return np.flatnonzero(self.sets == name)
+
+
+def parse_weights(text: str) -> np.ndarray:
+    """``0.5,0.3,0.2`` or ``t_sat=0.5,l_tail=0.3,r_deg=0.2``, rescaled to sum to 1."""
+    parts = [part.strip() for part in text.split(",") if part.strip()]
+    if all("=" in part for part in parts):
+        named = dict(part.split("=", 1) for part in parts)
+        unknown = set(named) - set(DIMENSIONS)
+        if unknown:
+            raise argparse.ArgumentTypeError(f"unknown dimension(s) {', '.join(sorted(unknown))}; use {', '.join(DIMENSIONS)}")
+        values = [float(named.get(name, 0.0)) for name in DIMENSIONS]
+    else:
+        values = [float(part) for part in parts]
+    if len(values) != len(DIMENSIONS) or min(values) < 0 or sum(values) <= 0:
+        raise argparse.ArgumentTypeError(f"need {len(DIMENSIONS)} non-negative weights, got {text!r}")
+    weights = np.asarray(values)
+    return weights / weights.sum()
+
+
+def _table(index: dict[str, summary_tables.Table], number: str) -> summary_tables.Table:
+    table = index.get(number)
+    if table is None or not table.header:
+        raise ValueError(f"missing table {number}")
+    return table
+
+
+def _names(table: summary_tables.Table) -> list[str]:
+    return [cells[0].strip() for cells in table.cells]
+
+
+def algorithm_vectors(index: dict[str, summary_tables.Table]) -> tuple[list[str], np.ndarray]:
+    """Boundary vectors of the algorithms present in tables 3-5, 3-6 and 3-7, in table 3-6 order."""
+    sat, bench, deg = _table(index, "3-7"), _table(index, "3-5"), _table(index, "3-6")
+    plateau = np.array([sat.mean[column] for column in sat.header[1:]], dtype=float).T
+    t_sat = dict(zip(map(raw_samples.normalize_engine, _names(sat)), np.nanmax(plateau, axis=1)))
+
+    nodes = np.array(bench.mean["节点数N"], dtype=float)
+    engines = np.array([raw_samples.normalize_engine(name) for name in _names(bench)])
+    p99 = np.array(bench.mean["P99(ms)"], dtype=float)
+    common = set(t_sat) & set(engines) & {raw_samples.normalize_engine(name) for name in _names(deg)}
+    if not common:
+        found = "; ".join(f"{table.number}: {', '.join(dict.fromkeys(_names(table)))}" for table in (bench, deg, sat))
+        raise ValueError(f"no algorithm is in all of tables 3-5, 3-6 and 3-7 ({found})")
+    # The largest N every scored algorithm was benchmarked at.
+    reference = min(nodes[engines == engine].max() for engine in common)
+    l_tail = {engine: value for engine, n, value in zip(engines, nodes, p99) if n == reference}
+
+    names, rows = [], []
+    for name, r_deg in zip(_names(deg), deg.mean["Rdeg (%)"]):
+        engine = raw_samples.normalize_engine(name)
+        if engine in t_sat and engine in l_tail and r_deg is not None:
+            names.append(name)
+            rows.append((t_sat[engine], l_tail[engine], r_deg / 100.0))
+    return names, np.array(rows, dtype=float).reshape(-1, len(DIMENSIONS))
+
+
+def optimization_vectors(index: dict[str, summary_tables.Table]) -> tuple[list[str], np.ndarray]:
+    """Boundary vectors of the ablation groups of table 3-10, named as in table 3-20 ("A组" -> "A")."""
+    table = _table(index, "3-10")
+    tps16 = np.array(table.mean["16节点TPS"], dtype=float)
+    tps32 = np.array(table.mean["32节点TPS"], dtype=float)
+    p99 = np.array(table.mean["32节点P99"], dtype=float)
+    names = [name.removesuffix("组") for name in _names(table)]
+    groups = _names(_table(index, "3-20"))
+    if sorted(names) != sorted(groups):
+        raise ValueError(
+            f"groups of table 3-10 ({', '.join(names)}) do not match the rows of table 3-20 ({', '.join(groups)})"
+        )
+    return names, np.column_stack([tps32, p99, 1.0 - tps32 / tps16])
+
+
+def candidates(index: dict[str, summary_tables.Table]) -> Candidates:
+    algo_names, algo = algorithm_vectors(index)
+    opt_names, opt = optimization_vectors(index)
+    return Candidates(
+        algo_names + opt_names,
+        np.array(["algorithm"] * len(algo_names) + ["optimization"] * len(opt_names)),
+        np.vstack([algo, opt]),
+    )
+
+
+def normalize(cands: Candidates) -> np.ndarray:
+    """Per-set ratio-to-best of every dimension; rows follow ``cands.names``."""
+    out = np.empty_like(cands.vectors)
+    for name in SETS:
+        idx = cands.members(name)
+        if not len(idx):
+            continue
+        t_sat, l_tail, r_deg = cands.vectors[idx].T
+        retention = 1.0 - r_deg
+        out[idx] = np.column_stack([t_sat / t_sat.max(), l_tail.min() / l_tail, retention / retention.max()])
+    return out
+
+
+def scores(normalized: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """``S = W v`` for one weight vector ``(3,)`` or many ``(draws, 3)``."""
+    return np.asarray(weights) @ normalized.T
+
+
+def sample_weights(draws: int, center: np.ndarray, concentration: float = CONCENTRATION, seed: int = SEED) -> np.ndarray:
+    """Dirichlet weight vectors: uniform on the simplex, or centred on ``center`` when concentration > 0."""
+    alpha = np.ones(len(DIMENSIONS)) if concentration <= 0 else np.maximum(center * concentration, 1e-3)
+    return np.random.default_rng(seed).dirichlet(alpha, size=draws)
+
+
+def ranks(values: np.ndarray) -> np.ndarray:
+    """1-based descending ranks along the last axis (ties broken by candidate order)."""
+    order = np.argsort(-values, axis=-1, kind="stable")
+    out = np.empty_like(order)
+    np.put_along_axis(out, order, np.arange(1, values.shape[-1] + 1), axis=-1)
+    return out
+
+
+def rank_stability(cands: Candidates, weights: np.ndarray, draws: np.ndarray) -> dict:
+    """Scores at ``weights`` and how the per-set ranking holds up across the sampled ``draws``."""
+    normalized = normalize(cands)
+    base = scores(normalized, weights)
+    sampled = scores(normalized, draws)
+    report: dict[str, dict] = {}
+    for name in SETS:
+        idx = cands.members(name)
+        if not len(idx):
+            continue
+        base_rank = ranks(base[idx])
+        sampled_rank = ranks(sampled[:, idx])
+        low, median, high = np.percentile(sampled_rank, [5, 50, 95], axis=0)
+        report[name] = {
+            "ranking_kept": float((sampled_rank == base_rank).all(axis=1).mean()),
+            "leader_kept": float((sampled_rank[:, np.argmin(base_rank)] == 1).mean()),
+            "candidates": {
+                cands.names[i]: {
+                    **dict(zip(DIMENSIONS, map(float, cands.vectors[i]))),
+                    "normalized": dict(zip(DIMENSIONS, map(float, normalized[i]))),
+                    "score": float(base[i]),
+                    "rank": int(base_rank[j]),
+                    "top1_share": float((sampled_rank[:, j] == 1).mean()),
+                    "mean_rank": float(sampled_rank[:, j].mean()),
+                    "rank_p5": float(low[j]),
+                    "rank_p50": float(median[j]),
+                    "rank_p95": float(high[j]),
+                    "score_p5": float(np.percentile(sampled[:, i], 5)),
+                    "score_p95": float(np.percentile(sampled[:, i], 95)),
+                }
+                for j, i in enumerate(idx)
+            },
+        }
+    return report
+
+
+def score_rows(index: dict[str, summary_tables.Table], weights: np.ndarray) -> tuple[list[dict[str, str]], list[dict[str, str]]]:
+    """Recomputed tables 3-19 and 3-20 as row dicts with the same columns as summary_all.md."""
+    cands = candidates(index)
+    values = scores(normalize(cands), weights)
+    rows = {name: [] for name in SETS}
+    columns = {"algorithm": "算法配置A", "optimization": "实验组"}
+    for name, group, value in zip(cands.names, cands.sets, values):
+        rows[group].append({columns[group]: name, "综合评分S": f"{value:.3f}"})
+    return rows["algorithm"], rows["optimization"]
+
+
+def print_report(report: dict, weights: np.ndarray, draws: int) -> None:
+    print("weights " + ", ".join(f"{name}={w:.3f}" for name, w in zip(DIMENSIONS, weights)) + f"; {draws} sampled weight vectors")
+    for name, block in report.items():
+        print(
+            f"\n{name}: ranking unchanged in {block['ranking_kept']:.1%} of draws, "
+            f"leader unchanged in {block['leader_kept']:.1%}"
+        )
+        print(f"  {'candidate':<16} {'S':>6} {'rank':>4} {'top1':>6} {'mean':>5} {'p5-p95':>7}")
+        for cand, row in sorted(block["candidates"].items(), key=lambda item: item[1]["rank"]):
+            spread = f"{row['rank_p5']:.0f}-{row['rank_p95']:.0f}"
+            print(
+                f"  {cand:<16} {row['score']:>6.3f} {row['rank']:>4} "
+                f"{row['top1_share']:>6.1%} {row['mean_rank']:>5.2f} {spread:>7}"
+            )
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--summary", type=Path, default=SUMMARY, help="summary_all.md to score (default: the lab report)")
+    parser.add_argument(
+        "--weights",
+        type=parse_weights,
+        default=np.asarray(WEIGHTS),
+        help=f"weights of {', '.join(DIMENSIONS)} (default {','.join(map(str, WEIGHTS))})",
+    )
+    parser.add_argument("--draws", type=int, default=DRAWS, help=f"sampled weight vectors (default {DRAWS})")
+    parser.add_argument(
+        "--concentration",
+        type=float,
+        default=CONCENTRATION,
+        help="Dirichlet concentration around --weights; 0 samples the whole simplex (default)",
+    )
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--output", type=Path, help="also write the full report as JSON")
+    args = parser.parse_args(argv)
+
+    cands = candidates(summary_tables.load_index(args.summary))
+    draws = sample_weights(args.draws, args.weights, args.concentration, args.seed)
+    report = rank_stability(cands, args.weights, draws)
+    print_report(report, args.weights, args.draws)
+    if args.output:
+        payload = {
+            "weights": dict(zip(DIMENSIONS, map(float, args.weights))),
+            "draws": args.draws,
+            "concentration": args.concentration,
+            "seed": args.seed,
+            "sets": report,
+        }
+        args.output.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"\ncreated {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Draw per-run raw points as one collection per algorithm, or as binned density when there are many."""
+from __future__ import annotations
+
+import argparse
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+import raw_samples
+
+if TYPE_CHECKING:
+    import matplotlib.pyplot as plt
+
+
+# Above this many points per algorithm the markers are replaced by a density strip.
+DENSITY_THRESHOLD = 2000
+# Below this many points vector markers are smaller than an embedded full-axes raster.
+RASTER_THRESHOLD = 300
+# Density bins across one node's jitter strip and along the value axis.
+STRIP_BINS = 3
+VALUE_BINS = 48
+DENSITY_ALPHA = 0.85
+
+
+@dataclass(frozen=True)
+class PointStyle:
+    jitter: float
+    size: float
+    alpha: float
+    edge_width: float
+    zorder: float = 3
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--density-threshold",
+        type=int,
+        default=DENSITY_THRESHOLD,
+        metavar="POINTS",
+        help=f"draw raw points as density shading once an algorithm has more than this many (default {DENSITY_THRESHOLD}; 0 always)",
+    )
+
+
+def engine_points(samples: raw_samples.RawSamples, engine: str, metric: str, jitter: float) -> tuple[np.ndarray, np.ndarray]:
+    """Jittered x and the values of every non-missing sample of ``engine``, in sample order."""
+    values = samples[metric]
+    keep = (samples.engine == samples.engine_code(engine)) & ~np.isnan(values)
+    return samples.node[keep] + samples.jitter(jitter)[keep], values[keep]
+
+
+def strip_edges(nodes: np.ndarray, jitter: float, bins: int = STRIP_BINS) -> np.ndarray:
+    """Bin edges covering ``node ± jitter`` for every node; the gaps between strips stay empty bins."""
+    half = max(jitter, 0.5) * 1.05
+    edges = np.concatenate([np.linspace(node - half, node + half, bins + 1) for node in np.unique(nodes)])
+    return np.unique(edges)
+
+
+def density_cmap(color: str):
+    from matplotlib.colors import LinearSegmentedColormap, to_rgba
+
+    rgba = to_rgba(color)
+    return LinearSegmentedColormap.from_list(f"density-{color}", [(*rgba[:3], 0.08), (*rgba[:3], DENSITY_ALPHA)])
+
+
+def draw_density(
+    ax: plt.Axes, x: np.ndarray, y: np.ndarray, nodes: np.ndarray, color: str, style: PointStyle
+) -> None:
+    x_edges = strip_edges(nodes, style.jitter)
+    low, high = float(y.min()), float(y.max())
+    if high <= low:
+        low, high = low - 0.5, high + 0.5
+    y_edges = np.linspace(low, high, VALUE_BINS + 1)
+    counts, _, _ = np.histogram2d(x, y, bins=(x_edges, y_edges))
+    # Square-root scaling keeps the sparse tails visible next to the dense core.
+    shade = np.ma.masked_equal(np.sqrt(counts.T), 0.0)
+    mesh = ax.pcolormesh(
+        x_edges,
+        y_edges,
+        shade,
+        cmap=density_cmap(color),
+        shading="flat",
+        zorder=style.zorder,
+        rasterized=True,
+    )
+    # Keep the axes margins the markers would have had instead of snapping to the bin edges.
+    mesh.sticky_edges.x.clear()
+    mesh.sticky_edges.y.clear()
+
+
+def draw(
+    ax: plt.Axes,
+    samples: raw_samples.RawSamples,
+    engine: str,
+    metric: str,
+    color: str,
+    style: PointStyle,
+    threshold: int = DENSITY_THRESHOLD,
+) -> None:
+    """Scatter one algorithm's raw points with a single collection, or shade their density.
+
+    Once there are more than ``RASTER_THRESHOLD`` markers they are rasterized inside SVG/PDF,
+    so vector outputs stop growing with the number of repeats; past ``threshold`` points
+    the markers themselves would only overplot.
+    """
+    x, y = engine_points(samples, engine, metric, style.jitter)
+    if not len(x):
+        return
+    if len(x) > threshold:
+        draw_density(ax, x, y, samples.node_counts(engine), color, style)
+        return
+    ax.scatter(
+        x,
+        y,
+        s=style.size,
+        color=color,
+        alpha=style.alpha,
+        edgecolor="white",
+        linewidth=style.edge_width,
+        zorder=style.zorder,
+        rasterized=len(x) > RASTER_THRESHOLD,
+    )
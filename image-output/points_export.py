@@ -0,0 +1,141 @@
+"""Bulk export of raw experiment points as CSV and as a memory-mappable NPZ."""
+from __future__ import annotations
+
+import csv
+import gzip
+import json
+import zipfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Sequence
+
+import numpy as np
+
+import raw_samples
+
+
+SCHEMA_VERSION = 1
+CHUNK_ROWS = 65536
+CSV_HEADER = ["algorithm", "engine", "N", "repeat", "TPS(tx/s)", "P99(ms)", "success_rate"]
+POINT_DTYPE = np.dtype(
+    [
+        ("engine", "<i2"),
+        ("N", "<i4"),
+        ("repeat", "<i4"),
+        ("tps", "<f8"),
+        ("p99_ms", "<f8"),
+        ("success_rate", "<f8"),
+    ]
+)
+UNITS = {"tps": "tx/s", "p99_ms": "ms", "success_rate": "ratio"}
+
+
+@dataclass
+class PointSet:
+    points: np.ndarray
+    engines: list[str]
+    labels: list[str]
+    schema: dict
+
+    def __getitem__(self, column: str) -> np.ndarray:
+        return self.points[column]
+
+
+def point_table(samples: raw_samples.RawSamples, engines: Sequence[str], labels: Sequence[str]) -> PointSet:
+    """Order points by ``engines``, then N, then repeat; missing metrics become 0.0."""
+    codes = np.full(len(samples.engines), -1, dtype=np.int64)
+    for i, engine in enumerate(engines):
+        codes[samples.engines.index(engine)] = i
+    rank = codes[samples.engine]
+    keep = rank >= 0
+    order = np.lexsort((samples.repeat, samples.node, rank))
+    order = order[keep[order]]
+    points = np.empty(len(order), dtype=POINT_DTYPE)
+    points["engine"] = rank[order]
+    points["N"] = samples.node[order]
+    points["repeat"] = samples.repeat[order]
+    for name in ("tps", "p99_ms", "success_rate"):
+        column = samples.metrics.get(name)
+        points[name] = 0.0 if column is None else np.nan_to_num(column[order], nan=0.0)
+    return PointSet(points, list(engines), list(labels), _schema(len(points), engines, labels))
+
+
+def _schema(rows: int, engines: Sequence[str], labels: Sequence[str]) -> dict:
+    return {
+        "version": SCHEMA_VERSION,
+        "rows": rows,
+        "columns": [
+            {"name": name, "dtype": POINT_DTYPE[name].str, "unit": UNITS.get(name, "")} for name in POINT_DTYPE.names
+        ],
+        "engines": list(engines),
+        "labels": list(labels),
+    }
+
+
+def write_npz(path: Path, points: PointSet) -> None:
+    """Uncompressed NPZ with ``points``, ``engines``, ``labels`` and a JSON ``schema``."""
+    np.savez(
+        path,
+        points=points.points,
+        engines=np.array(points.engines),
+        labels=np.array(points.labels),
+        schema=np.array(json.dumps(points.schema, ensure_ascii=False)),
+    )
+
+
+def _member_offset(archive: Path, member: str) -> tuple[int, tuple[int, ...], np.dtype]:
+    with zipfile.ZipFile(archive) as zf:
+        info = zf.getinfo(member)
+        if info.compress_type != zipfile.ZIP_STORED:
+            raise ValueError(f"{archive}:{member} is compressed and cannot be memory-mapped")
+    with archive.open("rb") as f:
+        f.seek(info.header_offset)
+        local = f.read(30)
+        name_len = int.from_bytes(local[26:28], "little")
+        extra_len = int.from_bytes(local[28:30], "little")
+        f.seek(info.header_offset + 30 + name_len + extra_len)
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+        if fortran:
+            raise ValueError(f"{archive}:{member} is Fortran-ordered")
+        offset = f.tell()
+    return offset, shape, dtype
+
+
+def load_npz(path: Path) -> PointSet:
+    """Open a points NPZ; ``points`` is a read-only memmap, so column access is zero-copy."""
+    offset, shape, dtype = _member_offset(path, "points.npy")
+    points = np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=shape)
+    with np.load(path) as data:
+        schema = json.loads(str(data["schema"]))
+        engines = data["engines"].tolist()
+        labels = data["labels"].tolist()
+    if schema.get("version") != SCHEMA_VERSION:
+        raise ValueError(f"unsupported points schema {schema.get('version')} in {path}")
+    return PointSet(points, engines, labels, schema)
+
+
+def write_csv(path: Path, points: PointSet, *, chunk_rows: int = CHUNK_ROWS, compress: bool = False) -> None:
+    """Write the points as CSV in vectorized chunks; ``compress`` streams through gzip."""
+    opener = gzip.open if compress else open
+    labels = np.array(points.labels, dtype=object)
+    engines = np.array(points.engines, dtype=object)
+    with opener(path, "wt", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_HEADER)
+        for start in range(0, len(points.points), chunk_rows):
+            chunk = points.points[start : start + chunk_rows]
+            writer.writerows(
+                zip(
+                    labels[chunk["engine"]],
+                    engines[chunk["engine"]],
+                    chunk["N"].tolist(),
+                    chunk["repeat"].tolist(),
+                    np.char.mod("%.6f", chunk["tps"]).tolist(),
+                    np.char.mod("%.6f", chunk["p99_ms"]).tolist(),
+                    np.char.mod("%.6f", chunk["success_rate"]).tolist(),
+                )
+            )
@@ -0,0 +1,266 @@
+"""Columnar NumPy view of the per-run raw samples in an experiment summary.json."""
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, Mapping, Sequence
+
+import numpy as np
+
+import json_stream
+
+
+METRICS = ("tps", "p99_ms", "success_rate")
+
+_MEMO: dict[tuple[Path, tuple[str, ...]], tuple[tuple[int, int], "RawSamples"]] = {}
+
+
+@dataclass
+class GroupIndex:
+    """Samples grouped by (engine, N); group ``g`` owns ``order[start[g]:start[g] + count[g]]``."""
+
+    order: np.ndarray
+    engine: np.ndarray
+    node: np.ndarray
+    start: np.ndarray
+    count: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.start)
+
+    def ids(self) -> np.ndarray:
+        """Group id of every sample, in sample order."""
+        out = np.empty(len(self.order), dtype=np.int64)
+        out[self.order] = np.repeat(np.arange(len(self.start)), self.count)
+        return out
+
+    def find(self, engine: int, node: int) -> np.ndarray:
+        hit = np.flatnonzero((self.engine == engine) & (self.node == node))
+        if not len(hit):
+            return self.order[:0]
+        g = hit[0]
+        return self.order[self.start[g] : self.start[g] + self.count[g]]
+
+
+@dataclass
+class RawSamples:
+    engines: list[str]
+    engine: np.ndarray
+    node: np.ndarray
+    repeat: np.ndarray
+    metrics: dict[str, np.ndarray]
+    _groups: GroupIndex | None = field(default=None, repr=False, compare=False)
+    _jitter: dict[float, np.ndarray] = field(default_factory=dict, repr=False, compare=False)
+
+    def __len__(self) -> int:
+        return len(self.engine)
+
+    def __getitem__(self, metric: str) -> np.ndarray:
+        return self.metrics[metric]
+
+    def engine_code(self, engine: str) -> int:
+        key = normalize_engine(engine)
+        return self.engines.index(key) if key in self.engines else -1
+
+    def node_counts(self, engine: str | None = None) -> np.ndarray:
+        if engine is None:
+            return np.unique(self.node)
+        return np.unique(self.node[self.engine == self.engine_code(engine)])
+
+    def groups(self) -> GroupIndex:
+        if self._groups is None:
+            order = np.lexsort((self.repeat, self.node, self.engine))
+            engine = self.engine[order]
+            node = self.node[order]
+            edge = np.ones(len(order), dtype=bool)
+            edge[1:] = (engine[1:] != engine[:-1]) | (node[1:] != node[:-1])
+            start = np.flatnonzero(edge)
+            count = np.diff(np.append(start, len(order)))
+            self._groups = GroupIndex(order, engine[start], node[start], start, count)
+        return self._groups
+
+    def cell(self, engine: str, node: int) -> np.ndarray:
+        """Sample indices of one (engine, N) cell in repeat order."""
+        return self.groups().find(self.engine_code(engine), node)
+
+    def values(self, engine: str, node: int, metric: str) -> np.ndarray:
+        """Non-missing values of one (engine, N) cell in repeat order."""
+        picked = self.metrics[metric][self.cell(engine, node)]
+        return picked[~np.isnan(picked)]
+
+    def group_stats(self, metric: str, percentiles: Sequence[float] = (50, 95, 99)) -> dict[str, np.ndarray]:
+        """Count, mean, sample std and linear-interpolated percentiles per group, ignoring NaN."""
+        groups = self.groups()
+        n_groups = len(groups)
+        gid = groups.ids()
+        values = self.metrics[metric]
+        ok = ~np.isnan(values)
+        gid, values = gid[ok], values[ok]
+        count = np.bincount(gid, minlength=n_groups)
+        total = np.bincount(gid, weights=values, minlength=n_groups)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = total / count
+            sq = np.bincount(gid, weights=(values - mean[gid]) ** 2, minlength=n_groups)
+            std = np.sqrt(sq / (count - 1))
+        order = np.lexsort((values, gid))
+        ranked = values[order]
+        start = np.concatenate(([0], np.cumsum(count)[:-1]))
+        out = {"engine": groups.engine, "node": groups.node, "count": count, "mean": mean, "std": std}
+        last = np.maximum(count - 1, 0)
+        for q in percentiles:
+            pos = q / 100.0 * last
+            lo = np.floor(pos).astype(np.int64)
+            hi = np.minimum(lo + 1, last)
+            frac = pos - lo
+            pick_lo = np.minimum(start + lo, max(len(ranked) - 1, 0))
+            pick_hi = np.minimum(start + hi, max(len(ranked) - 1, 0))
+            if len(ranked):
+                value = ranked[pick_lo] + (ranked[pick_hi] - ranked[pick_lo]) * frac
+            else:
+                value = np.zeros(n_groups)
+            out[f"p{q:g}"] = np.where(count > 0, value, np.nan)
+        return out
+
+    def jitter(self, width: float) -> np.ndarray:
+        """Per-sample x offsets spread evenly over [-width, width] within each (engine, N) cell."""
+        if width in self._jitter:
+            return self._jitter[width]
+        groups = self.groups()
+        rank = np.arange(len(groups.order)) - np.repeat(groups.start, groups.count)
+        span = np.repeat(np.maximum(groups.count - 1, 1), groups.count)
+        offsets = np.empty(len(groups.order))
+        offsets[groups.order] = -width + 2.0 * width * rank / span
+        self._jitter[width] = offsets
+        return offsets
+
+
+def normalize_engine(engine: str) -> str:
+    return engine.strip().lower().replace("_", "-")
+
+
+class SampleBuilder:
+    """Accumulates (engine, N, repeat, metrics) records before freezing them into arrays."""
+
+    def __init__(self, metrics: Sequence[str] = METRICS) -> None:
+        self.metric_names = tuple(metrics)
+        self.engines: list[str] = []
+        self._codes: dict[str, int] = {}
+        self.engine: list[int] = []
+        self.node: list[int] = []
+        self.repeat: list[int] = []
+        self.columns: dict[str, list[float]] = {name: [] for name in self.metric_names}
+
+    def add(self, engine: str, node: int, repeat: int, metrics: Mapping[str, object]) -> None:
+        key = normalize_engine(engine)
+        code = self._codes.get(key)
+        if code is None:
+            code = self._codes[key] = len(self.engines)
+            self.engines.append(key)
+        self.engine.append(code)
+        self.node.append(int(node))
+        self.repeat.append(int(repeat))
+        for name in self.metric_names:
+            value = metrics.get(name)
+            self.columns[name].append(float("nan") if value is None else float(value))
+
+    def build(self) -> RawSamples:
+        return RawSamples(
+            list(self.engines),
+            np.asarray(self.engine, dtype=np.int16),
+            np.asarray(self.node, dtype=np.int32),
+            np.asarray(self.repeat, dtype=np.int32),
+            {name: np.asarray(values, dtype=np.float64) for name, values in self.columns.items()},
+        )
+
+
+def iter_summary_records(summary: Mapping[str, object]) -> Iterable[tuple[str, int, int, Mapping[str, object]]]:
+    """Yield (engine, N, repeat, metrics) for every raw item; non-engine keys are skipped."""
+    for engine, by_node in summary.items():
+        if not isinstance(by_node, Mapping):
+            continue
+        for node_text, stats in by_node.items():
+            if not str(node_text).isdigit() or not isinstance(stats, Mapping):
+                continue
+            for i, item in enumerate(stats.get("raw", []), start=1):
+                yield engine, int(node_text), i, item.get("metrics", {})
+
+
+def from_summary(summary: Mapping[str, object], metrics: Sequence[str] = METRICS) -> RawSamples:
+    builder = SampleBuilder(metrics)
+    for record in iter_summary_records(summary):
+        builder.add(*record)
+    return builder.build()
+
+
+def stream_records(
+    path: Path, metrics: Sequence[str] | None = METRICS
+) -> Iterable[tuple[str, int, int, dict[str, object]]]:
+    """Like :func:`iter_summary_records`, but reads ``path`` incrementally.
+
+    Only ``<engine>.<N>.raw[i].metrics.<metric>`` leaves are materialized (every metric
+    when ``metrics`` is None); aggregates, per-run detail and any other fields are
+    skipped while scanning. Every raw item yields a record, with an empty mapping when
+    it carries none of ``metrics``.
+    """
+    wanted = frozenset(metrics) if metrics is not None else None
+    # The walker offers every raw index to ``keep`` before reading it, including
+    # items whose leaves are all skipped, so records open there and close at the next.
+    current: list = []
+    done: list[tuple[str, int, int, dict[str, object]]] = []
+
+    def close() -> None:
+        if current:
+            (engine, node, _, index), values = current
+            done.append((engine, int(node), index + 1, values))
+            current.clear()
+
+    def keep(p: json_stream.Path) -> bool:
+        depth = len(p)
+        if depth == 1:
+            return True
+        if depth == 2:
+            return str(p[1]).isdigit()
+        if depth == 3:
+            return p[2] == "raw"
+        if depth == 4:
+            if not isinstance(p[3], int):
+                return False
+            close()
+            current.extend((p, {}))
+            return True
+        if depth == 5:
+            return p[4] == "metrics"
+        if depth == 6:
+            return wanted is None or p[5] in wanted
+        return False
+
+    with path.open(encoding="utf-8") as f:
+        for leaf, value in json_stream.iter_leaves(f, keep):
+            if done:
+                yield from done
+                done.clear()
+            if len(leaf) == 6:
+                current[1][leaf[5]] = value
+    close()
+    yield from done
+
+
+def load(path: Path, metrics: Sequence[str] = METRICS) -> RawSamples:
+    builder = SampleBuilder(metrics)
+    for record in stream_records(path, metrics):
+        builder.add(*record)
+    return builder.build()
+
+
+def load_cached(path: Path, metrics: Sequence[str] = METRICS) -> RawSamples:
+    """:func:`load`, reused while ``path`` keeps its mtime and size."""
+    stat = path.stat()
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    key = (path, tuple(metrics))
+    memo = _MEMO.get(key)
+    if memo and memo[0] == stamp:
+        return memo[1]
+    samples = load(path, metrics)
+    _MEMO[key] = (stamp, samples)
+    return samples
@@ -0,0 +1,474 @@
+#!/usr/bin/env python3
+"""Compare a candidate experiment summary.json against a baseline and fail on regressions.
+
+The raw per-repeat ``tps``/``p99_ms``/``success_rate`` samples of both runs are aligned
+per (engine, N) cell. For every cell and metric, all cells at once:
+
+    test    two-sided Mann-Whitney U; exact null distribution when there are no ties,
+            normal approximation with tie and continuity correction otherwise
+    delta   bootstrap CI of the change in the mean, relative to the baseline mean
+
+A cell regresses when the test is significant at ``--alpha`` and the mean moved the
+wrong way (TPS and success rate down, P99 up) by more than the metric's tolerance.
+Tolerances are relative with a ``%`` suffix or absolute in the metric's unit. Cells
+whose repeats are too few for the test to ever reach ``--alpha`` are reported as
+underpowered instead. Baseline cells for which the candidate has fewer valid samples
+(an engine that stopped producing results, failed runs) are missing. The command exits
+with status 1 if any cell regressed or is missing, so it can gate an engine change.
+
+Example:
+    python regression_compare.py before/summary.json after/summary.json --tolerance tps=3%,p99_ms=10%
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import functools
+import math
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+import figure_output
+import raw_samples
+import repeat_planner
+
+
+OUT_DIR = Path(__file__).resolve().parent / "comparison"
+OUTPUT = figure_output.OutputOptions()
+METRICS = raw_samples.METRICS
+HIGHER_IS_BETTER = {"tps": True, "p99_ms": False, "success_rate": True}
+METRIC_LABELS = {"tps": "TPS (tx/s)", "p99_ms": "P99 (ms)", "success_rate": "成功率"}
+TOLERANCE = "tps=2%,p99_ms=5%,success_rate=0.5%"
+ALPHA = 0.05
+DRAWS = 2000
+SEED = 20240601
+# Up to this many repeats per side the U test uses its exact null distribution.
+EXACT_LIMIT = 50
+STATUSES = ("missing", "regression", "underpowered", "improvement", "unchanged")
+# Statuses that fail the gate.
+FAILING = ("missing", "regression")
+
+
+@dataclass
+class Cells:
+    """Aligned samples of one metric: row i of ``base``/``cand`` is cell i, left-packed and NaN-padded."""
+
+    engine: list[str]
+    node: np.ndarray
+    base: np.ndarray
+    cand: np.ndarray
+
+
+@dataclass
+class Comparison:
+    metric: str
+    engine: list[str]
+    node: np.ndarray
+    base_n: np.ndarray
+    cand_n: np.ndarray
+    base_mean: np.ndarray
+    cand_mean: np.ndarray
+    change: np.ndarray
+    ci_low: np.ndarray
+    ci_high: np.ndarray
+    u: np.ndarray
+    p: np.ndarray
+    status: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.node)
+
+
+def _cell_index(samples: raw_samples.RawSamples) -> dict[tuple[str, int], np.ndarray]:
+    groups = samples.groups()
+    return {
+        (samples.engines[e], int(n)): groups.order[s : s + c]
+        for e, n, s, c in zip(groups.engine, groups.node, groups.start, groups.count)
+    }
+
+
+def _packed(samples: raw_samples.RawSamples, metric: str, cells: list[np.ndarray]) -> np.ndarray:
+    rows = [samples[metric][idx] for idx in cells]
+    rows = [row[~np.isnan(row)] for row in rows]
+    out = np.full((len(rows), max((len(row) for row in rows), default=0)), np.nan)
+    for i, row in enumerate(rows):
+        out[i, : len(row)] = row
+    return out
+
+
+def align(
+    base: raw_samples.RawSamples, cand: raw_samples.RawSamples, metric: str
+) -> tuple[Cells, list[tuple[str, int, str]]]:
+    """Every baseline cell in engine then N order, and the (engine, N, side) of the candidate-only cells.
+
+    Baseline cells the candidate lacks get an empty candidate row.
+    """
+    a, b = _cell_index(base), _cell_index(cand)
+    rank = {engine: i for i, engine in enumerate(base.engines + [e for e in cand.engines if e not in base.engines])}
+    keys = sorted(a.keys(), key=lambda key: (rank[key[0]], key[1]))
+    unmatched = [(engine, node, "candidate only") for engine, node in b.keys() - a.keys()]
+    unmatched.sort(key=lambda item: (rank[item[0]], item[1]))
+    empty = np.zeros(0, dtype=np.int64)
+    cells = Cells(
+        [engine for engine, _ in keys],
+        np.array([node for _, node in keys], dtype=np.int64),
+        _packed(base, metric, [a[key] for key in keys]),
+        _packed(cand, metric, [b.get(key, empty) for key in keys]),
+    )
+    return cells, unmatched
+
+
+@functools.lru_cache(maxsize=None)
+def u_distribution(m: int, n: int) -> np.ndarray:
+    """Cumulative null distribution P(U <= u), u = 0..m*n, of U for samples of m and n without ties.
+
+    Built from f(m, n, u) = f(m-1, n, u-n) + f(m, n-1, u): the largest pooled value
+    belongs to either the first sample (beating all n others) or the second.
+    """
+    prev = [np.ones(1) for _ in range(n + 1)]
+    for i in range(1, m + 1):
+        cur = [np.ones(1)]
+        for j in range(1, n + 1):
+            out = np.zeros(i * j + 1)
+            out[j : j + len(prev[j])] += prev[j]
+            out[: len(cur[j - 1])] += cur[j - 1]
+            cur.append(out)
+        prev = cur
+    counts = prev[n]
+    return np.cumsum(counts) / counts.sum()
+
+
+def _normal_sf(z: np.ndarray) -> np.ndarray:
+    return 0.5 * np.frompyfunc(math.erfc, 1, 1)(z / math.sqrt(2.0)).astype(np.float64)
+
+
+def mann_whitney(x: np.ndarray, y: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """U statistic of ``y`` over ``x`` and the two-sided p-value, per row of the NaN-padded arrays."""
+    vx, vy = ~np.isnan(x), ~np.isnan(y)
+    m, n = vx.sum(axis=1), vy.sum(axis=1)
+    diff = y[:, :, None] - x[:, None, :]
+    pair = vy[:, :, None] & vx[:, None, :]
+    u = np.where(pair, (diff > 0) + 0.5 * (diff == 0), 0.0).sum(axis=(1, 2))
+
+    pooled = np.concatenate([x, y], axis=1)
+    valid = ~np.isnan(pooled)
+    # Every value's tie-group size t; summing t^2 - 1 over the values gives sum(t^3 - t) over the groups.
+    ties = (pooled[:, :, None] == pooled[:, None, :]).sum(axis=2)
+    tie_sum = np.where(valid, ties.astype(np.float64) ** 2 - 1, 0.0).sum(axis=1)
+    total = m + n
+    with np.errstate(invalid="ignore", divide="ignore"):
+        var = m * n / 12.0 * ((total + 1) - tie_sum / (total * (total - 1)))
+        z = np.maximum(np.abs(u - m * n / 2.0) - 0.5, 0.0) / np.sqrt(var)
+    p = np.where(var > 0, np.minimum(2.0 * _normal_sf(np.nan_to_num(z)), 1.0), 1.0)
+
+    exact = (tie_sum == 0) & (m > 0) & (n > 0) & (np.maximum(m, n) <= EXACT_LIMIT)
+    for size in {(int(a), int(b)) for a, b in zip(m[exact], n[exact])}:
+        rows = np.flatnonzero(exact & (m == size[0]) & (n == size[1]))
+        cdf = u_distribution(*size)
+        k = u[rows].astype(np.int64)
+        # P(U <= k) and P(U >= k) = 1 - P(U <= k - 1).
+        upper = 1.0 - np.where(k > 0, cdf[np.maximum(k - 1, 0)], 0.0)
+        p[rows] = np.minimum(2.0 * np.minimum(cdf[k], upper), 1.0)
+    p = np.where((m > 0) & (n > 0), p, np.nan)
+    return u, p
+
+
+def min_p_value(m: np.ndarray, n: np.ndarray) -> np.ndarray:
+    """Smallest two-sided p-value the exact test can reach with m and n repeats."""
+    return np.array([2.0 / math.comb(int(a + b), int(a)) if a and b else 1.0 for a, b in zip(m, n)])
+
+
+def _bootstrap_means(values: np.ndarray, draws: int, rng: np.random.Generator) -> np.ndarray:
+    count = (~np.isnan(values)).sum(axis=1)
+    width = values.shape[1]
+    pick = (rng.random((len(values), draws, width)) * count[:, None, None]).astype(np.int64)
+    taken = np.take_along_axis(np.nan_to_num(values)[:, None, :], pick, axis=2)
+    used = np.arange(width) < count[:, None, None]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (taken * used).sum(axis=2) / count[:, None]
+
+
+def bootstrap_change(
+    x: np.ndarray, y: np.ndarray, draws: int, confidence: float, rng: np.random.Generator
+) -> tuple[np.ndarray, np.ndarray]:
+    """Percentile CI of ``(mean(y) - mean(x)) / |mean(x)|`` per row, both sides resampled independently."""
+    base, cand = _bootstrap_means(x, draws, rng), _bootstrap_means(y, draws, rng)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ratio = (cand - base) / np.abs(base)
+    tail = (1.0 - confidence) / 2.0
+    low, high = np.full(len(x), np.nan), np.full(len(x), np.nan)
+    ok = np.isfinite(ratio).all(axis=1)
+    if ok.any():
+        low[ok], high[ok] = np.quantile(ratio[ok], [tail, 1.0 - tail], axis=1)
+    return low, high
+
+
+def compare(
+    cells: Cells,
+    metric: str,
+    tolerance: repeat_planner.Target,
+    alpha: float = ALPHA,
+    draws: int = DRAWS,
+    seed: int = SEED,
+) -> Comparison:
+    base_n, cand_n = (~np.isnan(cells.base)).sum(axis=1), (~np.isnan(cells.cand)).sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        base_mean = np.nansum(cells.base, axis=1) / base_n
+        cand_mean = np.nansum(cells.cand, axis=1) / cand_n
+        change = (cand_mean - base_mean) / np.abs(base_mean)
+    u, p = mann_whitney(cells.base, cells.cand)
+    ci_low, ci_high = bootstrap_change(cells.base, cells.cand, draws, 1.0 - alpha, np.random.default_rng(seed))
+    # Positive when the candidate is worse.
+    worse = (base_mean - cand_mean) if HIGHER_IS_BETTER.get(metric, True) else (cand_mean - base_mean)
+    limit = tolerance.absolute(base_mean)
+    significant = p < alpha
+    status = np.select(
+        [
+            cand_n < base_n,
+            significant & (worse > limit),
+            ~significant & (min_p_value(base_n, cand_n) >= alpha) & (worse > limit),
+            significant & (worse < -limit),
+        ],
+        ["missing", "regression", "underpowered", "improvement"],
+        "unchanged",
+    )
+    return Comparison(
+        metric, cells.engine, cells.node, base_n, cand_n, base_mean, cand_mean, change, ci_low, ci_high, u, p, status
+    )
+
+
+def _pct(value: float) -> str:
+    return "-" if math.isnan(value) else f"{value:+.2%}"
+
+
+def report_rows(comparisons: list[Comparison]) -> list[dict[str, object]]:
+    rows = []
+    for comp in comparisons:
+        for i in range(len(comp)):
+            rows.append(
+                {
+                    "metric": comp.metric,
+                    "engine": comp.engine[i],
+                    "N": int(comp.node[i]),
+                    "baseline_n": int(comp.base_n[i]),
+                    "candidate_n": int(comp.cand_n[i]),
+                    "baseline_mean": f"{comp.base_mean[i]:.6g}",
+                    "candidate_mean": f"{comp.cand_mean[i]:.6g}",
+                    "change": _pct(comp.change[i]),
+                    "ci_low": _pct(comp.ci_low[i]),
+                    "ci_high": _pct(comp.ci_high[i]),
+                    "U": f"{comp.u[i]:g}",
+                    "p": f"{comp.p[i]:.4g}",
+                    "status": str(comp.status[i]),
+                }
+            )
+    return rows
+
+
+def write_csv(path: Path, rows: list[dict[str, object]]) -> None:
+    with path.open("w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]) if rows else ["metric"])
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def write_markdown(
+    path: Path,
+    baseline: Path,
+    candidate: Path,
+    comparisons: list[Comparison],
+    unmatched: list[tuple[str, int, str]],
+    tolerances: dict[str, repeat_planner.Target],
+    alpha: float,
+) -> None:
+    counts = {status: sum(int((comp.status == status).sum()) for comp in comparisons) for status in STATUSES}
+    verdict = "FAIL" if any(counts[status] for status in FAILING) else "PASS"
+    lines = [
+        "# Regression report",
+        "",
+        f"- baseline: `{baseline}`",
+        f"- candidate: `{candidate}`",
+        f"- tolerances: {', '.join(str(tolerances[comp.metric]) for comp in comparisons)}; alpha {alpha:g}",
+        f"- verdict: **{verdict}** ({', '.join(f'{counts[s]} {s}' for s in STATUSES)})",
+    ]
+    columns = ["engine", "N", "baseline_n", "candidate_n", "baseline_mean", "candidate_mean", "change", "ci_low", "ci_high", "p", "status"]
+    for comp in comparisons:
+        rows = report_rows([comp])
+        lines += ["", f"## {comp.metric}", "", "| " + " | ".join(columns) + " |", "|" + "---|" * len(columns)]
+        for row in rows:
+            status = f"**{row['status']}**" if row["status"] in FAILING else row["status"]
+            lines.append("| " + " | ".join(str(row[c]) for c in columns[:-1]) + f" | {status} |")
+    if unmatched:
+        lines += ["", "## Unmatched cells", ""]
+        lines += [f"- {engine} N={node}: {side}" for engine, node, side in unmatched]
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def print_report(comparisons: list[Comparison], unmatched: list[tuple[str, int, str]]) -> None:
+    print(f"  {'metric':<12} {'engine':<16} {'N':>4} {'runs':>7} {'change':>8} {'CI':>19} {'p':>8}  status")
+    for comp in comparisons:
+        for i in range(len(comp)):
+            if comp.status[i] == "unchanged":
+                continue
+            ci = f"{_pct(comp.ci_low[i])}..{_pct(comp.ci_high[i])}"
+            runs = f"{comp.base_n[i]}/{comp.cand_n[i]}"
+            print(
+                f"  {comp.metric:<12} {comp.engine[i]:<16} {comp.node[i]:>4} {runs:>7} "
+                f"{_pct(comp.change[i]):>8} {ci:>19} {comp.p[i]:>8.3g}  {comp.status[i]}"
+            )
+    for engine, node, side in unmatched:
+        print(f"  {'-':<12} {engine:<16} {node:>4} {side}")
+    cells = sum(len(comp) for comp in comparisons)
+    counts = {status: sum(int((comp.status == status).sum()) for comp in comparisons) for status in STATUSES}
+    print(f"{cells} cell/metric comparison(s): " + ", ".join(f"{counts[s]} {s}" for s in STATUSES))
+
+
+def save(fig, out_dir: Path, name: str) -> None:
+    import matplotlib.pyplot as plt
+
+    for path in figure_output.save_figure(fig, out_dir / name, OUTPUT):
+        print(f"created {path}")
+    plt.close(fig)
+
+
+def plot_side_by_side(
+    base: raw_samples.RawSamples, cand: raw_samples.RawSamples, comparisons: list[Comparison], out_dir: Path
+) -> None:
+    """One row per metric: baseline raw points and means on the left, candidate on the right."""
+    import matplotlib.pyplot as plt
+
+    import generate_chapter3_extended_fit as extended
+    import point_cloud
+
+    style = point_cloud.PointStyle(jitter=1.0, size=16, alpha=0.5, edge_width=0.3)
+    engines = list(dict.fromkeys(engine for comp in comparisons for engine in comp.engine))
+    fig, axes = plt.subplots(len(comparisons), 2, figsize=(12, 3.8 * len(comparisons)), sharey="row", squeeze=False)
+    for row, comp in enumerate(comparisons):
+        for col, (samples, title) in enumerate([(base, "基线"), (cand, "候选")]):
+            ax = axes[row, col]
+            stats = samples.group_stats(comp.metric, ())
+            for k, engine in enumerate(engines):
+                label = extended.LABELS.get(engine, engine)
+                color = extended.COLORS.get(label, f"C{k}")
+                point_cloud.draw(ax, samples, engine, comp.metric, color, style, extended.DENSITY_THRESHOLD)
+                pick = stats["engine"] == samples.engine_code(engine)
+                ax.plot(stats["node"][pick], stats["mean"][pick], "-o", ms=4, lw=1.8, color=color, label=label)
+            extended.set_node_ticks(ax, samples.node_counts())
+            ax.set_title(f"{title}: {METRIC_LABELS.get(comp.metric, comp.metric)}")
+            ax.set_xlabel("节点数 N")
+            if col == 0:
+                ax.set_ylabel(METRIC_LABELS.get(comp.metric, comp.metric))
+    axes[0, 1].legend(ncol=2, fontsize=9)
+    fig.tight_layout()
+    save(fig, out_dir, "comparison_side_by_side.png")
+
+
+def _finite_max(values: np.ndarray) -> float:
+    values = np.abs(values[np.isfinite(values)])
+    return float(values.max()) if len(values) else 0.0
+
+
+def plot_deltas(comparisons: list[Comparison], tolerances: dict[str, repeat_planner.Target], out_dir: Path) -> None:
+    """Relative change of the mean with its bootstrap CI per metric; regressions are ringed in red."""
+    import matplotlib.pyplot as plt
+
+    import generate_chapter3_extended_fit as extended
+
+    engines = list(dict.fromkeys(engine for comp in comparisons for engine in comp.engine))
+    fig, axes = plt.subplots(1, len(comparisons), figsize=(5.4 * len(comparisons), 4.6), squeeze=False)
+    for ax, comp in zip(axes[0], comparisons):
+        nodes = np.unique(comp.node)
+        spacing = np.diff(nodes).min() if len(nodes) > 1 else 1.0
+        offsets = np.linspace(-0.25, 0.25, len(engines)) * spacing if len(engines) > 1 else [0.0]
+        target = tolerances[comp.metric]
+        if target.relative:
+            bad = -1.0 if HIGHER_IS_BETTER.get(comp.metric, True) else 1.0
+            ax.axhspan(bad * target.half_width * 100, bad * 1e4, color="#C44E52", alpha=0.08, lw=0)
+        ax.axhline(0.0, color="#333333", lw=0.8)
+        for k, engine in enumerate(engines):
+            label = extended.LABELS.get(engine, engine)
+            color = extended.COLORS.get(label, f"C{k}")
+            pick = np.array([e == engine for e in comp.engine], dtype=bool)
+            if not pick.any():
+                continue
+            x = comp.node[pick] + offsets[k]
+            y = comp.change[pick] * 100
+            err = np.abs(np.vstack([comp.ci_low[pick], comp.ci_high[pick]]) * 100 - y)
+            ax.errorbar(x, y, yerr=np.nan_to_num(err), fmt="o", ms=5, capsize=3, lw=1.4, color=color, label=label)
+            flagged = pick & (comp.status == "regression")
+            if flagged.any():
+                ax.scatter(
+                    comp.node[flagged] + offsets[k], comp.change[flagged] * 100, s=150, facecolors="none", edgecolors="#C44E52", lw=1.6, zorder=5
+                )
+        # Sized from the changes and the tolerance; a CI over a near-zero baseline mean may stretch it at most twice.
+        core = max(_finite_max(comp.change * 100), target.half_width * 150 if target.relative else 0.0, 1.0)
+        limit = min(max(core, _finite_max(np.concatenate([comp.ci_low, comp.ci_high]) * 100)), 2 * core) * 1.15
+        ax.set_ylim(-limit, limit)
+        extended.set_node_ticks(ax, nodes)
+        ax.set_title(f"{METRIC_LABELS.get(comp.metric, comp.metric)} 相对变化")
+        ax.set_xlabel("节点数 N")
+        ax.set_ylabel("候选相对基线 (%)")
+    axes[0, 0].legend(ncol=2, fontsize=9)
+    fig.tight_layout()
+    save(fig, out_dir, "comparison_delta.png")
+
+
+def parse_tolerances(text: str) -> dict[str, repeat_planner.Target]:
+    targets = {target.metric: target for target in repeat_planner.parse_targets(text)}
+    unknown = set(targets) - set(METRICS)
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown metric(s) {', '.join(sorted(unknown))}; use {', '.join(METRICS)}")
+    return targets
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline", type=Path, help="baseline summary.json")
+    parser.add_argument("candidate", type=Path, help="candidate summary.json")
+    parser.add_argument(
+        "--tolerance",
+        type=parse_tolerances,
+        default=parse_tolerances(TOLERANCE),
+        help=f"allowed change in the bad direction per metric (default {TOLERANCE.replace('%', '%%')}); unlisted metrics are not compared",
+    )
+    parser.add_argument("--alpha", type=float, default=ALPHA, help=f"significance level, also sets the CI (default {ALPHA:g})")
+    parser.add_argument("--draws", type=int, default=DRAWS, help=f"bootstrap resamples per cell (default {DRAWS})")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--out-dir", type=Path, default=OUT_DIR, help="where the report and figures go")
+    parser.add_argument("--no-figures", action="store_true", help="only write the report")
+    parser.add_argument("--warn-only", action="store_true", help="exit 0 even when cells regressed or are missing")
+    figure_output.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    global OUTPUT
+    OUTPUT = figure_output.options_from_args(args)
+    metrics = tuple(metric for metric in METRICS if metric in args.tolerance)
+    base = raw_samples.load_cached(args.baseline, metrics)
+    cand = raw_samples.load_cached(args.candidate, metrics)
+    comparisons = []
+    unmatched: list[tuple[str, int, str]] = []
+    for metric in metrics:
+        cells, unmatched = align(base, cand, metric)
+        comparisons.append(compare(cells, metric, args.tolerance[metric], args.alpha, args.draws, args.seed))
+    print_report(comparisons, unmatched)
+
+    args.out_dir.mkdir(parents=True, exist_ok=True)
+    write_csv(args.out_dir / "regression_report.csv", report_rows(comparisons))
+    write_markdown(args.out_dir / "regression_report.md", args.baseline, args.candidate, comparisons, unmatched, args.tolerance, args.alpha)
+    print(f"created {args.out_dir / 'regression_report.csv'}")
+    print(f"created {args.out_dir / 'regression_report.md'}")
+    if not args.no_figures and comparisons:
+        import generate_chapter3_extended_fit as extended
+
+        extended.setup_style()
+        plot_side_by_side(base, cand, comparisons, args.out_dir)
+        plot_deltas(comparisons, args.tolerance, args.out_dir)
+    counts = {status: sum(int((comp.status == status).sum()) for comp in comparisons) for status in FAILING}
+    if any(counts.values()) and not args.warn_only:
+        raise SystemExit(f"{counts['regression']} regression(s) beyond tolerance, {counts['missing']} missing cell(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Serial or process-pool execution of independent figure functions."""
+from __future__ import annotations
+
+import argparse
+import gc
+import importlib
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Sequence
+
+import stage_trace
+
+
+# Rough resident size of one worker: interpreter, NumPy, Matplotlib and a 300-dpi canvas.
+WORKER_MEMORY_MB = 400
+
+Job = tuple[str, Callable[..., Any], tuple]
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--jobs", type=int, default=1, help="render in N worker processes (0 = one per CPU)")
+    parser.add_argument(
+        "--max-memory-mb",
+        type=int,
+        default=None,
+        help=f"memory budget for all workers, {WORKER_MEMORY_MB} MB each (default: available RAM)",
+    )
+
+
+def available_memory_mb() -> int | None:
+    try:
+        pages = os.sysconf("SC_AVPHYS_PAGES")
+        page_size = os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, ValueError, OSError):
+        return None
+    return pages * page_size // 2**20
+
+
+def cpu_count() -> int:
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def worker_count(requested: int, job_count: int, max_memory_mb: int | None = None) -> int:
+    count = requested if requested > 0 else cpu_count()
+    budget = max_memory_mb if max_memory_mb is not None else available_memory_mb()
+    if budget is not None:
+        count = min(count, max(1, budget // WORKER_MEMORY_MB))
+    return max(1, min(count, job_count))
+
+
+def _release() -> None:
+    pyplot = sys.modules.get("matplotlib.pyplot")
+    if pyplot is not None:
+        pyplot.close("all")
+    gc.collect()
+
+
+def _init_worker(
+    module_name: str, setup: str | None, setup_args: tuple, backend: str | None, trace: tuple[bool, bool]
+) -> None:
+    if trace[0]:
+        stage_trace.enable(memory=trace[1])
+    if backend:
+        import matplotlib
+
+        matplotlib.use(backend, force=True)
+    module = importlib.import_module(module_name)
+    if setup:
+        getattr(module, setup)(*setup_args)
+
+
+def _run_in_worker(module_name: str, label: str, func_name: str, args: tuple) -> tuple[float, list[dict]]:
+    func = getattr(importlib.import_module(module_name), func_name)
+    start = time.perf_counter()
+    with stage_trace.span(label, cat="figure"):
+        func(*args)
+    elapsed = time.perf_counter() - start
+    _release()
+    return elapsed, stage_trace.drain()
+
+
+def run_jobs(
+    module_name: str,
+    jobs: Sequence[Job],
+    workers: int = 1,
+    *,
+    setup: str | None = None,
+    setup_args: tuple = (),
+    backend: str | None = "Agg",
+) -> list[tuple[str, float]]:
+    """Run ``(label, func, args)`` jobs and return per-job wall times in job order.
+
+    Workers look functions up by name in ``module_name`` so the pool also works
+    when the calling script runs as ``__main__`` or through ``runpy``; each worker
+    calls ``setup(*setup_args)`` once before its first job.
+    """
+    if workers <= 1:
+        timings = []
+        for label, func, args in jobs:
+            start = time.perf_counter()
+            with stage_trace.span(label, cat="figure"):
+                func(*args)
+            timings.append((label, time.perf_counter() - start))
+        return timings
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(module_name, setup, setup_args, backend, stage_trace.settings()),
+    ) as pool:
+        futures = [pool.submit(_run_in_worker, module_name, label, func.__name__, args) for label, func, args in jobs]
+        timings = []
+        for (label, _, _), future in zip(jobs, futures):
+            elapsed, events = future.result()
+            stage_trace.merge(events)
+            timings.append((label, elapsed))
+        return timings
+
+
+def report(timings: Sequence[tuple[str, float]], wall: float, workers: int) -> None:
+    for label, seconds in timings:
+        print(f"  {label:<12} {seconds:7.2f}s")
+    busy = sum(seconds for _, seconds in timings)
+    print(f"rendered {len(timings)} figures in {wall:.2f}s with {workers} worker(s), {busy:.2f}s figure time")
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""Size the repeats of every (engine, N) cell from its observed variance, one round at a time.
+
+For each cell and metric the planner takes the sample standard deviation s of the
+repeats run so far and finds the smallest n whose Student-t confidence interval
+t(n-1) · s / sqrt(n) is no wider than the target half-width. Cells that already
+meet every target are done; the rest get the extra repeats their noisiest metric
+needs. Rerunning the planner after those repeats (with the refreshed summary.json)
+is the sequential stopping rule: the variance estimate sharpens each round and a
+cell stops as soon as its interval is narrow enough.
+
+Targets are half-widths, relative to the cell mean with a ``%`` suffix or absolute
+in the metric's unit, e.g. ``--target tps=2%,p99_ms=15``.
+
+Example:
+    python repeat_planner.py --csv repeat_plan.csv --matrix more_repeats.json
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import math
+from dataclasses import dataclass
+from pathlib import Path
+from statistics import NormalDist
+
+import numpy as np
+
+import raw_samples
+
+
+ROOT = Path(__file__).resolve().parents[2]
+EXPERIMENTS = ROOT / "hcap-lab" / "experiments"
+SUMMARIES = (
+    EXPERIMENTS / "exp1_benchmark" / "report" / "summary.json",
+    EXPERIMENTS / "exp7_extended_fit" / "report" / "summary.json",
+)
+TARGETS = "tps=2%,p99_ms=5%"
+CONFIDENCE = 0.95
+# Below this many repeats the variance estimate itself is too rough to plan from.
+MIN_REPEATS = 3
+MAX_REPEATS = 30
+
+
+@dataclass(frozen=True)
+class Target:
+    metric: str
+    half_width: float
+    relative: bool
+
+    def absolute(self, mean: np.ndarray) -> np.ndarray:
+        return self.half_width * np.abs(mean) if self.relative else np.full(mean.shape, self.half_width)
+
+    def __str__(self) -> str:
+        return f"{self.metric}=±{self.half_width:.1%}" if self.relative else f"{self.metric}=±{self.half_width:g}"
+
+
+@dataclass
+class CellPlan:
+    experiment: str
+    engine: str
+    node: int
+    count: int
+    status: str
+    extra: int
+    half_width: dict[str, float]
+    needed: dict[str, int]
+
+
+def parse_targets(text: str) -> list[Target]:
+    out = []
+    for part in text.split(","):
+        if not part.strip():
+            continue
+        metric, sep, value = part.partition("=")
+        if not sep:
+            raise argparse.ArgumentTypeError(f"expected metric=width, got {part!r}")
+        value = value.strip()
+        relative = value.endswith("%")
+        width = float(value.rstrip("%")) / (100.0 if relative else 1.0)
+        if width <= 0:
+            raise argparse.ArgumentTypeError(f"target width must be positive: {part!r}")
+        out.append(Target(metric.strip(), width, relative))
+    return out
+
+
+def t_quantile(p: float, df: np.ndarray) -> np.ndarray:
+    """Student-t quantile: exact for 1 and 2 degrees of freedom, Cornish-Fisher beyond (0.12% low at 3 for 95%)."""
+    df = np.asarray(df, dtype=np.float64)
+    z = NormalDist().inv_cdf(p)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = (
+            z
+            + (z**3 + z) / (4 * df)
+            + (5 * z**5 + 16 * z**3 + 3 * z) / (96 * df**2)
+            + (3 * z**7 + 19 * z**5 + 17 * z**3 - 15 * z) / (384 * df**3)
+            + (79 * z**9 + 776 * z**7 + 1482 * z**5 - 1920 * z**3 - 945 * z) / (92160 * df**4)
+        )
+    out = np.where(df == 1, math.tan(math.pi * (p - 0.5)), out)
+    return np.where(df == 2, (2 * p - 1) / math.sqrt(2 * p * (1 - p)), out)
+
+
+def width_factors(confidence: float, max_repeats: int) -> np.ndarray:
+    """``t(n-1) / sqrt(n)`` for n = 0..max_repeats; infinite where n < 2."""
+    n = np.arange(max_repeats + 1, dtype=np.float64)
+    factors = np.full(len(n), np.inf)
+    factors[2:] = t_quantile(0.5 + confidence / 2, n[2:] - 1) / np.sqrt(n[2:])
+    return factors
+
+
+def required_repeats(std: np.ndarray, half_width: np.ndarray, factors: np.ndarray) -> np.ndarray:
+    """Smallest n with ``factors[n] * std <= half_width``; ``len(factors)`` where even the cap is not enough."""
+    ratio = np.where(std > 0, half_width / np.where(std > 0, std, 1.0), np.inf)
+    # factors decrease with n, so count the ones still too wide.
+    return (factors[None, :] > ratio[:, None]).sum(axis=1)
+
+
+def plan_experiment(
+    experiment: str,
+    samples: raw_samples.RawSamples,
+    targets: list[Target],
+    confidence: float = CONFIDENCE,
+    max_repeats: int = MAX_REPEATS,
+    batch: int | None = None,
+) -> list[CellPlan]:
+    """One plan per (engine, N) cell of ``samples``, in engine then N order."""
+    factors = width_factors(confidence, max_repeats)
+    stats = {target.metric: samples.group_stats(target.metric, ()) for target in targets}
+    first = next(iter(stats.values()))
+    counts = np.min([s["count"] for s in stats.values()], axis=0)
+    widths: dict[str, np.ndarray] = {}
+    needed: dict[str, np.ndarray] = {}
+    met = np.ones(len(counts), dtype=bool)
+    for target in targets:
+        s = stats[target.metric]
+        std = np.nan_to_num(s["std"], nan=np.inf)
+        goal = target.absolute(s["mean"])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            factor = np.where(s["count"] >= 2, t_quantile(0.5 + confidence / 2, s["count"] - 1) / np.sqrt(s["count"]), np.inf)
+        widths[target.metric] = factor * s["std"]
+        needed[target.metric] = np.maximum(required_repeats(std, goal, factors), MIN_REPEATS)
+        met &= (s["count"] >= MIN_REPEATS) & (widths[target.metric] <= goal)
+    want = np.max(list(needed.values()), axis=0)
+    plans = []
+    for g in np.lexsort((first["node"], first["engine"])):
+        count = int(counts[g])
+        if met[g]:
+            status, extra = "done", 0
+        elif count < MIN_REPEATS:
+            status, extra = "pilot", MIN_REPEATS - count
+        elif want[g] > max_repeats:
+            status, extra = "capped", max(max_repeats - count, 0)
+        else:
+            status, extra = "more", max(int(want[g]) - count, 0)
+        if batch is not None and extra > batch:
+            extra = batch
+        plans.append(
+            CellPlan(
+                experiment,
+                samples.engines[first["engine"][g]],
+                int(first["node"][g]),
+                count,
+                status,
+                extra,
+                {metric: float(values[g]) for metric, values in widths.items()},
+                {metric: int(values[g]) for metric, values in needed.items()},
+            )
+        )
+    return plans
+
+
+def write_csv(path: Path, plans: list[CellPlan], targets: list[Target]) -> None:
+    metrics = [target.metric for target in targets]
+    with path.open("w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(
+            ["experiment", "engine", "N", "repeats", "status", "extra"]
+            + [f"{metric}_half_width" for metric in metrics]
+            + [f"{metric}_needed" for metric in metrics]
+        )
+        for plan in plans:
+            writer.writerow(
+                [plan.experiment, plan.engine, plan.node, plan.count, plan.status, plan.extra]
+                + [f"{plan.half_width[metric]:.4g}" for metric in metrics]
+                + [plan.needed[metric] for metric in metrics]
+            )
+
+
+def experiment_matrix(plans: list[CellPlan]) -> dict:
+    """Lab ``--matrix`` JSON with the extra repeats of every unfinished cell."""
+    return {
+        "name": "repeat_top_up",
+        "points": [
+            {"experiment": plan.experiment, "engine": plan.engine, "nodes": plan.node, "repeats": plan.extra}
+            for plan in plans
+            if plan.extra
+        ],
+    }
+
+
+def print_plans(plans: list[CellPlan], targets: list[Target], max_repeats: int) -> None:
+    metrics = [target.metric for target in targets]
+    print(f"  {'experiment':<20} {'engine':<16} {'N':>4} {'runs':>4} {'status':<7} {'extra':>5}  " + "  ".join(f"{m}±" for m in metrics))
+    for plan in plans:
+        widths = "  ".join(f"{plan.half_width[m]:>{len(m) + 1}.3g}" for m in metrics)
+        print(
+            f"  {plan.experiment:<20} {plan.engine:<16} {plan.node:>4} {plan.count:>4} "
+            f"{plan.status:<7} {plan.extra:>5}  {widths}"
+        )
+    extra = sum(plan.extra for plan in plans)
+    done = sum(plan.status == "done" for plan in plans)
+    # What raising every cell to the worst cell's need (the fixed-repeat policy) would cost.
+    uniform_to = min(max(max(plan.needed.values()) for plan in plans), max_repeats) if plans else 0
+    uniform = sum(max(uniform_to - plan.count, 0) for plan in plans)
+    print(
+        f"targets {', '.join(map(str, targets))}: {done}/{len(plans)} cells done, {extra} more run(s); "
+        f"a uniform {uniform_to} repeats per cell would need {uniform}"
+    )
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("summaries", type=Path, nargs="*", default=list(SUMMARIES), help="experiment summary.json files")
+    parser.add_argument("--target", type=parse_targets, default=parse_targets(TARGETS), help=f"CI half-widths (default {TARGETS.replace('%', '%%')})")
+    parser.add_argument("--confidence", type=float, default=CONFIDENCE, help=f"confidence level (default {CONFIDENCE:g})")
+    parser.add_argument("--max-repeats", type=int, default=MAX_REPEATS, help=f"never plan beyond this many repeats (default {MAX_REPEATS})")
+    parser.add_argument("--batch", type=int, help="at most this many extra repeats per cell and round")
+    parser.add_argument("--csv", type=Path, help="write the per-cell plan here")
+    parser.add_argument("--matrix", type=Path, help="write the extra repeats as a lab --matrix JSON here")
+    args = parser.parse_args(argv)
+
+    metrics = tuple(target.metric for target in args.target)
+    plans: list[CellPlan] = []
+    for path in args.summaries:
+        experiment = path.parents[1].name
+        samples = raw_samples.load_cached(path, metrics)
+        plans += plan_experiment(experiment, samples, args.target, args.confidence, args.max_repeats, args.batch)
+    print_plans(plans, args.target, args.max_repeats)
+    if args.csv:
+        write_csv(args.csv, plans, args.target)
+        print(f"created {args.csv}")
+    if args.matrix:
+        args.matrix.write_text(json.dumps(experiment_matrix(plans), ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+        print(f"created {args.matrix}")
+
+
+if __name__ == "__main__":
+    main()
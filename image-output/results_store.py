@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""SQLite store of every hcap-lab experiment report: runs, raw metrics, fits and summary tables.
+
+Examples:
+    python results_store.py ingest
+    python results_store.py query p99_ms --engine tpbft --nodes 32
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import sqlite3
+from dataclasses import asdict
+from pathlib import Path
+from typing import Iterable, Iterator, Sequence
+
+import numpy as np
+
+import raw_samples
+import summary_tables
+
+
+EXPERIMENTS = Path(__file__).resolve().parents[2] / "hcap-lab" / "experiments"
+DB_PATH = Path(__file__).resolve().parent / "results.sqlite"
+SCHEMA_VERSION = 1
+SUMMARY_SOURCE = "summary_all"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    path TEXT PRIMARY KEY,
+    experiment TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    sha256 TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    experiment TEXT NOT NULL,
+    engine TEXT NOT NULL,
+    nodes INTEGER NOT NULL,
+    repeat INTEGER NOT NULL,
+    UNIQUE (experiment, engine, nodes, repeat)
+);
+CREATE INDEX IF NOT EXISTS runs_engine_nodes ON runs (engine, nodes);
+CREATE TABLE IF NOT EXISTS metrics (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    value REAL,
+    PRIMARY KEY (run_id, name)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS fits (
+    experiment TEXT NOT NULL,
+    model TEXT NOT NULL,
+    engine TEXT NOT NULL,
+    param TEXT NOT NULL,
+    value REAL,
+    PRIMARY KEY (experiment, model, engine, param)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS report_tables (
+    source TEXT NOT NULL,
+    number TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    PRIMARY KEY (source, number)
+) WITHOUT ROWID;
+"""
+
+
+def discover(root: Path = EXPERIMENTS) -> Iterator[tuple[str, str, Path]]:
+    """``(experiment, kind, path)`` for every report file under ``root``, in a stable order."""
+    summary = root / "report" / "summary_all.md"
+    if summary.exists():
+        yield SUMMARY_SOURCE, "tables", summary
+    for report in sorted(root.glob("*/report")):
+        experiment = report.parent.name
+        for kind, name in (("runs", "summary.json"), ("fits", "fit_summary.json")):
+            if (report / name).exists():
+                yield experiment, kind, report / name
+
+
+class ResultsStore:
+    """Indexed view of the ingested reports; every lookup is a query, never a JSON parse."""
+
+    def __init__(self, path: Path = DB_PATH) -> None:
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version not in (0, SCHEMA_VERSION):
+            raise RuntimeError(f"{path} has schema v{version}, expected v{SCHEMA_VERSION}; delete it and re-ingest")
+        self.conn.executescript(SCHEMA)
+        self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self) -> "ResultsStore":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    # Ingestion
+
+    def ingest(self, root: Path = EXPERIMENTS, *, force: bool = False) -> list[Path]:
+        """Load every new or changed report under ``root``; returns the files that were (re)read.
+
+        A file is skipped while its mtime and size match the last ingest; when only the
+        mtime moved the content hash decides, as for the summary table index.
+        """
+        # Sources are keyed by path, so a relative or symlinked root must not add a second row per file.
+        root = root.resolve()
+        loaded = []
+        found = list(discover(root))
+        self._prune(root, {str(path) for _, _, path in found})
+        for experiment, kind, path in found:
+            stat = path.stat()
+            row = self.conn.execute("SELECT sha256, mtime_ns, size FROM sources WHERE path = ?", (str(path),)).fetchone()
+            if row and not force and (row[1], row[2]) == (stat.st_mtime_ns, stat.st_size):
+                continue
+            sha = hashlib.sha256(path.read_bytes()).hexdigest()
+            with self.conn:
+                if force or not row or row[0] != sha:
+                    getattr(self, f"_ingest_{kind}")(experiment, path)
+                    loaded.append(path)
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?, ?, ?)",
+                    (str(path), experiment, kind, sha, stat.st_mtime_ns, stat.st_size),
+                )
+        return loaded
+
+    def _prune(self, root: Path, present: set[str]) -> None:
+        """Drop what was ingested from files under ``root`` that no longer exist."""
+        stale = [
+            (path, experiment, kind)
+            for path, experiment, kind in self.conn.execute("SELECT path, experiment, kind FROM sources")
+            if path not in present and Path(path).is_relative_to(root)
+        ]
+        with self.conn:
+            for path, experiment, kind in stale:
+                if kind == "runs":
+                    self.conn.execute("DELETE FROM runs WHERE experiment = ?", (experiment,))
+                elif kind == "fits":
+                    self.conn.execute("DELETE FROM fits WHERE experiment = ?", (experiment,))
+                else:
+                    self.conn.execute("DELETE FROM report_tables WHERE source = ?", (experiment,))
+                self.conn.execute("DELETE FROM sources WHERE path = ?", (path,))
+
+    def _ingest_runs(self, experiment: str, path: Path) -> None:
+        """Stream the raw runs of ``path`` into the store.
+
+        Engine keys that normalize to the same name (``cometbft_light``, ``CometBFT-light``)
+        are merged: a run whose repeat is already taken continues after the highest one.
+        """
+        self.conn.execute("DELETE FROM runs WHERE experiment = ?", (experiment,))
+        repeats: dict[tuple[str, int], set[int]] = {}
+        for engine, nodes, repeat, values in raw_samples.stream_records(path, None):
+            engine = raw_samples.normalize_engine(engine)
+            taken = repeats.setdefault((engine, nodes), set())
+            if repeat in taken:
+                repeat = max(taken) + 1
+            taken.add(repeat)
+            run_id = self.conn.execute(
+                "INSERT INTO runs (experiment, engine, nodes, repeat) VALUES (?, ?, ?, ?)",
+                (experiment, engine, nodes, repeat),
+            ).lastrowid
+            self.conn.executemany(
+                "INSERT INTO metrics VALUES (?, ?, ?)",
+                [
+                    (run_id, name, None if value is None else float(value))
+                    for name, value in values.items()
+                    if value is None or isinstance(value, (int, float))
+                ],
+            )
+
+    def _ingest_fits(self, experiment: str, path: Path) -> None:
+        self.conn.execute("DELETE FROM fits WHERE experiment = ?", (experiment,))
+        fits = json.loads(path.read_text(encoding="utf-8"))
+        # As for runs, engine keys may normalize to one name; the later entry wins.
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO fits VALUES (?, ?, ?, ?, ?)",
+            [
+                (experiment, model, raw_samples.normalize_engine(engine), param, float(value))
+                for model, by_engine in fits.items()
+                if isinstance(by_engine, dict)
+                for engine, params in by_engine.items()
+                if isinstance(params, dict)
+                for param, value in params.items()
+                if isinstance(value, (int, float))
+            ],
+        )
+
+    def _ingest_tables(self, source: str, path: Path) -> None:
+        self.conn.execute("DELETE FROM report_tables WHERE source = ?", (source,))
+        with path.open(encoding="utf-8") as f:
+            tables = summary_tables.index_tables(f)
+        self.conn.executemany(
+            "INSERT INTO report_tables VALUES (?, ?, ?, ?)",
+            [
+                (source, number, i, json.dumps(asdict(table), ensure_ascii=False))
+                for i, (number, table) in enumerate(tables.items())
+            ],
+        )
+
+    # Queries
+
+    def experiments(self) -> list[str]:
+        return [row[0] for row in self.conn.execute("SELECT DISTINCT experiment FROM runs ORDER BY experiment")]
+
+    def source_digest(self, experiment: str, kind: str = "runs") -> str | None:
+        """Content hash of the file an experiment's runs or fits came from (a build cache key)."""
+        row = self.conn.execute("SELECT sha256 FROM sources WHERE experiment = ? AND kind = ?", (experiment, kind)).fetchone()
+        return row[0] if row else None
+
+    def values(
+        self,
+        metric: str,
+        *,
+        engine: str | None = None,
+        nodes: int | None = None,
+        experiments: Sequence[str] | None = None,
+    ) -> list[tuple[str, str, int, int, float | None]]:
+        """``(experiment, engine, N, repeat, value)`` of one metric, narrowed by any of the filters."""
+        sql = [
+            "SELECT r.experiment, r.engine, r.nodes, r.repeat, m.value FROM runs r",
+            "JOIN metrics m ON m.run_id = r.id AND m.name = ?",
+        ]
+        where, params = [], [metric]
+        if engine is not None:
+            where.append("r.engine = ?")
+            params.append(raw_samples.normalize_engine(engine))
+        if nodes is not None:
+            where.append("r.nodes = ?")
+            params.append(int(nodes))
+        if experiments:
+            where.append(f"r.experiment IN ({', '.join('?' * len(experiments))})")
+            params.extend(experiments)
+        if where:
+            sql.append("WHERE " + " AND ".join(where))
+        sql.append("ORDER BY r.experiment, r.engine, r.nodes, r.repeat")
+        return self.conn.execute(" ".join(sql), params).fetchall()
+
+    def samples(self, experiment: str, metrics: Sequence[str] = raw_samples.METRICS) -> raw_samples.RawSamples:
+        """The experiment's runs as :class:`raw_samples.RawSamples`, in the order they were ingested."""
+        builder = raw_samples.SampleBuilder(metrics)
+        rows = self.conn.execute(
+            "SELECT id, engine, nodes, repeat FROM runs WHERE experiment = ? ORDER BY id", (experiment,)
+        ).fetchall()
+        if not rows:
+            return builder.build()
+        placeholders = ", ".join("?" * len(metrics))
+        values: dict[int, dict[str, float | None]] = {}
+        for run_id, name, value in self.conn.execute(
+            f"SELECT m.run_id, m.name, m.value FROM metrics m JOIN runs r ON r.id = m.run_id "
+            f"WHERE r.experiment = ? AND m.name IN ({placeholders})",
+            (experiment, *metrics),
+        ):
+            values.setdefault(run_id, {})[name] = value
+        for run_id, engine, nodes, repeat in rows:
+            builder.add(engine, nodes, repeat, values.get(run_id, {}))
+        return builder.build()
+
+    def fits(self, experiment: str) -> dict[str, dict[str, dict[str, float]]]:
+        """The experiment's fits in the lab's fit_summary.json layout."""
+        out: dict[str, dict[str, dict[str, float]]] = {}
+        for model, engine, param, value in self.conn.execute(
+            "SELECT model, engine, param, value FROM fits WHERE experiment = ? ORDER BY model, engine, param", (experiment,)
+        ):
+            out.setdefault(model, {}).setdefault(engine, {})[param] = value
+        return out
+
+    def tables(self, source: str = SUMMARY_SOURCE) -> dict[str, summary_tables.Table]:
+        """The summary tables of ``source`` as :func:`summary_tables.load_index` returns them."""
+        return {
+            number: summary_tables.Table(**json.loads(payload))
+            for number, payload in self.conn.execute(
+                "SELECT number, payload FROM report_tables WHERE source = ? ORDER BY position", (source,)
+            )
+        }
+
+
+def summarize(rows: Iterable[tuple[str, str, int, int, float | None]]) -> list[tuple[str, str, int, int, float, float]]:
+    """``(experiment, engine, N, count, mean, std)`` per group of :meth:`ResultsStore.values` rows."""
+    groups: dict[tuple[str, str, int], list[float]] = {}
+    for experiment, engine, nodes, _, value in rows:
+        if value is not None:
+            groups.setdefault((experiment, engine, nodes), []).append(value)
+    out = []
+    for key, values in groups.items():
+        arr = np.asarray(values)
+        out.append((*key, len(arr), float(arr.mean()), float(arr.std(ddof=1)) if len(arr) > 1 else float("nan")))
+    return out
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", type=Path, default=DB_PATH, help=f"database file (default {DB_PATH.name} next to this script)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    ingest = commands.add_parser("ingest", help="load new or changed experiment reports")
+    ingest.add_argument("--root", type=Path, default=EXPERIMENTS, help="hcap-lab experiments directory")
+    ingest.add_argument("--force", action="store_true", help="re-read every report even if unchanged")
+    query = commands.add_parser("query", help="print one metric per (experiment, engine, N)")
+    query.add_argument("metric", help="metric name, e.g. p99_ms or tps")
+    query.add_argument("--engine")
+    query.add_argument("--nodes", type=int)
+    query.add_argument("--experiment", action="append", help="restrict to this experiment (repeatable)")
+    query.add_argument("--raw", action="store_true", help="print every run instead of per-group mean and std")
+    args = parser.parse_args(argv)
+
+    with ResultsStore(args.db) as store:
+        if args.command == "ingest":
+            loaded = store.ingest(args.root, force=args.force)
+            for path in loaded:
+                print(f"ingested {path}")
+            print(f"{len(loaded)} report(s) loaded into {args.db}")
+            return
+        rows = store.values(args.metric, engine=args.engine, nodes=args.nodes, experiments=args.experiment)
+        if args.raw:
+            for experiment, engine, nodes, repeat, value in rows:
+                print(f"{experiment:<24} {engine:<16} {nodes:>5} {repeat:>4} {value}")
+            return
+        print(f"{'experiment':<24} {'engine':<16} {'N':>5} {'runs':>5} {'mean':>12} {'std':>12}")
+        for experiment, engine, nodes, count, mean, std in summarize(rows):
+            print(f"{experiment:<24} {engine:<16} {nodes:>5} {count:>5} {mean:>12.2f} {std:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""Locate each algorithm's throughput knee in a λ scan and plan the next λ values to run.
+
+Each scan is fitted with the piecewise model TPS = min(η λ, T_sat): linear while TPS
+keeps up with the offered load λ, flat once saturated. The knee sits between the last
+linear and the first saturated λ and is estimated at λ* = T_sat / η. Each round
+proposes λ values inside that bracket (the estimate, kept away from the bracket ends
+so the bracket at least halves) until the bracket is narrower than ``--tolerance``
+of λ*. Algorithms that never saturated, or saturated at the lowest λ, get a point
+beyond the scanned range instead.
+
+Input is table 3-7 of summary_all.md plus any lab result.json files of earlier
+rounds (``points[].params.lambda`` / ``points[].metrics.tps``), of which only the
+points whose ``params.nodes`` equals ``--nodes`` are used. The proposals are written
+as a ``--matrix`` JSON for the lab's main.py.
+
+Example:
+    python saturation.py --nodes 16 --matrix next_scan.json
+    python saturation.py --nodes 16 --results round1/result.json --matrix round2.json
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Mapping
+
+import numpy as np
+
+import latency_sketch
+import raw_samples
+import summary_tables
+
+
+ROOT = Path(__file__).resolve().parents[2]
+SUMMARY = ROOT / "hcap-lab" / "experiments" / "report" / "summary_all.md"
+# Relative shortfall of TPS below the linear trend η λ that counts as saturation rather than run noise.
+SHORTFALL = 0.03
+TOLERANCE = 0.05
+# Proposals inside a bracket stay at least this share of its width away from either end.
+SAFEGUARD = 0.25
+LAMBDA_STEP = 10.0
+EXPAND = 2.0
+REPEATS = 3
+
+
+@dataclass
+class Scan:
+    engine: str
+    lambdas: np.ndarray
+    tps: np.ndarray
+
+
+@dataclass
+class Knee:
+    engine: str
+    status: str
+    efficiency: float
+    t_sat: float
+    estimate: float
+    low: float
+    high: float
+
+    @property
+    def width(self) -> float:
+        return self.high - self.low
+
+
+def scans_from_table(table: summary_tables.Table) -> list[Scan]:
+    """Table 3-7: one row per algorithm, one numeric λ column per scan point."""
+    columns = [column for column in table.header[1:] if latency_sketch.is_number(column)]
+    lambdas = np.array([float(column) for column in columns])
+    out = []
+    for i, cells in enumerate(table.cells):
+        tps = np.array([np.nan if table.mean[column][i] is None else table.mean[column][i] for column in columns])
+        out.append(Scan(cells[0].strip(), lambdas, tps))
+    return out
+
+
+def scans_from_results(paths: Iterable[Path], nodes: int) -> list[Scan]:
+    """Points of lab result.json files at ``nodes``; engine/λ/N from ``params`` (or the point), TPS from ``metrics``.
+
+    Points that name no node count (``nodes`` or ``N``) cannot be told apart from other
+    scales and are skipped with a warning.
+    """
+    points: dict[str, list[tuple[float, float]]] = {}
+    for path in paths:
+        data = json.loads(path.read_text(encoding="utf-8"))
+        unscaled = 0
+        for point in data.get("points", []):
+            params: Mapping = {**point, **point.get("params", {})}
+            metrics: Mapping = point.get("metrics", {})
+            engine = params.get("engine")
+            lam = params.get("lambda", params.get("rate"))
+            tps = metrics.get("tps", params.get("tps"))
+            if engine is None or lam is None or tps is None:
+                continue
+            n = params.get("nodes", params.get("N"))
+            if n is None:
+                unscaled += 1
+                continue
+            if int(n) != nodes:
+                continue
+            points.setdefault(str(engine), []).append((float(lam), float(tps)))
+        if unscaled:
+            print(f"{path}: skipped {unscaled} point(s) without nodes/N", file=sys.stderr)
+    return [Scan(engine, *map(np.array, zip(*values))) for engine, values in points.items()]
+
+
+def merge(scans: Iterable[Scan]) -> list[Scan]:
+    """One scan per engine (case-insensitive) with repeated λ averaged, sorted by λ."""
+    grouped: dict[str, tuple[str, list[np.ndarray], list[np.ndarray]]] = {}
+    for scan in scans:
+        name, lambdas, tps = grouped.setdefault(raw_samples.normalize_engine(scan.engine), (scan.engine, [], []))
+        lambdas.append(scan.lambdas)
+        tps.append(scan.tps)
+    out = []
+    for name, lambdas, tps in grouped.values():
+        lam, values = np.concatenate(lambdas), np.concatenate(tps)
+        keep = ~np.isnan(values)
+        unique, inverse = np.unique(lam[keep], return_inverse=True)
+        mean = np.bincount(inverse, weights=values[keep]) / np.bincount(inverse)
+        out.append(Scan(name, unique, mean))
+    return out
+
+
+def _split_cost(lam: np.ndarray, tps: np.ndarray, k: int) -> tuple[float, float, float]:
+    """Relative squared error of TPS = η λ on the first ``k`` points and TPS = T_sat on the rest."""
+    eta = float(lam[:k] @ tps[:k] / (lam[:k] @ lam[:k]))
+    t_sat = float(tps[k:].mean())
+    cost = float((((tps[:k] - eta * lam[:k]) / tps[:k]) ** 2).sum() + (((tps[k:] - t_sat) / tps[k:]) ** 2).sum())
+    return cost, eta, t_sat
+
+
+def detect(scan: Scan, tolerance: float = TOLERANCE) -> Knee:
+    """Knee bracket and estimate of one scan; ``status`` says what the next round should do.
+
+    The split between linear and saturated points is the one with the least squared
+    relative error of the piecewise model; it only counts if the heaviest load
+    falls ``SHORTFALL`` or more below the linear trend, points near the knee may not.
+    """
+    lam, tps = scan.lambdas, scan.tps
+    n = len(lam)
+    if not n:
+        return Knee(scan.engine, "no-data", math.nan, math.nan, math.nan, math.nan, math.nan)
+    if n > 1 and tps.max() < tps[0] * (1 + SHORTFALL):
+        # TPS never rose above the lightest load's: saturated from the start, the knee is lower.
+        bottom = float(lam[0])
+        return Knee(scan.engine, "expand-down", math.nan, float(tps.mean()), math.nan, bottom / EXPAND, bottom)
+    splits = [(_split_cost(lam, tps, k), k) for k in range(1, n)]
+    if splits:
+        (_, eta, t_sat), k = min(splits)
+        if 1.0 - tps[-1] / (eta * lam[-1]) >= SHORTFALL:
+            low, high = float(lam[k - 1]), float(lam[k])
+            estimate = min(max(t_sat / eta, low), high)
+            status = "resolved" if high - low <= tolerance * estimate else "bracket"
+            return Knee(scan.engine, status, eta, t_sat, estimate, low, high)
+    eta = float(lam @ tps / (lam @ lam))
+    top = float(lam[-1])
+    return Knee(scan.engine, "expand-up", eta, float(tps.max()), math.nan, top, top * EXPAND)
+
+
+def _round(value: float) -> float:
+    return float(max(LAMBDA_STEP, round(value / LAMBDA_STEP) * LAMBDA_STEP))
+
+
+def propose(knee: Knee, count: int = 1) -> list[float]:
+    """Next λ values for ``knee``: ``count`` points splitting its bracket, none once resolved."""
+    if knee.status in ("resolved", "no-data"):
+        return []
+    if knee.status in ("expand-up", "expand-down"):
+        target = knee.high if knee.status == "expand-up" else knee.low
+        return [_round(target)]
+    guard = SAFEGUARD * knee.width
+    centre = min(max(knee.estimate, knee.low + guard), knee.high - guard)
+    if count == 1:
+        values = [centre]
+    else:
+        # Spread the points evenly around the safeguarded estimate.
+        offsets = np.linspace(-0.5, 0.5, count) * knee.width * (1 - 2 * SAFEGUARD)
+        values = np.clip(centre + offsets, knee.low + LAMBDA_STEP, knee.high - LAMBDA_STEP).tolist()
+    rounded = sorted({_round(value) for value in values})
+    return [value for value in rounded if knee.low < value < knee.high]
+
+
+def experiment_matrix(plan: list[tuple[Knee, list[float]]], nodes: int, repeats: int) -> dict:
+    """Lab ``--matrix`` JSON: one point per (engine, λ) with the repeat count."""
+    return {
+        "name": "saturation_knee_scan",
+        "points": [
+            {"engine": raw_samples.normalize_engine(knee.engine), "nodes": nodes, "lambda": value, "repeats": repeats}
+            for knee, values in plan
+            for value in values
+        ],
+    }
+
+
+def print_plan(plan: list[tuple[Knee, list[float]]], grid_points: int) -> None:
+    print(f"  {'algorithm':<16} {'status':<12} {'T_sat':>8} {'knee λ*':>8} {'bracket':>13}  next λ")
+    for knee, values in plan:
+        bracket = f"{knee.low:g}-{knee.high:g}" if not math.isnan(knee.low) else "-"
+        estimate = f"{knee.estimate:.0f}" if not math.isnan(knee.estimate) else "-"
+        print(
+            f"  {knee.engine:<16} {knee.status:<12} {knee.t_sat:>8.0f} {estimate:>8} {bracket:>13}  "
+            f"{', '.join(f'{v:g}' for v in values) or '-'}"
+        )
+    runs = sum(len(values) for _, values in plan)
+    print(f"{runs} λ point(s) next round; a full re-scan of the grid would be {grid_points * len(plan)}")
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--summary", type=Path, default=SUMMARY, help="summary_all.md with the table 3-7 scan")
+    parser.add_argument("--results", type=Path, nargs="*", default=[], help="lab result.json files of earlier knee rounds (points at --nodes only)")
+    parser.add_argument("--nodes", type=int, required=True, help="node count the scan was run at (written into the matrix)")
+    parser.add_argument("--count", type=int, default=1, help="λ points per bracketed algorithm and round (default 1: bisection)")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=TOLERANCE,
+        help=f"stop once the bracket is narrower than this share of λ* (default {TOLERANCE:g})",
+    )
+    parser.add_argument("--repeats", type=int, default=REPEATS, help=f"repeats per proposed point (default {REPEATS})")
+    parser.add_argument("--matrix", type=Path, help="write the proposals as a lab --matrix JSON here")
+    args = parser.parse_args(argv)
+
+    table = summary_tables.load_index(args.summary).get("3-7")
+    if table is None:
+        raise SystemExit(f"missing table 3-7: {args.summary}")
+    grid = scans_from_table(table)
+    scans = merge([*grid, *scans_from_results(args.results, args.nodes)])
+    plan = [(knee, propose(knee, args.count)) for knee in (detect(scan, args.tolerance) for scan in scans)]
+    print_plan(plan, len(grid[0].lambdas) if grid else 0)
+    if args.matrix:
+        args.matrix.write_text(
+            json.dumps(experiment_matrix(plan, args.nodes, args.repeats), ensure_ascii=False, indent=2) + "\n",
+            encoding="utf-8",
+        )
+        print(f"created {args.matrix}")
+
+
+if __name__ == "__main__":
+    main()
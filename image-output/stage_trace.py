@@ -0,0 +1,171 @@
+"""Opt-in per-stage timing and memory trace, written as Chrome trace-event JSON plus a summary."""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Iterator
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+TRACE_NAME = "stage_trace"
+
+_ENABLED = False
+_EVENTS: list[dict[str, Any]] = []
+_LOCK = threading.Lock()
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--trace",
+        action="store_true",
+        help=f"time each stage and write {TRACE_NAME}.json (Chrome trace) and {TRACE_NAME}.txt next to the outputs",
+    )
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="with --trace, also follow the Python heap through tracemalloc (slows the run down)",
+    )
+
+
+def enable(memory: bool = False) -> None:
+    global _ENABLED
+    _ENABLED = True
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def enabled() -> bool:
+    return _ENABLED
+
+
+def settings() -> tuple[bool, bool]:
+    """``(enabled, memory)`` so worker processes can mirror the parent's tracing."""
+    return _ENABLED, tracemalloc.is_tracing()
+
+
+def configure_from_args(args: argparse.Namespace) -> None:
+    if args.trace or args.trace_memory:
+        enable(memory=args.trace_memory)
+
+
+def rss_mb() -> float | None:
+    """Current resident set size of this process."""
+    try:
+        with open("/proc/self/statm", encoding="ascii") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, AttributeError):
+        return peak_rss_mb()
+
+
+def peak_rss_mb() -> float | None:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS.
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def _memory() -> dict[str, float]:
+    out = {}
+    rss = rss_mb()
+    if rss is not None:
+        out["rss_mb"] = round(rss, 1)
+    if tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        out["py_mb"] = round(current / 2**20, 1)
+        out["py_peak_mb"] = round(peak / 2**20, 1)
+    return out
+
+
+@contextlib.contextmanager
+def span(name: str, cat: str = "stage", **args: Any) -> Iterator[None]:
+    """Record ``name`` as one complete event; free when tracing is off."""
+    if not _ENABLED:
+        yield
+        return
+    start = time.perf_counter_ns()
+    try:
+        yield
+    finally:
+        end = time.perf_counter_ns()
+        event = {
+            "name": name,
+            "cat": cat,
+            "ph": "X",
+            "ts": start / 1000,
+            "dur": (end - start) / 1000,
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": {**args, **_memory()},
+        }
+        with _LOCK:
+            _EVENTS.append(event)
+
+
+def drain() -> list[dict[str, Any]]:
+    """Hand over and forget the events recorded so far (used to ship them out of workers)."""
+    with _LOCK:
+        events = list(_EVENTS)
+        _EVENTS.clear()
+    return events
+
+
+def merge(events: list[dict[str, Any]]) -> None:
+    with _LOCK:
+        _EVENTS.extend(events)
+
+
+def summary_rows(events: list[dict[str, Any]]) -> list[tuple[str, int, float, float, float]]:
+    """``(stage, calls, total_ms, mean_ms, max_ms)`` per event name, slowest total first."""
+    totals: dict[str, list[float]] = {}
+    for event in events:
+        totals.setdefault(event["name"], []).append(event["dur"] / 1000)
+    rows = [(name, len(d), sum(d), sum(d) / len(d), max(d)) for name, d in totals.items()]
+    return sorted(rows, key=lambda row: row[2], reverse=True)
+
+
+def write(out_dir: Path, name: str = TRACE_NAME) -> None:
+    """Write ``<name>.json`` and ``<name>.txt`` into ``out_dir`` and print the summary."""
+    if not _ENABLED:
+        return
+    events = drain()
+    pid = os.getpid()
+    origin = min((event["ts"] for event in events), default=0.0)
+    for event in events:
+        event["ts"] -= origin
+    meta = [
+        {"name": "process_name", "ph": "M", "pid": p, "args": {"name": "main" if p == pid else f"worker {p}"}}
+        for p in sorted({event["pid"] for event in events})
+    ]
+    out_dir.mkdir(parents=True, exist_ok=True)
+    trace_path = out_dir / f"{name}.json"
+    trace_path.write_text(json.dumps({"traceEvents": meta + events, "displayTimeUnit": "ms"}), encoding="utf-8")
+
+    lines = [f"{'stage':<44} {'calls':>5} {'total ms':>10} {'mean ms':>10} {'max ms':>10}"]
+    for stage, calls, total, mean, longest in summary_rows(events):
+        lines.append(f"{stage:<44} {calls:>5} {total:>10.1f} {mean:>10.1f} {longest:>10.1f}")
+    rss = [event["args"]["rss_mb"] for event in events if "rss_mb" in event["args"]]
+    peak = peak_rss_mb()
+    if peak is not None:
+        lines.append(f"peak RSS: {peak:.1f} MB (main process)")
+    if rss:
+        lines.append(f"largest RSS seen at a stage end: {max(rss):.1f} MB")
+    py_peak = [event["args"]["py_peak_mb"] for event in events if "py_peak_mb" in event["args"]]
+    if py_peak:
+        lines.append(f"peak traced Python heap: {max(py_peak):.1f} MB")
+    text = "\n".join(lines) + "\n"
+    (out_dir / f"{name}.txt").write_text(text, encoding="utf-8")
+    print(text, end="")
+    print(f"created {trace_path}")
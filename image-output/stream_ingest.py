@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""Follow a sweep's per-run JSONL results and keep aggregates, fits and the fit figures current.
+
+Each line is one finished run, e.g.
+    {"engine": "pbft", "N": 32, "repeat": 3, "metrics": {"tps": 1480.2, "p99_ms": 402.7}}
+(``nodes`` may stand in for ``N``, metrics may sit at the top level, and a missing
+``repeat`` is numbered per (engine, N) in arrival order).
+
+Per-(engine, N) mean and variance update in O(1) per run (Welford), and each engine's
+T_sat and P99 least-squares fits keep running power sums, so a refresh only solves a
+few 3x3 systems before rewriting the raw points CSV, the aggregates and fig3_11/fig3_12.
+The figures' bootstrap bands are the exception: they resample all runs, so they are
+recomputed only every ``--band-runs`` runs (and on ``--once``) and reused in between.
+
+Example:
+    python stream_ingest.py ../../hcap-lab/experiments/exp7_extended_fit/runs.jsonl --refresh 60
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import math
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Iterator, Mapping, Sequence
+
+import numpy as np
+
+import fit_engine
+import raw_samples
+
+
+REFRESH_SECONDS = 30.0
+BAND_RUNS = 20
+POLL_SECONDS = 1.0
+# Leading bytes compared on every poll to notice a file rewritten in place.
+HEAD_BYTES = 256
+AGGREGATES_NAME = "extended_fit_stream_aggregates.csv"
+# Outputs a refresh rewrites; the build cache must not treat the batch versions as current.
+STREAM_LABELS = ("extended_fit_raw_points", "extended_fit_summary_used", "fig3_11", "fig3_12")
+
+FitBands = tuple[fit_engine.FitResult, fit_engine.Bands]
+
+
+@dataclass
+class RunningStats:
+    """Welford's online mean and variance."""
+
+    count: int = 0
+    mean: float = 0.0
+    m2: float = 0.0
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else math.nan
+
+
+@dataclass
+class RunningFit:
+    """Least-squares polynomial fit kept as power sums: ``sum x^k`` and ``sum x^k y``.
+
+    Repeats at one N add samples but not information about the curve, so the fit is
+    identifiable only once ``degree + 1`` distinct node counts were seen.
+    """
+
+    degree: int
+    xx: np.ndarray = field(init=False)
+    xy: np.ndarray = field(init=False)
+    yy: float = 0.0
+    ysum: float = 0.0
+    n: int = 0
+    nodes: set[float] = field(default_factory=set)
+
+    def __post_init__(self) -> None:
+        self.xx = np.zeros(2 * self.degree + 1)
+        self.xy = np.zeros(self.degree + 1)
+
+    def add(self, x: float, y: float) -> None:
+        powers = float(x) ** np.arange(2 * self.degree + 1)
+        self.xx += powers
+        self.xy += powers[: self.degree + 1] * y
+        self.yy += y * y
+        self.ysum += y
+        self.n += 1
+        self.nodes.add(float(x))
+
+    @property
+    def ready(self) -> bool:
+        return len(self.nodes) > self.degree
+
+    def solve(self) -> tuple[np.ndarray, float, float]:
+        """``(coef, r2, sigma)`` with coefficients lowest power first; NaN until identifiable."""
+        k = self.degree + 1
+        if not self.ready:
+            return np.full(k, np.nan), math.nan, math.nan
+        normal = self.xx[np.add.outer(np.arange(k), np.arange(k))]
+        # Column scaling keeps the normal matrix well conditioned at large N.
+        scale = np.sqrt(np.diag(normal))
+        scale[scale == 0] = 1.0
+        coef = np.linalg.lstsq(normal / np.outer(scale, scale), self.xy / scale, rcond=None)[0] / scale
+        rss = max(self.yy - 2.0 * coef @ self.xy + coef @ normal @ coef, 0.0)
+        tss = self.yy - self.ysum**2 / self.n
+        r2 = 1.0 - rss / tss if tss > 0 else math.nan
+        sigma = math.sqrt(rss / max(self.n - k, 1))
+        return coef, r2, sigma
+
+
+def parse_record(line: str, metrics: Sequence[str] = raw_samples.METRICS) -> tuple[str, int, int | None, dict] | None:
+    """``(engine, N, repeat, metrics)`` from one JSONL line; blank or malformed lines give None.
+
+    Only ``metrics`` are kept, as floats; values that are not numbers (``"n/a"``) are dropped.
+    """
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        record = json.loads(line)
+        engine = str(record["engine"])
+        nodes = int(record["N"] if "N" in record else record["nodes"])
+        repeat = record.get("repeat")
+        repeat = int(repeat) if repeat is not None else None
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return None
+    values = record.get("metrics")
+    if not isinstance(values, Mapping):
+        values = record
+    numbers = {}
+    for name in metrics:
+        try:
+            numbers[name] = float(values[name])
+        except (KeyError, TypeError, ValueError):
+            continue
+    return engine, nodes, repeat, numbers
+
+
+class JsonlTail:
+    """Incremental reader that returns only complete lines appended since the last call.
+
+    A restarted file (truncated, replaced by another inode, or with different leading
+    bytes) is read again from the start and reported, so the caller can drop what it
+    built from the old content.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.offset = 0
+        self.partial = b""
+        self.inode: int | None = None
+        self.head = b""
+
+    def read(self, final: bool = False) -> tuple[list[str], bool]:
+        """New complete lines and whether the file restarted since the last call.
+
+        A last line without a newline counts as complete once ``final`` is set, or once
+        the file stopped growing and the line parses as JSON.
+        """
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return [], False
+        with self.path.open("rb") as f:
+            restarted = bool(self.offset) and (
+                stat.st_ino != self.inode or stat.st_size < self.offset or f.read(len(self.head)) != self.head
+            )
+            if restarted:
+                self.offset, self.partial, self.head = 0, b"", b""
+            self.inode = stat.st_ino
+            f.seek(self.offset)
+            chunk = f.read(stat.st_size - self.offset)
+        if self.offset < HEAD_BYTES:
+            self.head = (self.head + chunk)[:HEAD_BYTES]
+        self.offset += len(chunk)
+        lines = (self.partial + chunk).split(b"\n")
+        self.partial = lines.pop()
+        if self.partial and (final or (not chunk and _is_json(self.partial))):
+            lines.append(self.partial)
+            self.partial = b""
+        return [line.decode("utf-8", errors="replace") for line in lines], restarted
+
+
+def _is_json(data: bytes) -> bool:
+    try:
+        json.loads(data)
+    except ValueError:
+        return False
+    return True
+
+
+class StreamState:
+    """Raw points plus online aggregates and fits, updated one run at a time."""
+
+    def __init__(self, metrics: Sequence[str] = raw_samples.METRICS) -> None:
+        self.builder = raw_samples.SampleBuilder(metrics)
+        self.stats: dict[tuple[str, int, str], RunningStats] = {}
+        self.fits: dict[tuple[str, str], RunningFit] = {}
+        self.repeats: dict[tuple[str, int], int] = {}
+        self.count = 0
+
+    def add(self, engine: str, nodes: int, repeat: int | None, values: Mapping[str, object]) -> None:
+        engine = raw_samples.normalize_engine(engine)
+        seen = self.repeats.get((engine, nodes), 0) + 1
+        self.repeats[(engine, nodes)] = max(seen, repeat or 0)
+        self.builder.add(engine, nodes, repeat if repeat is not None else seen, values)
+        self.count += 1
+        for name in self.builder.metric_names:
+            value = values.get(name)
+            if value is None or math.isnan(value):
+                continue
+            self.stats.setdefault((engine, nodes, name), RunningStats()).add(value)
+            degree = {"tps": fit_engine.TSAT_DEGREE, "p99_ms": fit_engine.P99_DEGREE}.get(name)
+            if degree is not None:
+                self.fits.setdefault((engine, name), RunningFit(degree)).add(nodes, value)
+
+    def samples(self) -> raw_samples.RawSamples:
+        return self.builder.build()
+
+    def fit_results(self, metric: str, degree: int, engines: Sequence[str]) -> fit_engine.FitResult:
+        """Current fits of the ``engines`` whose ``metric`` was seen at ``degree + 1`` or more node counts."""
+        ready = [engine for engine in engines if (engine, metric) in self.fits and self.fits[(engine, metric)].ready]
+        running = [self.fits[(engine, metric)] for engine in ready]
+        solved = [fit.solve() for fit in running]
+        return fit_engine.FitResult(
+            ready,
+            degree,
+            np.array([coef for coef, _, _ in solved]).reshape(len(solved), degree + 1),
+            np.array([r2 for _, r2, _ in solved]),
+            np.array([sigma for _, _, sigma in solved]),
+            np.array([fit.n for fit in running]),
+        )
+
+    def fit_summary(self, engines: Sequence[str]) -> dict:
+        """Fits in the lab's fit_summary.json layout; engines without enough node counts are left out."""
+        return fit_engine.fit_summary(
+            self.fit_results("tps", fit_engine.TSAT_DEGREE, engines),
+            self.fit_results("p99_ms", fit_engine.P99_DEGREE, engines),
+        )
+
+    def aggregate_rows(self) -> Iterator[tuple[str, int, str, int, float, float]]:
+        for (engine, nodes, name), stats in sorted(self.stats.items()):
+            yield engine, nodes, name, stats.count, stats.mean, stats.std
+
+
+@dataclass
+class BandCache:
+    """Bootstrap bands per figure, kept until ``runs`` more runs arrived since they were computed."""
+
+    runs: int = BAND_RUNS
+    bands: dict[str, FitBands] = field(default_factory=dict)
+    counts: dict[str, int] = field(default_factory=dict)
+
+    def get(self, name: str, count: int, compute: Callable[[], FitBands], force: bool = False) -> FitBands:
+        if force or name not in self.bands or count - self.counts[name] >= self.runs:
+            self.bands[name], self.counts[name] = compute(), count
+        return self.bands[name]
+
+
+def write_aggregates(path: Path, state: StreamState) -> None:
+    tmp = path.with_suffix(".tmp")
+    with tmp.open("w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["engine", "N", "metric", "count", "mean", "std"])
+        for engine, nodes, name, count, mean, std in state.aggregate_rows():
+            writer.writerow([engine, nodes, name, count, f"{mean:.6f}", f"{std:.6f}"])
+    tmp.replace(path)
+
+
+def refresh(state: StreamState, extended, figures: bool, bands: BandCache, final: bool = False) -> None:
+    """Rewrite the stream outputs from the current state; ``final`` recomputes the bands regardless of age."""
+    samples = state.samples()
+    engines = extended.engine_order(samples)
+    fits = state.fit_summary(engines)
+    extended.write_points_csv(samples)
+    write_aggregates(extended.OUT_DIR / AGGREGATES_NAME, state)
+    # Early in a sweep no engine has enough node counts for a fit; leave the fit outputs alone.
+    if fits["throughput"] or fits["p99"]:
+        extended.write_fit_summary(fits)
+    if figures and fits["throughput"]:
+        tsat = bands.get("tps", state.count, lambda: extended.tsat_bands(samples), final)
+        extended.plot_tsat_fit(samples, fits, tsat)
+    if figures and fits["p99"]:
+        p99 = bands.get("p99_ms", state.count, lambda: extended.p99_bands(samples, fits), final)
+        extended.plot_p99_fit(samples, fits, p99)
+    parts = [
+        f"{engine} r2={params['r2']:.3f}" for engine, params in fits["p99"].items() if not math.isnan(params["r2"])
+    ]
+    print(f"refreshed at {state.count} runs; P99 fits: {', '.join(parts) or 'not enough points yet'}", flush=True)
+
+
+def follow(args: argparse.Namespace) -> None:
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import build_cache
+    import figure_output
+    import generate_chapter3_extended_fit as extended
+
+    extended.OUTPUT = figure_output.options_from_args(args)
+    extended.DENSITY_THRESHOLD = args.density_threshold
+    extended.setup_style()
+    extended.OUT_DIR.mkdir(parents=True, exist_ok=True)
+    cache = build_cache.BuildCache(extended.OUT_DIR)
+    cache.forget(STREAM_LABELS)
+    cache.save()
+
+    tail = JsonlTail(args.path)
+    state, bands = StreamState(), BandCache(args.band_runs)
+    last_refresh = 0.0
+    dirty = False
+    while True:
+        lines, restarted = tail.read(final=args.once)
+        if restarted:
+            print(f"{args.path} restarted; rebuilding from its first line", flush=True)
+            state, bands, dirty = StreamState(), BandCache(args.band_runs), True
+        for line in lines:
+            record = parse_record(line)
+            if record is not None:
+                state.add(*record)
+                dirty = True
+        now = time.monotonic()
+        if dirty and state.count and (args.once or now - last_refresh >= args.refresh):
+            refresh(state, extended, not args.no_figures, bands, final=args.once)
+            last_refresh, dirty = now, False
+        if args.once:
+            return
+        time.sleep(POLL_SECONDS)
+
+
+def main(argv: list[str] | None = None) -> None:
+    import figure_output
+    import point_cloud
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", type=Path, help="JSONL file the sweep appends one run per line to")
+    parser.add_argument(
+        "--refresh",
+        type=float,
+        default=REFRESH_SECONDS,
+        help=f"seconds between output refreshes while runs arrive (default {REFRESH_SECONDS:g})",
+    )
+    parser.add_argument(
+        "--band-runs",
+        type=int,
+        default=BAND_RUNS,
+        help=f"runs between recomputations of the figures' bootstrap bands (default {BAND_RUNS})",
+    )
+    parser.add_argument("--once", action="store_true", help="process what is there now, refresh once and exit")
+    parser.add_argument("--no-figures", action="store_true", help="refresh only the CSV and JSON outputs")
+    figure_output.add_arguments(parser)
+    point_cloud.add_arguments(parser)
+    args = parser.parse_args(argv)
+    try:
+        follow(args)
+    except KeyboardInterrupt:
+        print()
+
+
+if __name__ == "__main__":
+    main()
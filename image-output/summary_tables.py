@@ -0,0 +1,143 @@
+"""Single-pass index of the ``## 表X-Y`` markdown tables in summary_all.md."""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Iterable
+
+
+INDEX_VERSION = 1
+HEADING = re.compile(r"## 表(\d+-\d+) (.*)$")
+NUMBER = re.compile(r"[-+]?\d+(?:\.\d+)?(?:e[-+]?\d+)?", re.I)
+
+_MEMO: dict[Path, tuple[tuple[int, int], dict[str, "Table"]]] = {}
+
+
+@dataclass
+class Table:
+    number: str
+    title: str
+    header: list[str]
+    cells: list[list[str]]
+    mean: dict[str, list[float | None]]
+    spread: dict[str, list[float | None]]
+
+    @property
+    def rows(self) -> list[dict[str, str]]:
+        return [dict(zip(self.header, cells)) for cells in self.cells]
+
+
+def split_value(cell: str) -> tuple[float | None, float | None]:
+    """Split ``"1234.5 ± 67.8"`` into its mean and spread; non-numeric parts become None."""
+    head, _, tail = str(cell).partition("±")
+    values = []
+    for part in (head, tail):
+        match = NUMBER.search(part.replace("%", "").replace(",", ""))
+        values.append(float(match.group(0)) if match else None)
+    return values[0], values[1]
+
+
+def _finish(number: str, title: str, lines: list[str]) -> Table:
+    if len(lines) < 3:
+        return Table(number, title, [], [], {}, {})
+    header = [c.strip() for c in lines[0].strip("|").split("|")]
+    body = []
+    for line in lines[2:]:
+        cells = [c.strip() for c in line.strip("|").split("|")]
+        if len(cells) == len(header):
+            body.append(cells)
+    mean: dict[str, list[float | None]] = {}
+    spread: dict[str, list[float | None]] = {}
+    for i, name in enumerate(header):
+        pairs = [split_value(cells[i]) for cells in body]
+        mean[name] = [m for m, _ in pairs]
+        spread[name] = [s for _, s in pairs]
+    return Table(number, title, header, body, mean, spread)
+
+
+def index_tables(lines: Iterable[str]) -> dict[str, Table]:
+    """Collect the first pipe-table block under every ``## 表X-Y`` heading in one pass."""
+    tables: dict[str, Table] = {}
+    current: tuple[str, str] | None = None
+    block: list[str] = []
+    done = False
+    for raw in lines:
+        line = raw.rstrip("\r\n")
+        heading = HEADING.search(line)
+        if heading:
+            if current and current[0] not in tables:
+                tables[current[0]] = _finish(current[0], current[1], block)
+            current, block, done = (heading.group(1), heading.group(2).strip()), [], False
+        elif current and not done:
+            if line.startswith("|"):
+                block.append(line)
+            elif block:
+                done = True
+    if current and current[0] not in tables:
+        tables[current[0]] = _finish(current[0], current[1], block)
+    return tables
+
+
+def index_path(source: Path) -> Path:
+    return source.with_suffix(".tables.json")
+
+
+def _sha256(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def load_index(source: Path) -> dict[str, Table]:
+    """Return the table index for ``source``, reusing the persisted index when still valid.
+
+    The index file next to the source is keyed by mtime and size; when only the
+    mtime moved the content hash decides, so a touch does not force a re-parse.
+    """
+    stat = source.stat()
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    memo = _MEMO.get(source)
+    if memo and memo[0] == stamp:
+        return memo[1]
+    cached_path = index_path(source)
+    cached = None
+    try:
+        cached = json.loads(cached_path.read_text(encoding="utf-8"))
+        if cached.get("version") != INDEX_VERSION:
+            cached = None
+    except (FileNotFoundError, ValueError):
+        pass
+    digest = None
+    if cached and (cached["mtime_ns"], cached["size"]) != stamp:
+        digest = _sha256(source)
+        if cached["sha256"] != digest:
+            cached = None
+    if cached:
+        tables = {number: Table(**data) for number, data in cached["tables"].items()}
+        if (cached["mtime_ns"], cached["size"]) != stamp:
+            _write_index(cached_path, stamp, cached["sha256"], tables)
+    else:
+        with source.open(encoding="utf-8") as f:
+            tables = index_tables(f)
+        _write_index(cached_path, stamp, digest or _sha256(source), tables)
+    _MEMO[source] = (stamp, tables)
+    return tables
+
+
+def _write_index(path: Path, stamp: tuple[int, int], digest: str, tables: dict[str, Table]) -> None:
+    payload = {
+        "version": INDEX_VERSION,
+        "mtime_ns": stamp[0],
+        "size": stamp[1],
+        "sha256": digest,
+        "tables": {number: asdict(table) for number, table in tables.items()},
+    }
+    tmp = path.with_suffix(".tmp")
+    try:
+        tmp.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, path)
+    except OSError:
+        # A read-only report directory only costs the next run a re-parse.
+        pass
@@ -0,0 +1,54 @@
+"""The streaming summary reader must agree with the in-memory one."""
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+import numpy as np
+
+import raw_samples
+
+
+SUMMARY = {
+    "version": 3,
+    "generated": "2024-06-01",
+    "pbft": {
+        "mean": {"tps": 1.0},
+        "8": {
+            "mean": {"tps": 1.0},
+            "raw": [
+                {"repeat": 1, "metrics": {"tps": 100.0, "p99_ms": 12.5, "success_rate": 1.0, "extra": [1, 2]}},
+                {"error": "timeout"},
+                {},
+                {"repeat": 4, "metrics": {"tps": 90, "p99_ms": None}},
+            ],
+        },
+        "16": {"raw": [{"metrics": {}}, {"metrics": {"tps": 80.5}}, {"detail": {"metrics": {"tps": 1}}}]},
+    },
+    "cometbft_light": {"8": {"raw": [{"error": "timeout"}]}},
+}
+
+
+def assert_same(a: raw_samples.RawSamples, b: raw_samples.RawSamples) -> None:
+    assert a.engines == b.engines
+    np.testing.assert_array_equal(a.engine, b.engine)
+    np.testing.assert_array_equal(a.node, b.node)
+    np.testing.assert_array_equal(a.repeat, b.repeat)
+    assert a.metrics.keys() == b.metrics.keys()
+    for name in a.metrics:
+        np.testing.assert_array_equal(a[name], b[name])
+
+
+def test_load_matches_from_summary(tmp_path: Path) -> None:
+    path = tmp_path / "summary.json"
+    path.write_text(json.dumps(SUMMARY), encoding="utf-8")
+    streamed = raw_samples.load(path)
+    assert_same(streamed, raw_samples.from_summary(SUMMARY))
+    np.testing.assert_array_equal(streamed.repeat, [1, 2, 3, 4, 1, 2, 3, 1])
+    assert np.isnan(streamed["tps"][[1, 2]]).all()
+
+
+def test_load_matches_from_summary_for_a_metric_subset(tmp_path: Path) -> None:
+    path = tmp_path / "summary.json"
+    path.write_text(json.dumps(SUMMARY, indent=2), encoding="utf-8")
+    assert_same(raw_samples.load(path, ("p99_ms",)), raw_samples.from_summary(SUMMARY, ("p99_ms",)))
@@ -0,0 +1,32 @@
+"""Ingesting a report must keep every raw run, whatever the engine keys look like."""
+from __future__ import annotations
+
+import json
+
+import numpy as np
+
+import raw_samples
+import results_store
+
+
+SUMMARY = {
+    "version": 3,
+    "cometbft_light": {"8": {"raw": [{"metrics": {"tps": 100.0, "p99_ms": 12.0}}, {"metrics": {"tps": 110.0}}]}},
+    "CometBFT-light": {"8": {"raw": [{"metrics": {"tps": 90.0, "p99_ms": 15.0}}]}},
+    "pbft": {"16": {"mean": {"tps": 1.0}, "raw": [{"error": "timeout"}, {"metrics": {"tps": 80.0, "note": "slow"}}]}},
+}
+
+
+def test_ingest_merges_engines_that_normalize_alike(tmp_path):
+    report = tmp_path / "experiments" / "exp1" / "report"
+    report.mkdir(parents=True)
+    (report / "summary.json").write_text(json.dumps(SUMMARY), encoding="utf-8")
+    with results_store.ResultsStore(tmp_path / "store.sqlite") as store:
+        assert store.ingest(tmp_path / "experiments") == [report / "summary.json"]
+        samples = store.samples("exp1")
+    expected = raw_samples.from_summary(SUMMARY)
+    assert samples.engines == expected.engines == ["cometbft-light", "pbft"]
+    assert samples.node.tolist() == expected.node.tolist()
+    assert samples.repeat.tolist() == [1, 2, 3, 1, 2]
+    for name in raw_samples.METRICS:
+        np.testing.assert_array_equal(samples[name], expected[name])
@@ -0,0 +1,62 @@
+"""Refreshing after every run must work from the first run of a sweep on."""
+from __future__ import annotations
+
+import json
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+import fit_engine
+import generate_chapter3_extended_fit as extended
+import stream_ingest
+
+
+RUNS = [
+    ("pbft", nodes, repeat, {"tps": 1500.0 - 12.0 * nodes + repeat, "p99_ms": 0.2 * nodes**2 + 5.0 * nodes + repeat})
+    for nodes in (8, 16, 32, 48)
+    for repeat in (1, 2)
+] + [("raft", 8, 1, {"tps": 1800.0, "p99_ms": 120.0})]
+
+
+def test_refresh_after_every_run(tmp_path, monkeypatch):
+    monkeypatch.setattr(extended, "OUT_DIR", tmp_path)
+    summary = tmp_path / "extended_fit_summary_used.json"
+    state, bands = stream_ingest.StreamState(), stream_ingest.BandCache()
+    for count, run in enumerate(RUNS, 1):
+        state.add(*run)
+        stream_ingest.refresh(state, extended, figures=True, bands=bands)
+        assert (tmp_path / "extended_fit_raw_points.csv").exists()
+        # Repeats at one N do not count: T_sat needs two node counts, P99 three.
+        assert summary.exists() == (count > 2)
+        assert (tmp_path / "fig3_12_extended_p99_fit_scatter.png").exists() == (count > 4)
+    fits = json.loads(summary.read_text(encoding="utf-8"))
+    assert list(fits["p99"]) == ["pbft"]
+    assert fits["p99"]["pbft"]["alpha"] > 0
+
+
+def test_bands_are_recomputed_every_band_runs(tmp_path, monkeypatch):
+    monkeypatch.setattr(extended, "OUT_DIR", tmp_path)
+    calls = []
+
+    def bootstrap_bands(samples, metric, *args, **kwargs):
+        calls.append(metric)
+        return original(samples, metric, *args, **kwargs)
+
+    original = fit_engine.bootstrap_bands
+    monkeypatch.setattr(fit_engine, "bootstrap_bands", bootstrap_bands)
+    state, bands = stream_ingest.StreamState(), stream_ingest.BandCache(runs=3)
+    for run in RUNS:
+        state.add(*run)
+        stream_ingest.refresh(state, extended, figures=True, bands=bands)
+    # T_sat is ready from run 3 and P99 from run 5; each is then bootstrapped every third run.
+    assert calls == ["tps", "p99_ms", "tps", "p99_ms", "tps"]
+    stream_ingest.refresh(state, extended, figures=True, bands=bands, final=True)
+    assert calls[-2:] == ["tps", "p99_ms"]
+
+
+def test_repeats_at_one_node_count_give_no_fit():
+    state = stream_ingest.StreamState()
+    for repeat in range(1, 5):
+        state.add("pbft", 8, repeat, {"tps": 1000.0 + repeat, "p99_ms": 300.0 + repeat})
+    assert state.fit_summary(["pbft"]) == {"throughput": {}, "p99": {}}
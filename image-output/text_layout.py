@@ -0,0 +1,64 @@
+"""Cached text measurement and line wrapping for the PIL diagram renderer."""
+from __future__ import annotations
+
+import functools
+from bisect import bisect_right
+from itertools import accumulate
+
+from PIL import ImageFont
+
+Font = ImageFont.FreeTypeFont | ImageFont.ImageFont
+
+WRAP_CACHE_SIZE = 8192
+SIZE_CACHE_SIZE = 8192
+
+_ADVANCES: dict[Font, dict[str, float]] = {}
+
+
+def advances(fnt: Font, text: str) -> list[float]:
+    """Per-character advance widths, measured once per (font, character)."""
+    known = _ADVANCES.setdefault(fnt, {})
+    out = []
+    for ch in text:
+        width = known.get(ch)
+        if width is None:
+            width = known[ch] = fnt.getlength(ch)
+        out.append(width)
+    return out
+
+
+@functools.lru_cache(maxsize=SIZE_CACHE_SIZE)
+def text_size(fnt: Font, text: str) -> tuple[int, int]:
+    """Ink bounding-box size, as ``ImageDraw.textbbox`` reports it for a top-left anchor."""
+    box = fnt.getbbox(text)
+    return box[2] - box[0], box[3] - box[1]
+
+
+def _wrap_line(raw: str, fnt: Font, max_w: int) -> list[str]:
+    # Advance prefix sums locate each break in O(log n); one or two exact ink-box
+    # checks then settle it, since ink width and summed advances differ by bearings.
+    prefix = [0.0, *accumulate(advances(fnt, raw))]
+    n = len(raw)
+    out = []
+    start = 0
+    while start < n:
+        end = max(start + 1, bisect_right(prefix, prefix[start] + max_w, start + 1, n + 1) - 1)
+        while end < n and text_size(fnt, raw[start : end + 1])[0] <= max_w:
+            end += 1
+        while end > start + 1 and text_size(fnt, raw[start:end])[0] > max_w:
+            end -= 1
+        out.append(raw[start:end])
+        start = end
+    return out
+
+
+@functools.lru_cache(maxsize=WRAP_CACHE_SIZE)
+def wrap(text: str, fnt: Font, max_w: int) -> tuple[str, ...]:
+    """Greedy per-character wrap of every ``\\n``-separated line to ``max_w`` pixels.
+
+    A line always keeps at least one character; empty input yields ``("",)``.
+    """
+    out: list[str] = []
+    for raw in text.split("\n"):
+        out.extend(_wrap_line(raw, fnt, max_w))
+    return tuple(out) or ("",)
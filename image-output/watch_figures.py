@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""Keep the Chapter 3 generators warm and re-render figures as their inputs change.
+
+Polls summary_all.md, the exp1/exp7 summary.json files and fit_summary.json. On a
+change the affected generator rebuilds in this process, so imports, fonts and the
+parsed inputs of untouched files stay loaded and the build cache limits the work
+to the figures whose data moved. Editing a generator script restarts the watcher.
+
+Example:
+    python watch_figures.py --formats png,svg
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+import traceback
+from dataclasses import dataclass
+from pathlib import Path
+from types import ModuleType
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+import figure_output  # noqa: E402
+import generate_chapter3_extended_fit as extended  # noqa: E402
+import generate_thesis_figures as thesis  # noqa: E402
+import point_cloud  # noqa: E402
+
+
+INTERVAL = 0.25
+SOURCE_DIR = Path(__file__).resolve().parent
+# Flags the watcher forwards to every generator.
+SHARED_FLAGS = ("formats", "png_level", "png_optimize", "fixed_layout", "density_threshold")
+
+Stamp = tuple[int, int] | None
+
+
+@dataclass
+class Target:
+    name: str
+    module: ModuleType
+    inputs: tuple[Path, ...]
+    args: argparse.Namespace
+
+
+def stamp(path: Path) -> Stamp:
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def snapshot(paths: list[Path]) -> dict[Path, Stamp]:
+    return {path: stamp(path) for path in paths}
+
+
+def sources() -> list[Path]:
+    return sorted(SOURCE_DIR.glob("*.py"))
+
+
+def targets(args: argparse.Namespace) -> list[Target]:
+    available = {
+        "chapter3": (thesis, (thesis.SUMMARY, thesis.EXP1_SUMMARY)),
+        "extended-fit": (extended, (extended.SUMMARY_PATH, extended.FIT_PATH)),
+    }
+    out = []
+    for name in args.only or list(available):
+        module, inputs = available[name]
+        module_args = module.build_parser().parse_args([])
+        for flag in SHARED_FLAGS:
+            setattr(module_args, flag, getattr(args, flag))
+        # Rendering in worker processes would pay the cold start this mode exists to avoid.
+        if hasattr(module_args, "jobs"):
+            module_args.jobs = 1
+        out.append(Target(name, module, inputs, module_args))
+    return out
+
+
+def rebuild(target: Target, changed: list[Path]) -> None:
+    start = time.perf_counter()
+    try:
+        labels = target.module.build(target.args)
+    except Exception:
+        traceback.print_exc()
+        print(f"[{target.name}] build failed; still watching", flush=True)
+        return
+    elapsed = time.perf_counter() - start
+    ages = [time.time() - path.stat().st_mtime for path in changed if path.exists()]
+    since = f", {max(ages):.2f}s after the edit" if ages else ""
+    print(f"[{target.name}] {len(labels)} output(s) in {elapsed:.2f}s{since}", flush=True)
+
+
+def settle(paths: list[Path], seen: dict[Path, Stamp], interval: float) -> dict[Path, Stamp]:
+    """Wait until a file being written stops changing between two polls."""
+    while True:
+        time.sleep(interval)
+        now = snapshot(paths)
+        if now == seen:
+            return now
+        seen = now
+
+
+def restart() -> None:
+    print("generator sources changed; restarting", flush=True)
+    os.execv(sys.executable, [sys.executable, *sys.argv])
+
+
+def watch(args: argparse.Namespace) -> None:
+    watched = targets(args)
+    inputs = sorted({path for target in watched for path in target.inputs})
+    for target in watched:
+        rebuild(target, [])
+    code = snapshot(sources())
+    seen = snapshot(inputs)
+    print(f"watching {len(inputs)} input(s) every {args.interval:g}s; Ctrl-C to stop", flush=True)
+    while True:
+        time.sleep(args.interval)
+        if snapshot(sources()) != code:
+            restart()
+        now = snapshot(inputs)
+        if now == seen:
+            continue
+        now = settle(inputs, now, args.interval / 2)
+        changed = [path for path in inputs if now[path] != seen[path]]
+        seen = now
+        for path in changed:
+            print(f"changed: {path}", flush=True)
+        for target in watched:
+            hits = [path for path in changed if path in target.inputs]
+            if hits:
+                rebuild(target, hits)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "--only",
+        action="append",
+        choices=["chapter3", "extended-fit"],
+        help="watch only this generator (repeatable; default: both)",
+    )
+    parser.add_argument("--interval", type=float, default=INTERVAL, help=f"seconds between polls (default {INTERVAL:g})")
+    figure_output.add_arguments(parser)
+    point_cloud.add_arguments(parser)
+    args = parser.parse_args(argv)
+    try:
+        watch(args)
+    except KeyboardInterrupt:
+        print()
+
+
+if __name__ == "__main__":
+    main()